@@ -0,0 +1,113 @@
+import os
+import pickle
+import threading
+from nlp_resources import REGISTRY, ARTICLE_CACHE_DIR, BASE_WORD2VEC_PATH
+
+""" Version of the saved analyses. It is part of every cache key, so it must
+    be increased whenever what an analysis holds or how it is computed 
+    changes, and analyses saved by older code are then no longer loaded.
+"""
+ARTICLE_CACHE_VERSION = 1
+
+
+class ArticleCache():
+    """ Saves the analysis of each reference article (its sentiment, keyword
+        counters, and the Word2Vec vectors of its words after the model was
+        trained on it) to disk, so an article that is used again does not 
+        have to be analyzed again. Analyses are keyed by a hash of the 
+        article's text together with the cache version and a fingerprint of
+        the base Word2Vec model, so they are analyzed again after the model
+        is retrained or the analysis changes.
+
+    Attributes
+    ----------
+    directory : string
+        The folder the analyses are saved in.
+    model_path : string
+        The base Word2Vec model the saved vectors were layered on.
+    hits : int
+        The number of analyses that were found in the cache.
+    misses : int
+        The number of analyses that were not in the cache.
+
+    Methods
+    -------
+    get_model_fingerprint():
+        Returns a fingerprint of the base Word2Vec model.
+    get_path():
+        Returns the file an article's analysis is saved in.
+    get():
+        Returns the saved analysis of an article.
+    put():
+        Saves the analysis of an article.
+    get_stats():
+        Returns the number of hits and misses.
+    """
+
+    def __init__(self, directory=ARTICLE_CACHE_DIR, 
+                 model_path=BASE_WORD2VEC_PATH):
+        self.directory = directory
+        self.model_path = model_path
+        self.hits = 0
+        self.misses = 0
+
+    def get_model_fingerprint(self):
+        """ Returns the modification time and size of the base Word2Vec 
+            model file, which change whenever the model is saved again, or
+            "none" if the model has not been saved.
+        """
+        try:
+            stat = os.stat(self.model_path)
+        except FileNotFoundError:
+            return "none"
+        return f"{stat.st_mtime_ns:x}{stat.st_size:x}"
+
+    def get_path(self, content_hash):
+        """ Returns the file that the analysis of the article with the given
+            content hash is saved in, for the current cache version and base
+            model.
+        """
+        key = (f"v{ARTICLE_CACHE_VERSION}-{self.get_model_fingerprint()}-" +
+               content_hash)
+        return os.path.join(self.directory, key + ".pkl")
+
+    def get(self, content_hash):
+        """ Returns the saved analysis of an article.
+            Args:
+                content_hash (string) : hash of the article's text
+            Returns:
+                Dictionary of the article's analysis, or None if the article
+                has not been analyzed.
+        """
+        path = self.get_path(content_hash)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        with open(path, 'rb') as file:
+            analysis = pickle.load(file)
+        self.hits += 1
+        return analysis
+
+    def put(self, content_hash, analysis):
+        """ Saves the analysis of an article. The analysis is written to a
+            temporary file first so a run that is interrupted cannot leave a
+            partial analysis behind. The temporary file is named after the
+            process and thread, so concurrent writers never share one.
+            Args:
+                content_hash (string) : hash of the article's text
+                analysis (dictionary) : the article's analysis
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.get_path(content_hash)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as file:
+            pickle.dump(analysis, file)
+        os.replace(temp_path, path)
+
+    def get_stats(self):
+        """ Returns the number of analyses found and not found in the cache.
+        """
+        return {"hits" : self.hits, "misses" : self.misses}
+
+
+REGISTRY.register("article_cache", ArticleCache)
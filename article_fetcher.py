@@ -0,0 +1,239 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+""" Number of candidate articles that are downloaded at the same time.
+"""
+N_CONCURRENT_FETCHES = 4
+
+""" Seconds a single request may take before it is abandoned.
+"""
+REQUEST_TIMEOUT = 10
+
+""" Seconds a whole fetch may take before it gives up.
+"""
+FETCH_DEADLINE = 30
+
+""" Maximum number of candidate articles tried in one fetch.
+"""
+MAX_FETCH_ATTEMPTS = 12
+
+
+class ArticleFetcher():
+    """ Downloads candidate news articles concurrently and returns the first
+        one whose text is long enough. Pages are downloaded through a pooled
+        HTTP session on a small thread pool driven by asyncio, every request
+        has a timeout, and the whole fetch has a deadline, so a slow or dead
+        publisher cannot stall the system. A process forked from one that
+        has used the fetcher starts its own session and threads.
+
+    Attributes
+    ----------
+    extract_text : function
+        Takes the HTML of an article page and returns the article's text.
+    min_length : int
+        The minimum length of an article's text.
+    n_concurrent : int
+        The number of candidates downloaded at the same time.
+    request_timeout : float
+        Seconds a single request may take.
+    deadline : float
+        Seconds a whole fetch may take.
+    max_attempts : int
+        The maximum number of candidates tried in one fetch.
+    session : Session
+        The pooled HTTP session used for every request.
+    executor : ThreadPoolExecutor
+        Threads that the blocking requests and parsing run on.
+    pid : int
+        The process the session and threads were started in.
+    latencies : list
+        Seconds taken by each request.
+    metrics : dictionary
+        Counts of requests, failures, timeouts, downloads skipped because
+        their fetch had ended, and fetches.
+    lock : Lock
+        Protects the metrics, which are updated from the threads.
+
+    Methods
+    -------
+    start_pools():
+        Starts the HTTP session and the threads.
+    download():
+        Downloads a page.
+    fetch_candidate():
+        Downloads and extracts the text of one candidate article.
+    fetch_first():
+        Returns the first candidate article that is long enough.
+    fetch():
+        Runs fetch_first to completion.
+    get_metrics():
+        Returns the request and latency metrics.
+    """
+
+    def __init__(self, extract_text, min_length, 
+                 n_concurrent=N_CONCURRENT_FETCHES, 
+                 request_timeout=REQUEST_TIMEOUT, deadline=FETCH_DEADLINE,
+                 max_attempts=MAX_FETCH_ATTEMPTS):
+        self.extract_text = extract_text
+        self.min_length = min_length
+        self.n_concurrent = n_concurrent
+        self.request_timeout = request_timeout
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.latencies = []
+        self.metrics = {"requests" : 0, "failures" : 0, "timeouts" : 0,
+                        "expired" : 0, "fetches" : 0, "failed_fetches" : 0}
+        self.lock = threading.Lock()
+        self.start_pools()
+
+    def start_pools(self):
+        """ Starts the pooled HTTP session and the threads the requests run
+            on in the current process. The threads of a forked parent do not
+            exist in the child, so they cannot be reused there.
+        """
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.n_concurrent, 
+                              pool_maxsize=self.n_concurrent)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=self.n_concurrent)
+        self.pid = os.getpid()
+
+    def download(self, url, end_time=None):
+        """ Downloads a page, recording how long the request took. A request
+            that is already running cannot be stopped when its fetch ends, so
+            its timeout is cut to the time left before the fetch's deadline,
+            and a download that only gets a thread after the deadline is
+            skipped. Downloads left over from a fetch therefore stop by its
+            deadline instead of holding threads the next fetch needs (a
+            server that keeps sending data slowly can still hold a thread
+            longer, since the timeout applies to each read).
+            Args:
+                url (string) : the page to download
+                end_time (float) : time.monotonic() time the fetch ends at
+            Returns:
+                The HTML of the page, or None if the request failed or the
+                fetch had ended.
+        """
+        timeout = self.request_timeout
+        if end_time is not None:
+            timeout = min(timeout, end_time - time.monotonic())
+            if timeout <= 0:
+                with self.lock:
+                    self.metrics["expired"] += 1
+                return None
+
+        start = time.perf_counter()
+        failure = None
+        try:
+            response = self.session.get(url, timeout=timeout)
+            if response.status_code != 200:
+                failure = "failures"
+        except requests.Timeout:
+            failure = "timeouts"
+        except requests.RequestException:
+            failure = "failures"
+
+        with self.lock:
+            self.latencies.append(time.perf_counter() - start)
+            self.metrics["requests"] += 1
+            if failure is not None:
+                self.metrics[failure] += 1
+        return None if failure is not None else response.text
+
+    async def fetch_candidate(self, candidate, end_time):
+        """ Downloads a candidate article and extracts its text, both on the
+            thread pool.
+            Args:
+                candidate (dictionary) : NewsAPI article with a url
+                end_time (float) : time.monotonic() time the fetch ends at
+            Returns:
+                The article's text, or None if it could not be downloaded.
+        """
+        loop = asyncio.get_running_loop()
+        html = await loop.run_in_executor(self.executor, self.download, 
+                                          candidate['url'], end_time)
+        if html is None:
+            return None
+        return await loop.run_in_executor(self.executor, self.extract_text, 
+                                          html)
+
+    async def fetch_first(self, candidates):
+        """ Downloads up to n_concurrent candidates at a time, starting the
+            next candidate whenever one finishes, and returns the first one
+            whose text is at least min_length long. Gives up after 
+            max_attempts candidates or once the deadline has passed.
+            Args:
+                candidates (list) : NewsAPI articles in the order to try them
+            Returns:
+                The chosen candidate and its text, or None if no candidate
+                was long enough in time.
+        """
+        end_time = time.monotonic() + self.deadline
+        remaining = iter(candidates[:self.max_attempts])
+        tasks = {}
+
+        def start_next():
+            candidate = next(remaining, None)
+            if candidate is not None:
+                task = asyncio.ensure_future(self.fetch_candidate(candidate, 
+                                                                  end_time))
+                tasks[task] = candidate
+
+        for _ in range(self.n_concurrent):
+            start_next()
+
+        result = None
+        while tasks and result is None and time.monotonic() < end_time:
+            done, _ = await asyncio.wait(tasks.keys(), 
+                                         timeout=end_time - time.monotonic(),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                candidate = tasks.pop(task)
+                text = task.result()
+                if result is None and text is not None and \
+                                            len(text) >= self.min_length:
+                    result = (candidate, text)
+                elif result is None:
+                    start_next()
+
+        for task in tasks:
+            task.cancel()
+        return result
+
+    def fetch(self, candidates):
+        """ Fetches the first candidate article that is long enough, blocking
+            until one is found or the fetch gives up.
+            Args:
+                candidates (list) : NewsAPI articles in the order to try them
+            Returns:
+                The chosen candidate and its text, or None.
+        """
+        if self.pid != os.getpid():
+            self.start_pools()
+        result = asyncio.run(self.fetch_first(candidates))
+        with self.lock:
+            self.metrics["fetches"] += 1
+            if result is None:
+                self.metrics["failed_fetches"] += 1
+        return result
+
+    def get_metrics(self):
+        """ Returns the request counts along with the mean, median, and
+            maximum request latency in seconds.
+            Returns:
+                Dictionary of metrics.
+        """
+        with self.lock:
+            metrics = dict(self.metrics)
+            latencies = sorted(self.latencies)
+        if latencies:
+            metrics["mean_latency"] = sum(latencies) / len(latencies)
+            metrics["median_latency"] = latencies[len(latencies) // 2]
+            metrics["max_latency"] = latencies[-1]
+        return metrics
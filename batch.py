@@ -0,0 +1,171 @@
+import argparse
+import json
+import os
+import time
+from evaluation import ParallelEvaluator
+from high_level_system import GeneratorSystem, SONNET_RHYME_SCHEME
+from news_api import CATEGORIES, get_fetch_metrics
+from tracing import TRACER
+
+
+def parse_job(line):
+    """ Parses one line of a batch queue. A line is either a news category,
+        the url of an article, or the path of a local article file.
+        Args:
+            line (string) : the line to parse
+        Returns:
+            Dictionary with the job's kind ("category", "url", or "file") and
+            value.
+    """
+    line = line.strip()
+    if line in CATEGORIES:
+        return {"kind" : "category", "value" : line}
+    if line.startswith("http://") or line.startswith("https://"):
+        return {"kind" : "url", "value" : line}
+    return {"kind" : "file", "value" : line}
+
+
+def read_queue(path):
+    """ Reads the jobs of a batch queue file, skipping blank lines and lines
+        starting with "#".
+        Args:
+            path (string) : the queue file
+        Returns:
+            List of jobs.
+    """
+    with open(path) as file:
+        return [parse_job(line) for line in file 
+                if line.strip() and not line.strip().startswith("#")]
+
+
+def load_article_file(path):
+    """ Loads an article from a local file. JSON files must contain the 
+        article's title and text (and optionally a description). In any other
+        file, the first line is the title and the rest is the text.
+        Args:
+            path (string) : the article file
+        Returns:
+            Dictionary with the article's title, text, and description.
+    """
+    with open(path) as file:
+        if os.path.splitext(path)[1] == ".json":
+            article = json.load(file)
+        else:
+            title, _, text = file.read().partition("\n")
+            article = {"title" : title.strip(), "text" : text}
+    article.setdefault("description", article["title"])
+    return article
+
+
+def run_job(job, n_poems, n_iterations, workers, seed, evaluator=None):
+    """ Generates and writes a poem for one job.
+        Args:
+            job (dictionary) : the job to run
+            n_poems (int) : the number of poems in each generation
+            n_iterations (int) : the number of genetic algorithm iterations
+            workers (int) : the number of processes used for the poems
+            seed (int) : the seed of the run
+            evaluator (ParallelEvaluator) : the pool that scores the poems
+                when workers > 1, if it is shared with other jobs
+        Returns:
+            The folder the poem was written to.
+    """
+    generator = GeneratorSystem(n_poems, workers=workers, seed=seed, 
+                                evaluator=evaluator)
+    try:
+        if job["kind"] == "category":
+            generator.fetch_reference_article(category=job["value"])
+        elif job["kind"] == "url":
+            generator.fetch_reference_article(url=job["value"])
+        else:
+            generator.fetch_reference_article(
+                                    article=load_article_file(job["value"]))
+        generator.generate_original_poems()
+        generator.run_genetic_algo_iterations(n_iterations)
+        return generator.write_poems_to_files()
+    finally:
+        generator.close()
+
+
+def run_batch(jobs, n_poems=5, n_iterations=5, workers=1, seed=None):
+    """ Runs every job in one process, so the models that are loaded for the
+        first job stay loaded for the rest. With more than one worker, the
+        jobs share one pool of processes that score poems, so its workers
+        load their models once for the whole batch. A job that fails is 
+        reported and skipped.
+        Args:
+            jobs (list) : the jobs to run
+            n_poems (int) : the number of poems in each generation
+            n_iterations (int) : the number of genetic algorithm iterations
+            workers (int) : the number of processes used for the poems
+            seed (int) : the seed of the first job (each job after it uses 
+                the next seed)
+        Returns:
+            Dictionary with the result of each job, the overall throughput,
+            and the metrics of the article downloads.
+    """
+    results = []
+    start = time.perf_counter()
+    evaluator = None
+    if workers > 1:
+        evaluator = ParallelEvaluator(None, SONNET_RHYME_SCHEME, workers)
+    try:
+        for i, job in enumerate(jobs):
+            print(f"Running job {i+1} of {len(jobs)}: {job['kind']} " +
+                  f"{job['value']}")
+            job_start = time.perf_counter()
+            result = {"job" : job}
+            try:
+                job_seed = None if seed is None else seed + i
+                result["path"] = run_job(job, n_poems, n_iterations, workers,
+                                         job_seed, evaluator)
+            except Exception as error:
+                result["error"] = repr(error)
+                print(f"Job {i+1} failed: {error!r}")
+            result["seconds"] = time.perf_counter() - job_start
+            results.append(result)
+    finally:
+        if evaluator is not None:
+            evaluator.close()
+
+    total_seconds = time.perf_counter() - start
+    n_poems_written = sum(1 for result in results if "path" in result)
+    summary = {"jobs" : len(jobs), "poems" : n_poems_written, 
+               "failed" : len(jobs) - n_poems_written,
+               "seconds" : total_seconds,
+               "poems_per_hour" : 3600 * n_poems_written / total_seconds 
+                                  if total_seconds > 0 else 0.0,
+               "fetch_metrics" : get_fetch_metrics(), "results" : results}
+    print(f"Wrote {n_poems_written} poems from {len(jobs)} jobs in " +
+          f"{total_seconds:.1f} seconds " +
+          f"({summary['poems_per_hour']:.1f} poems per hour)")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates a poem for every "
+                                     + "category, url, or article file in a "
+                                     + "queue file, one per line.")
+    parser.add_argument("queue", help="path of the queue file")
+    parser.add_argument("--n_poems", type=int, default=5)
+    parser.add_argument("--n_iterations", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--report", default=None,
+                        help="path to write the JSON throughput report to")
+    parser.add_argument("--trace", action="store_true",
+                        help="write a trace of each job next to its poem")
+    args = parser.parse_args()
+
+    if args.trace:
+        TRACER.enable()
+
+    summary = run_batch(read_queue(args.queue), args.n_poems, 
+                        args.n_iterations, args.workers, args.seed)
+    if args.report is not None:
+        with open(args.report, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
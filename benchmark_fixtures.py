@@ -0,0 +1,215 @@
+import os
+import re
+from collections import namedtuple
+from gensim.models import Word2Vec as GensimWord2Vec
+from nlp_resources import REGISTRY
+from bigram_store import BigramStore
+from scrape_reddit import ScrapeReddit
+from poetry_store import PoetryStore
+from parsed_lines import ParsedLines
+from article_cache import ArticleCache
+
+""" Folder of past runs whose poems and reference articles are used as the
+    benchmark fixtures, and the run whose article is the fixture article.
+"""
+FIXTURE_DIR = "generated_poems"
+FIXTURE_RUN = "2023-11-19_18:17:13"
+
+""" Author given to the fixture sonnets in the fixture poetry store.
+"""
+FIXTURE_AUTHOR = "Benchmark Fixture"
+
+""" Settings of the small Word2Vec model trained on the fixtures. Training
+    with one worker and a fixed seed makes the model the same on every run.
+"""
+FIXTURE_WORD2VEC_SETTINGS = {"vector_size" : 50, "window" : 5,
+                             "min_count" : 1, "workers" : 1, "seed" : 0}
+
+""" A grammar problem found by LocalGrammarTool, with the same attributes
+    the system reads from LanguageTool matches.
+"""
+GrammarMatch = namedtuple("GrammarMatch", ["offset", "errorLength", "ruleId",
+                                           "replacements"])
+
+""" Patterns checked by LocalGrammarTool, each with the id of the rule and a
+    function that returns the replacement of the matched text.
+"""
+GRAMMAR_RULES = [
+    ("ENGLISH_WORD_REPEAT_RULE", re.compile(r"\b(\w+) \1\b", re.IGNORECASE),
+     lambda match: match.group(1)),
+    ("EN_A_VS_AN", re.compile(r"\b[aA] (?=[aeiouAEIOU])"),
+     lambda match: match.group(0)[0] + "n "),
+    ("I_LOWERCASE", re.compile(r"\bi\b"), lambda match: "I"),
+    ("WHITESPACE_RULE", re.compile(r"(?<=\S) {2,}(?=\S)"),
+     lambda match: " "),
+    ("COMMA_PARENTHESIS_WHITESPACE", re.compile(r" (?=[,.;:!?])"),
+     lambda match: ""),
+]
+
+
+class LocalGrammarTool():
+    """ Offline stand-in for the LanguageTool server. Finds a few common
+        kinds of grammar problems with regular expressions, so benchmarks
+        exercise the same batching, offset bookkeeping, and correction code
+        as real runs without starting a server.
+
+    Attributes
+    ----------
+    n_checks : int
+        The number of texts that have been checked.
+
+    Methods
+    -------
+    check():
+        Returns the grammar problems found in a text.
+    correct():
+        Returns a text with every problem found in it fixed.
+    """
+
+    def __init__(self):
+        self.n_checks = 0
+
+    def check(self, text):
+        """ Finds the grammar problems in a text.
+            Args:
+                text (string) : the text to check
+            Returns:
+                List of GrammarMatch, sorted by offset.
+        """
+        self.n_checks += 1
+        matches = []
+        for rule_id, pattern, replace in GRAMMAR_RULES:
+            for match in pattern.finditer(text):
+                matches.append(GrammarMatch(match.start(),
+                                            match.end() - match.start(),
+                                            rule_id, [replace(match)]))
+        return sorted(matches, key=lambda match: match.offset)
+
+    def correct(self, text):
+        """ Fixes the grammar problems in a text, skipping problems that
+            overlap one that was already fixed.
+            Args:
+                text (string) : the text to correct
+            Returns:
+                The corrected text.
+        """
+        corrected, end = [], 0
+        for match in self.check(text):
+            if match.offset < end:
+                continue
+            corrected.append(text[end:match.offset])
+            corrected.append(match.replacements[0])
+            end = match.offset + match.errorLength
+        corrected.append(text[end:])
+        return "".join(corrected)
+
+
+def space_punctuation(line):
+    """ Separates punctuation from words with spaces, which is how lines are
+        stored while poems are being generated.
+        Args:
+            line (string) : the line to format
+        Returns:
+            The formatted line.
+    """
+    return " ".join(re.sub(r"([^\w\s'])", r" \1 ", line).split())
+
+
+def load_fixture_sonnets(directory=FIXTURE_DIR):
+    """ Reads the best poem of every past run in a folder.
+        Args:
+            directory (string) : the folder of past runs
+        Returns:
+            List of sonnets, each a list of 14 lines with their punctuation
+            spaced from the words.
+    """
+    sonnets = []
+    for run in sorted(os.listdir(directory)):
+        path = os.path.join(directory, run, "rank_1.txt")
+        if not os.path.exists(path):
+            continue
+        with open(path) as file:
+            lines = [line.strip() for line in file.read().split("\n")[2:]]
+        lines = [space_punctuation(line) for line in lines if line]
+        if len(lines) == 14:
+            sonnets.append(lines)
+    return sonnets
+
+
+def load_fixture_article(directory=FIXTURE_DIR, run=FIXTURE_RUN):
+    """ Reads the reference article of a past run.
+        Args:
+            directory (string) : the folder of past runs
+            run (string) : the name of the run
+        Returns:
+            Dictionary with the article's title, text, and description.
+    """
+    path = os.path.join(directory, run)
+    with open(os.path.join(path, "reference_article_title.txt")) as file:
+        title = file.read().strip()
+    with open(os.path.join(path, "reference_article_description.txt")) as file:
+        description = file.read().strip()
+    with open(os.path.join(path, "reference_article.txt")) as file:
+        lines = file.read().strip().split("\n")
+
+    # The file starts with a header and the title and ends with the sentiment
+    lines = [line for line in lines[2:] if not line.startswith("Sentiment:")]
+    return {"title" : title, "text" : "\n".join(lines).strip(),
+            "description" : description}
+
+
+def load_fixture_texts(directory=FIXTURE_DIR):
+    """ Returns the text of every reference article and poem of the past
+        runs, which the fixture bigram and Word2Vec models are trained on.
+    """
+    texts = []
+    for run in sorted(os.listdir(directory)):
+        try:
+            article = load_fixture_article(directory, run)
+        except FileNotFoundError:
+            continue
+        texts.extend(line for line in article["text"].split("\n") if line)
+    for sonnet in load_fixture_sonnets(directory):
+        texts.extend(sonnet)
+    return texts
+
+
+def setup_fixtures(work_dir, directory=FIXTURE_DIR):
+    """ Replaces the models in the shared registry with small ones built from
+        the fixtures, so benchmarks run offline, do not read or overwrite
+        anything in nlp_models, and do the same work on every run. spaCy and
+        the rhyme index are loaded as usual, since both are local.
+        Args:
+            work_dir (string) : folder the fixture models are saved in
+            directory (string) : the folder of past runs
+        Returns:
+            Dictionary with the fixture article and sonnets.
+    """
+    sonnets = load_fixture_sonnets(directory)
+    texts = load_fixture_texts(directory)
+    nlp = REGISTRY.get("spacy")
+
+    REGISTRY.set("grammar_tool", LocalGrammarTool())
+    REGISTRY.unload("grammar_checker")
+
+    # The bigram model is built by the same code as the Reddit one
+    REGISTRY.set("bigram_model", BigramStore.from_model({}))
+    reddit_scraper = ScrapeReddit()
+    reddit_scraper.model_path = os.path.join(work_dir, "bigram_model")
+    reddit_scraper.build_bigram_model(texts)
+
+    sentences = [[token.text for token in doc] for doc in nlp.pipe(texts)]
+    REGISTRY.set("base_word2vec", GensimWord2Vec(sentences=sentences,
+                                                 **FIXTURE_WORD2VEC_SETTINGS))
+
+    poetry_store = PoetryStore(os.path.join(work_dir, "poetry.db"))
+    poetry_store.add_poems([{"title" : f"Fixture {i}",
+                             "author" : FIXTURE_AUTHOR, "lines" : sonnet}
+                            for i, sonnet in enumerate(sonnets)])
+    REGISTRY.set("poetry_store", poetry_store)
+    REGISTRY.set("parsed_lines", ParsedLines.build(
+                        [line for sonnet in sonnets for line in sonnet], nlp))
+    REGISTRY.set("article_cache",
+                 ArticleCache(os.path.join(work_dir, "article_cache")))
+
+    return {"article" : load_fixture_article(directory), "sonnets" : sonnets}
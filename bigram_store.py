@@ -0,0 +1,421 @@
+import os
+import pickle
+import numpy as np
+
+""" Names of the files that make up a stored bigram model.
+"""
+VOCAB_FILE = "vocab.txt"
+OFFSETS_FILE = "offsets.npy"
+SUCCESSORS_FILE = "successors.npy"
+COUNTS_FILE = "counts.npy"
+
+""" Names of the files of the arrays that a stored bigram model may or may
+    not have, keyed by the BigramStore attribute they hold.
+"""
+OPTIONAL_FILES = {"alias_probs" : "alias_probs.npy",
+                  "aliases" : "aliases.npy",
+                  "totals" : "unigram_counts.npy",
+                  "doc_freqs" : "doc_freqs.npy",
+                  "n_texts" : "n_texts.npy",
+                  "pair_keys" : "pair_keys.npy"}
+
+
+def build_alias_table(counts):
+    """ Builds a Walker alias table for sampling indices in proportion to 
+        their counts, using Vose's method. To sample, an index k is drawn
+        uniformly, and it is kept with probability probs[k] or replaced by 
+        aliases[k] otherwise.
+        Args:
+            counts (array) : the weights of each index
+        Returns:
+            Array of acceptance probabilities and array of alias indices.
+    """
+    n = len(counts)
+    scaled = list(np.asarray(counts, dtype=np.float64) * n / np.sum(counts))
+    probs = np.ones(n, dtype=np.float64)
+    aliases = np.arange(n, dtype=np.int32)
+    small = [i for i in range(n) if scaled[i] < 1]
+    large = [i for i in range(n) if scaled[i] >= 1]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        probs[less] = scaled[less]
+        aliases[less] = more
+        scaled[more] = scaled[more] + scaled[less] - 1
+        if scaled[more] < 1:
+            small.append(more)
+        else:
+            large.append(more)
+    return probs, aliases
+
+
+class BigramStore():
+    """ Compact, array-backed bigram model. Words are mapped to integer ids
+        and the words that followed each word are stored in CSR form: the
+        successors of word i are successors[offsets[i]:offsets[i + 1]], sorted
+        by id, with their frequencies in the same slice of counts. The arrays
+        are memory-mapped when loaded, so loading is nearly instant and
+        processes that open the same model share its pages. Each word's slice 
+        of the alias arrays is a Walker alias table over its successors, which
+        lets a next word be sampled in constant time.
+
+    Attributes
+    ----------
+    words : list
+        The vocabulary, where a word's index is its id.
+    word_ids : dictionary
+        Maps words to their ids.
+    offsets : array
+        Start of each word's successors in the successor and count arrays.
+    successors : array
+        Ids of the words that followed each word.
+    counts : array
+        The number of times each successor followed the word.
+    alias_probs : array
+        Acceptance probability of each successor in its word's alias table.
+    aliases : array
+        Index (within its word's successors) of each successor's alias.
+    totals : array
+        Number of times each word was followed by any word, by word id.
+    doc_freqs : array
+        Number of corpus texts each word appeared in, by word id (None if
+        the model was converted from a pickle without the texts).
+    n_texts : array
+        Single element array with the number of texts in the corpus (None if
+        the model was converted from a pickle without the texts).
+    pair_keys : array
+        Sorted key of every stored bigram, used to look up many bigrams at
+        once. Saved with the model so it is memory-mapped and shared like
+        the other arrays.
+
+    Methods
+    -------
+    from_model():
+        Builds a store from a dictionary of Counters.
+    load():
+        Opens a store saved on disk.
+    save():
+        Writes the store to disk.
+    get_id():
+        Returns the id of a word.
+    get_successors():
+        Returns the ids and counts of the words that followed a word.
+    get_count():
+        Returns the number of times one word followed another.
+    get_total():
+        Returns the number of times a word was followed by any word.
+    build_alias_tables():
+        Builds the alias tables of every word's successors.
+    sample_successor():
+        Samples the id of a word likely to follow another word.
+    get_pair_keys():
+        Returns a sorted key for every stored bigram.
+    get_totals():
+        Returns the number of times each word was followed by any word.
+    lookup_counts():
+        Returns the frequencies of many bigrams at once.
+    lookup_ids():
+        Returns the ids of many words at once.
+    lookup_totals():
+        Returns the unigram totals of many words at once.
+    lookup_doc_freqs():
+        Returns the document frequencies of many words at once.
+    get_n_texts():
+        Returns the number of texts in the corpus.
+    """
+
+    def __init__(self, words, offsets, successors, counts, alias_probs=None,
+                 aliases=None, totals=None, doc_freqs=None, n_texts=None,
+                 pair_keys=None):
+        self.words = words
+        self.word_ids = {word : i for i, word in enumerate(words)}
+        self.offsets = offsets
+        self.successors = successors
+        self.counts = counts
+        self.alias_probs = alias_probs
+        self.aliases = aliases
+        self.totals = totals
+        self.doc_freqs = doc_freqs
+        self.n_texts = n_texts
+        self.pair_keys = pair_keys
+
+    @classmethod
+    def from_model(cls, bigram_model, doc_freqs=None, n_texts=None):
+        """ Builds a store from a bigram model where keys are words and values
+            are Counters mapping the following words to their frequencies.
+            The unigram totals and bigram keys are computed at the same time,
+            so they are saved with the model.
+            Args:
+                bigram_model (dictionary) : the bigram model to convert
+                doc_freqs (Counter) : number of texts each word appeared in,
+                    if known
+                n_texts (int) : number of texts in the corpus, if known
+            Returns:
+                The equivalent BigramStore.
+        """
+        vocab = set(bigram_model.keys())
+        for next_words in bigram_model.values():
+            vocab.update(next_words.keys())
+        words = sorted(vocab)
+        word_ids = {word : i for i, word in enumerate(words)}
+
+        offsets = np.zeros(len(words) + 1, dtype=np.int64)
+        successors, counts = [], []
+        for i, word in enumerate(words):
+            next_words = bigram_model.get(word, {})
+            row = sorted((word_ids[next], count)
+                         for next, count in next_words.items())
+            successors.extend(next_id for next_id, _ in row)
+            counts.extend(count for _, count in row)
+            offsets[i + 1] = offsets[i] + len(row)
+
+        store = cls(words, offsets, np.array(successors, dtype=np.int32),
+                    np.array(counts, dtype=np.int32))
+        store.build_alias_tables()
+        store.get_totals()
+        store.get_pair_keys()
+        if doc_freqs is not None:
+            store.doc_freqs = np.array([doc_freqs.get(word, 0) 
+                                        for word in words], dtype=np.int32)
+        if n_texts is not None:
+            store.n_texts = np.array([n_texts], dtype=np.int64)
+        return store
+
+    @classmethod
+    def load(cls, path):
+        """ Opens a store that was saved to a directory. The arrays are
+            memory-mapped rather than read into memory.
+            Args:
+                path (string) : the directory the store was saved to
+            Returns:
+                The loaded BigramStore.
+        """
+        with open(os.path.join(path, VOCAB_FILE), encoding="utf-8") as f:
+            words = f.read().split("\n")[:-1]
+        arrays = [np.load(os.path.join(path, file_name), mmap_mode='r')
+                  for file_name in [OFFSETS_FILE, SUCCESSORS_FILE, COUNTS_FILE]]
+        optional_arrays = {}
+        for name, file_name in OPTIONAL_FILES.items():
+            if os.path.exists(os.path.join(path, file_name)):
+                optional_arrays[name] = np.load(os.path.join(path, file_name),
+                                                mmap_mode='r')
+        return cls(words, *arrays, **optional_arrays)
+
+    def save(self, path):
+        """ Writes the vocabulary and arrays of the store to a directory.
+            Args:
+                path (string) : the directory to save the store to
+        """
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, VOCAB_FILE), "w", encoding="utf-8") as f:
+            for word in self.words:
+                f.write(word + "\n")
+        np.save(os.path.join(path, OFFSETS_FILE), np.asarray(self.offsets))
+        np.save(os.path.join(path, SUCCESSORS_FILE),
+                np.asarray(self.successors))
+        np.save(os.path.join(path, COUNTS_FILE), np.asarray(self.counts))
+        for name, file_name in OPTIONAL_FILES.items():
+            if getattr(self, name) is not None:
+                np.save(os.path.join(path, file_name), 
+                        np.asarray(getattr(self, name)))
+
+    def get_id(self, word):
+        """ Returns the id of a word, or -1 if it is not in the vocabulary.
+        """
+        return self.word_ids.get(word, -1)
+
+    def get_successors(self, word):
+        """ Returns the words that followed a word and their frequencies.
+            Args:
+                word (string) : the preceding word
+            Returns:
+                Array of successor ids and array of their counts.
+        """
+        word_id = self.get_id(word)
+        if word_id < 0:
+            return self.successors[:0], self.counts[:0]
+        start, end = self.offsets[word_id], self.offsets[word_id + 1]
+        return self.successors[start:end], self.counts[start:end]
+
+    def get_count(self, prev, next):
+        """ Returns the number of times one word followed another.
+            Args:
+                prev (string) : the preceding word
+                next (string) : the following word
+            Returns:
+                The frequency of the bigram.
+        """
+        next_id = self.get_id(next)
+        if next_id < 0:
+            return 0
+        successors, counts = self.get_successors(prev)
+        idx = np.searchsorted(successors, next_id)
+        if idx < len(successors) and successors[idx] == next_id:
+            return int(counts[idx])
+        return 0
+
+    def get_total(self, word):
+        """ Returns the number of times a word was followed by any word.
+        """
+        return int(self.lookup_totals([word])[0])
+
+    def build_alias_tables(self):
+        """ Builds a Walker alias table over the successors of every word,
+            stored in the same CSR layout as the successors. This is done
+            once when the model is built (or when an older model without
+            tables is first sampled from).
+        """
+        self.alias_probs = np.ones(len(self.successors), dtype=np.float64)
+        self.aliases = np.zeros(len(self.successors), dtype=np.int32)
+        for i in range(len(self.words)):
+            start, end = self.offsets[i], self.offsets[i + 1]
+            if end - start > 1:
+                probs, aliases = build_alias_table(self.counts[start:end])
+                self.alias_probs[start:end] = probs
+                self.aliases[start:end] = aliases
+
+    def sample_successor(self, word_id, rand_idx, rand_accept):
+        """ Samples a word that followed the given word, with probability
+            proportional to how often it did so. Takes constant time no matter
+            how many successors the word has.
+            Args:
+                word_id (int) : the id of the preceding word
+                rand_idx (float) : uniform random number used to pick a slot
+                rand_accept (float) : uniform random number used to choose
+                    between the slot and its alias
+            Returns:
+                The id of the sampled word, or -1 if the word has no
+                successors.
+        """
+        if self.alias_probs is None:
+            self.build_alias_tables()
+        start, end = self.offsets[word_id], self.offsets[word_id + 1]
+        if end == start:
+            return -1
+        k = min(int(rand_idx * (end - start)), end - start - 1)
+        if rand_accept >= self.alias_probs[start + k]:
+            k = self.aliases[start + k]
+        return int(self.successors[start + k])
+
+    def get_pair_keys(self):
+        """ Returns a key for every stored bigram, computed as the id of the
+            preceding word times the vocabulary size plus the id of the
+            following word. Since rows are in id order and successors are 
+            sorted within each row, the keys are sorted and can be binary
+            searched all at once. These are stored with the model, and only
+            computed here for models saved without them.
+            Returns:
+                The sorted array of bigram keys.
+        """
+        if self.pair_keys is None:
+            prev_ids = np.repeat(np.arange(len(self.words), dtype=np.int64),
+                                 np.diff(self.offsets))
+            self.pair_keys = prev_ids * len(self.words) + self.successors
+        return self.pair_keys
+
+    def get_totals(self):
+        """ Returns the number of times each word was followed by any word,
+            indexed by word id. These are stored with the model, and only
+            computed here for models saved without them.
+        """
+        if self.totals is None:
+            cum_counts = np.concatenate([[0], np.cumsum(self.counts, 
+                                                        dtype=np.int64)])
+            self.totals = cum_counts[self.offsets[1:]] - \
+                                            cum_counts[self.offsets[:-1]]
+        return self.totals
+
+    def lookup_counts(self, prev_ids, next_ids):
+        """ Returns the frequency of every bigram in a pair of id arrays in
+            one vectorized binary search. Pairs containing an unknown word
+            (id -1) have a frequency of 0.
+            Args:
+                prev_ids (array) : ids of the preceding words
+                next_ids (array) : ids of the following words
+            Returns:
+                Array of bigram frequencies.
+        """
+        prev_ids = np.asarray(prev_ids, dtype=np.int64)
+        next_ids = np.asarray(next_ids, dtype=np.int64)
+        pair_keys = self.get_pair_keys()
+        if len(pair_keys) == 0:
+            return np.zeros(len(prev_ids), dtype=np.int64)
+        keys = prev_ids * len(self.words) + next_ids
+        idx = np.minimum(np.searchsorted(pair_keys, keys), len(pair_keys) - 1)
+        found = (prev_ids >= 0) & (next_ids >= 0) & (pair_keys[idx] == keys)
+        return np.where(found, self.counts[idx], 0)
+
+    def lookup_ids(self, words):
+        """ Returns the ids of a list of words (-1 for unknown words).
+        """
+        return np.array([self.word_ids.get(word, -1) for word in words], 
+                        dtype=np.int64)
+
+    def lookup_totals(self, words):
+        """ Returns the unigram total of every word in a list in one 
+            vectorized lookup (0 for unknown words).
+            Args:
+                words (list) : the words to look up
+            Returns:
+                Array of unigram totals.
+        """
+        ids = self.lookup_ids(words)
+        totals = self.get_totals()
+        if len(totals) == 0:
+            return np.zeros(len(ids), dtype=np.int64)
+        return np.where(ids >= 0, totals[np.maximum(ids, 0)], 0)
+
+    def lookup_doc_freqs(self, words):
+        """ Returns the number of corpus texts every word in a list appeared
+            in (0 for unknown words, or for every word if the model does not
+            have document frequencies).
+            Args:
+                words (list) : the words to look up
+            Returns:
+                Array of document frequencies.
+        """
+        ids = self.lookup_ids(words)
+        if self.doc_freqs is None or len(self.doc_freqs) == 0:
+            return np.zeros(len(ids), dtype=np.int64)
+        return np.where(ids >= 0, self.doc_freqs[np.maximum(ids, 0)], 0)
+
+    def get_n_texts(self):
+        """ Returns the number of texts in the corpus. Stores saved without
+            it fall back to the largest document frequency, and stores
+            without document frequencies to 0.
+        """
+        if self.n_texts is not None and len(self.n_texts):
+            return int(self.n_texts[0])
+        if self.doc_freqs is not None and len(self.doc_freqs):
+            return int(np.max(self.doc_freqs))
+        return 0
+
+    def __contains__(self, word):
+        """ Returns whether a word was ever followed by another word.
+        """
+        word_id = self.get_id(word)
+        return word_id >= 0 and \
+                        self.offsets[word_id + 1] > self.offsets[word_id]
+
+    def __len__(self):
+        """ Returns the number of words that were followed by another word.
+        """
+        return int(np.count_nonzero(np.diff(self.offsets)))
+
+
+def convert_pickle(pickle_path, store_path):
+    """ Converts a bigram model pickled as a dictionary of Counters into the
+        array-backed format.
+        Args:
+            pickle_path (string) : path of the pickled model
+            store_path (string) : directory to save the converted model to
+    """
+    with open(pickle_path, 'rb') as file:
+        bigram_model = pickle.load(file)
+    store = BigramStore.from_model(bigram_model)
+    store.save(store_path)
+    print(f"Converted bigram model with {len(store)} words")
+
+
+if __name__ == "__main__":
+    from nlp_resources import BIGRAM_MODEL_PATH, PICKLED_BIGRAM_MODEL_PATH
+    convert_pickle(PICKLED_BIGRAM_MODEL_PATH, BIGRAM_MODEL_PATH)
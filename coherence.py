@@ -0,0 +1,154 @@
+import re
+import numpy as np
+from lru_cache import LRUCache
+from nlp_resources import REGISTRY
+
+""" Ways of scoring coherence: "count" averages the raw bigram frequency of
+    each pair of adjacent words, and "log_prob" averages the add-k smoothed
+    log-probability of each word given the previous word and scores the text
+    with its exponential (the inverse perplexity, between 0 and 1), so the
+    score is never negative and can be used in the fitness.
+"""
+COHERENCE_METHODS = ["count", "log_prob"]
+
+
+class CoherenceEngine():
+    """ Scores how coherent texts are using the Reddit bigram model. Texts are
+        tokenized into vocabulary ids and the bigram frequencies of every
+        adjacent pair of words, across all of the texts, are looked up in one
+        vectorized pass.
+
+    Attributes
+    ----------
+    bigram_store : BigramStore
+        The bigram model used to look up word pair frequencies.
+    method : string
+        The default scoring method (one of COHERENCE_METHODS).
+    smoothing : float
+        The default k used for add-k smoothing of log-probabilities.
+    scores : LRUCache
+        Maps texts and scoring options to previously computed scores.
+
+    Methods
+    -------
+    tokenize():
+        Converts a text into an array of vocabulary ids.
+    score_pairs():
+        Scores each pair of adjacent words.
+    score_texts():
+        Returns the coherence of every text in a list.
+    score():
+        Returns the coherence of a single text.
+    """
+
+    def __init__(self, bigram_store, method="count", smoothing=1.0):
+        self.bigram_store = bigram_store
+        self.method = method
+        self.smoothing = smoothing
+        self.scores = LRUCache(maxsize=8192)
+
+    def tokenize(self, text):
+        """ Removes punctuation from a text, converts it to lowercase, and
+            maps each word to its id in the bigram vocabulary (-1 if the word
+            is unknown).
+            Args:
+                text (string) : the text to tokenize
+            Returns:
+                Array of word ids.
+        """
+        words = re.sub(r'[^\w\s]', '', text.lower()).split()
+        return np.array([self.bigram_store.get_id(word) for word in words],
+                        dtype=np.int64)
+
+    def score_pairs(self, prev_ids, next_ids, method, smoothing):
+        """ Scores pairs of adjacent words with the given method.
+            Args:
+                prev_ids (array) : ids of the first word of each pair
+                next_ids (array) : ids of the second word of each pair
+                method (string) : one of COHERENCE_METHODS
+                smoothing (float) : k used for add-k smoothing
+            Returns:
+                Array with the score of each pair.
+        """
+        counts = self.bigram_store.lookup_counts(prev_ids, next_ids)
+        if method == "count":
+            return counts.astype(np.float64)
+        if method == "log_prob":
+            totals = np.where(prev_ids >= 0,
+                    self.bigram_store.get_totals()[np.maximum(prev_ids, 0)], 0)
+            vocab_size = len(self.bigram_store.words)
+            return np.log((counts + smoothing) /
+                          (totals + smoothing * vocab_size))
+        raise ValueError(f"Unknown coherence method '{method}', expected " +
+                         f"one of {COHERENCE_METHODS}")
+
+    def score_texts(self, texts, method=None, smoothing=None):
+        """ Computes the coherence of every text from the average score of
+            its adjacent word pairs, so texts of different lengths are 
+            comparable. Averages of log-probabilities are turned into inverse
+            perplexities. Texts without word pairs score 0. Texts that were
+            scored before are taken from the cache, and the rest are 
+            tokenized and scored together in one vectorized pass.
+            Args:
+                texts (list) : the texts to score
+                method (string) : one of COHERENCE_METHODS (the engine's
+                    default if not given)
+                smoothing (float) : k used for add-k smoothing (the engine's
+                    default if not given)
+            Returns:
+                Array with the coherence of each text.
+        """
+        method = self.method if method is None else method
+        smoothing = self.smoothing if smoothing is None else smoothing
+
+        found, unscored = {}, []
+        for text in texts:
+            if text not in found:
+                found[text] = self.scores.get((text, method, smoothing))
+                if found[text] is None:
+                    unscored.append(text)
+
+        if unscored:
+            ids_list = [self.tokenize(text) for text in unscored]
+            lengths = np.array([len(ids) for ids in ids_list])
+            ids = np.concatenate(ids_list)
+            text_of = np.repeat(np.arange(len(unscored)), lengths)
+
+            # Only pairs of words from the same text are scored
+            same_text = text_of[:-1] == text_of[1:]
+            pair_scores = self.score_pairs(ids[:-1][same_text],
+                                           ids[1:][same_text], method,
+                                           smoothing)
+            sums = np.bincount(text_of[:-1][same_text], weights=pair_scores,
+                               minlength=len(unscored))
+            n_pairs = np.maximum(lengths - 1, 0)
+            means = sums / np.maximum(n_pairs, 1)
+            if method == "log_prob":
+                means = np.exp(means)
+            scores = np.where(n_pairs > 0, means, 0.0)
+
+            for text, score in zip(unscored, scores):
+                self.scores.put((text, method, smoothing), float(score))
+                found[text] = float(score)
+
+        return np.array([found[text] for text in texts], dtype=np.float64)
+
+    def score(self, text, method=None, smoothing=None):
+        """ Returns the coherence of a single text.
+            Args:
+                text (string) : the text to score
+                method (string) : one of COHERENCE_METHODS
+                smoothing (float) : k used for add-k smoothing
+            Returns:
+                The coherence of the text.
+        """
+        return float(self.score_texts([text], method, smoothing)[0])
+
+
+def load_coherence_engine():
+    """ Creates a coherence engine around the shared bigram model.
+    """
+    return CoherenceEngine(REGISTRY.get("bigram_model"))
+
+
+REGISTRY.register("coherence_engine", load_coherence_engine)
@@ -0,0 +1,19 @@
+import pytest
+from nlp_resources import REGISTRY
+from benchmark_fixtures import setup_fixtures
+
+
+@pytest.fixture(scope="session")
+def fixtures(tmp_path_factory):
+    """ Replaces the models in the shared registry with the small offline
+        ones the benchmarks use, for every test that needs them. Tests that
+        use the fixtures are skipped when spaCy's English model is not
+        installed.
+        Returns:
+            Dictionary with the fixture article and sonnets.
+    """
+    try:
+        REGISTRY.get("spacy")
+    except (ImportError, OSError) as error:
+        pytest.skip(f"spaCy's English model is not available: {error}")
+    return setup_fixtures(str(tmp_path_factory.mktemp("fixtures")))
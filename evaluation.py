@@ -0,0 +1,284 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+from nlp_resources import REGISTRY
+from fitness import Fitness, FITNESS_CACHE, SCORE_NAMES, combine_scores
+import grammar_checker # Registers the shared grammar checker
+from tracing import TRACER
+import coherence # Registers the shared coherence engine
+import rhyme_index # Registers the shared rhyme index
+from keyword_similarity import KeywordSimilarity
+from word2vec import VectorOverlay
+
+""" Resources every evaluation worker loads when it starts.
+"""
+WORKER_RESOURCES = ["spacy", "grammar_checker", "rhyme_index", 
+                    "coherence_engine"]
+
+""" Names of the values in the score vectors returned by the workers.
+"""
+SCORE_VECTOR_NAMES = SCORE_NAMES + ["sentiment"]
+
+""" State of an evaluation worker process: the rhyme scheme it was started
+    with and the data of the article it last scored poems for.
+"""
+WORKER_STATE = {}
+
+
+class ArticleData():
+    """ The parts of an article that are needed to score and mutate poems,
+        without the tools used to analyze the article. Small enough to send to
+        worker processes, and used in place of the Article there.
+
+    Attributes
+    ----------
+    pos_dics : dictionary
+        Maps entities/parts of speech to Counters of keyword scores.
+    sentiment_score : float
+        The article's polarity times its subjectivity.
+    content_hash : string
+        Hash of the article's text.
+    vector_words : list
+        The words that have article-specific vectors.
+    vectors : array
+        The article-specific vector of each word.
+    keyword_similarity : KeywordSimilarity
+        Keyword embeddings for finding similar keywords, built the first time
+        they are needed.
+
+    Methods
+    -------
+    from_article():
+        Takes a snapshot of an Article.
+    get_pos_dics():
+        Returns the keyword counters of the article.
+    get_sentiment_score():
+        Returns the sentiment score of the article.
+    get_content_hash():
+        Returns the hash of the article's text.
+    get_keyword_similarity():
+        Returns the keyword similarity structures of the article.
+    """
+
+    def __init__(self, pos_dics, sentiment_score, content_hash, 
+                 vector_words, vectors):
+        self.pos_dics = pos_dics
+        self.sentiment_score = sentiment_score
+        self.content_hash = content_hash
+        self.vector_words = list(vector_words)
+        self.vectors = vectors
+        self.keyword_similarity = None
+
+    @classmethod
+    def from_article(cls, article):
+        """ Copies the data of an Article that poems are scored with.
+            Args:
+                article (Article) : the reference article
+            Returns:
+                The ArticleData of the article.
+        """
+        word_vectors = article.get_word_vectors()
+        return cls(article.get_pos_dics(), article.get_sentiment_score(),
+                   article.get_content_hash(), word_vectors.words, 
+                   word_vectors.vectors)
+
+    def get_pos_dics(self):
+        """ Returns the keyword counters of the article.
+        """
+        return self.pos_dics
+
+    def get_sentiment_score(self):
+        """ Returns the polartiy of the article times its subjectivity.
+        """
+        return self.sentiment_score
+
+    def get_content_hash(self):
+        """ Returns the hash of the article's text.
+        """
+        return self.content_hash
+
+    def get_keyword_similarity(self):
+        """ Returns the article's keyword similarity structures, building
+            them from the base Word2Vec model and the article's vectors the
+            first time they are requested.
+        """
+        if self.keyword_similarity is None:
+            word_vectors = VectorOverlay(REGISTRY.get("base_word2vec").wv, 
+                                         self.vector_words, self.vectors)
+            self.keyword_similarity = KeywordSimilarity(word_vectors, 
+                                                        self.pos_dics)
+        return self.keyword_similarity
+
+
+def init_worker(rhyme_scheme):
+    """ Loads the models used for scoring in a worker process, so each worker
+        pays for them once instead of once per batch or per article. Workers
+        are not traced. Workers use the LanguageTool server of the parent
+        when they inherit it, and otherwise stop the one they start when they
+        exit.
+        Args:
+            rhyme_scheme (list) : the rhyme scheme of the poems
+    """
+    TRACER.disable()
+    grammar_checker.close_grammar_tool_on_worker_exit()
+    for name in WORKER_RESOURCES:
+        REGISTRY.get(name)
+    WORKER_STATE["article_data"] = None
+    WORKER_STATE["rhyme_scheme"] = rhyme_scheme
+
+
+def keep_article_data(article_data):
+    """ Returns the data of the article a batch was sent with, keeping it in
+        the worker. The data the worker already has is returned instead if it
+        is for the same article, since its keyword embeddings may already
+        have been built.
+        Args:
+            article_data (ArticleData) : the reference article's data
+        Returns:
+            The worker's data of the article.
+    """
+    kept = WORKER_STATE["article_data"]
+    if kept is None or \
+       kept.get_content_hash() != article_data.get_content_hash():
+        WORKER_STATE["article_data"] = article_data
+    return WORKER_STATE["article_data"]
+
+
+def score_batch(poems, article_data, rhyme_scheme):
+    """ Scores a batch of poems whose grammatical errors were already counted,
+        scoring the coherence of the whole batch at once. The error counts
+        are put in the grammar checker's cache, so the poems' fitnesses use
+        them instead of checking the poems again.
+        Args:
+            poems (list) : tuples of the lines of each poem and its number
+                of grammatical errors
+            article_data (ArticleData) : the reference article's data
+            rhyme_scheme (list) : the rhyme scheme of the poems
+        Returns:
+            List with the score vector of each poem, ordered as
+            SCORE_VECTOR_NAMES.
+    """
+    texts = [" ".join(lines) for lines, _ in poems]
+    grammar_checker = REGISTRY.get("grammar_checker")
+    for text, (_, n_errors) in zip(texts, poems):
+        grammar_checker.error_counts.put(text, n_errors)
+    REGISTRY.get("coherence_engine").score_texts(texts)
+
+    vectors = []
+    for lines, _ in poems:
+        fitness = Fitness(list(lines), article_data, rhyme_scheme)
+        scores = fitness.compute_scores()
+        vectors.append([scores[name] for name in SCORE_VECTOR_NAMES])
+    return vectors
+
+
+def evaluate_batch(poems, article_data):
+    """ Scores a batch of poems in a worker process using the article the
+        batch was sent with and the rhyme scheme the worker was started with.
+        Args:
+            poems (list) : tuples of the lines of each poem and its number
+                of grammatical errors
+            article_data (ArticleData) : the reference article's data
+        Returns:
+            List with the score vector of each poem.
+    """
+    return score_batch(poems, keep_article_data(article_data), 
+                       WORKER_STATE["rhyme_scheme"])
+
+
+class ParallelEvaluator():
+    """ Scores populations of poems across a pool of worker processes. Each
+        worker loads the models once when it starts, takes batches of poems
+        as tuples of lines, and returns their score vectors. Each batch is
+        sent with the data of the current article, so one evaluator can score
+        the poems of several articles (such as the jobs of a batch) without
+        starting new workers. The results are put in the shared fitness 
+        cache, so the poems' fitnesses are then read from it exactly as if 
+        they had been scored in this process.
+
+        Scores match the ones computed without workers. The grammar of the
+        whole population is checked here with the same batched request as
+        without workers, since LanguageTool can count errors differently
+        depending on which texts share a request. The workers only compute
+        the rest of the scores, which depend on nothing but the poem (the
+        coherence of a text is computed from its own word pairs, however the
+        texts are batched).
+
+    Attributes
+    ----------
+    workers : int
+        The number of worker processes.
+    pool : ProcessPoolExecutor
+        The pool of worker processes.
+    article_data : ArticleData
+        The data of the article the poems are scored for.
+
+    Methods
+    -------
+    set_article():
+        Sets the article the poems are scored for.
+    evaluate():
+        Scores every poem of a population that is not already cached.
+    close():
+        Shuts the worker processes down.
+    """
+
+    def __init__(self, article, rhyme_scheme, workers):
+        """ Starts the pool. The article may be None if it is set later with
+            set_article, before the first population is evaluated.
+        """
+        self.workers = workers
+        self.article_data = None
+        if article is not None:
+            self.set_article(article)
+        # Started once here and shared by the forked workers
+        REGISTRY.get("grammar_checker")
+        self.pool = ProcessPoolExecutor(max_workers=workers, 
+                                        initializer=init_worker,
+                                        initargs=(rhyme_scheme,))
+
+    def set_article(self, article):
+        """ Sets the article the poems are scored for, unless it is already
+            set.
+            Args:
+                article (Article) : the reference article
+        """
+        if self.article_data is None or \
+           self.article_data.get_content_hash() != article.get_content_hash():
+            self.article_data = ArticleData.from_article(article)
+
+    def evaluate(self, poems):
+        """ Counts the grammatical errors of the whole population in this
+            process, then splits the poems whose fitness is not cached into
+            one batch per worker, scores the batches in parallel, and caches
+            the results under each poem's fitness cache key.
+            Args:
+                poems (list) : the Sonnets to score
+        """
+        texts = [" ".join(poem.sonnet) for poem in poems]
+        error_counts = REGISTRY.get("grammar_checker").check_batch(texts)
+
+        unscored = {}
+        for poem, n_errors in zip(poems, error_counts):
+            poem.fitness.set_text(poem.sonnet)
+            key = poem.fitness.get_cache_key()
+            if key not in FITNESS_CACHE and key not in unscored:
+                unscored[key] = (tuple(poem.sonnet), n_errors)
+        if not unscored:
+            return
+
+        keys, texts = list(unscored.keys()), list(unscored.values())
+        batch_size = math.ceil(len(texts) / self.workers)
+        batches = [texts[i:i + batch_size] 
+                   for i in range(0, len(texts), batch_size)]
+        vectors = [vector for batch_vectors in 
+                   self.pool.map(evaluate_batch, batches, 
+                                 [self.article_data] * len(batches))
+                   for vector in batch_vectors]
+        for key, vector in zip(keys, vectors):
+            scores = dict(zip(SCORE_VECTOR_NAMES, vector))
+            FITNESS_CACHE.put(key, (combine_scores(scores), scores))
+
+    def close(self):
+        """ Shuts the worker processes down.
+        """
+        self.pool.shutdown()
@@ -1,9 +1,39 @@
 from sentiment_analysis import SentimentAnalysis
-from language_tool_python import LanguageTool
-import spacy
 from scrape_reddit import ScrapeReddit
+from nlp_resources import REGISTRY
+import grammar_checker # Registers the shared grammar checker
+import rhyme_index # Registers the shared rhyme index
+from lru_cache import LRUCache
+from tracing import TRACER, traced
 import string
-import pronouncing
+import hashlib
+
+""" Names of the scores that make up the fitness, in the order in which their
+    coefficients are applied.
+"""
+SCORE_NAMES = ["sentiment difference", "grammar", "simile", "coherence",
+               "alliteration", "assonance", "article keyword", "rhyme"]
+
+""" Coefficients used to weigh each score when combining them into one
+    fitness value.
+"""
+FITNESS_COEFS = [1, .03, 1, 0.2, 1, 1, 0.2, 1]
+
+""" Fitness results shared by every poem in the process, keyed by the
+    reference article, rhyme scheme, and a hash of the poem's lines.
+"""
+FITNESS_CACHE = LRUCache(maxsize=4096)
+
+
+def combine_scores(scores):
+    """ Combines the individual scores of a poem into one fitness value.
+        Args:
+            scores (dictionary) : maps score names to their values
+        Returns:
+            The weighted sum of the scores.
+    """
+    return sum([FITNESS_COEFS[i] * scores[name] 
+                for i, name in enumerate(SCORE_NAMES)])
 
 
 class Fitness():
@@ -16,14 +46,26 @@ class Fitness():
         The article that the poem is based on.
     fitness : int
         The value corresponding to the fitness.
+    scores : dict
+        The individual scores that were combined into the fitness.
+    line_scores : list
+        Partial scores of each line, used by the line-based scores.
+    scored_lines : list
+        The line texts that the partial line scores were computed for.
+    pair_scores : list
+        Rhyme score of each line pairing in the rhyme scheme.
+    scored_pairs : list
+        The line text pairs that the partial rhyme scores were computed for.
     text : list
         Contains the text of the poem where each element corresponds to a line.
     rhyme_scheme : list
         Contains a list corresponding to the current rhyme scheme.
-    grammar_tool : LanguageTool
-        Tool for evaluating English grammar of a sentence.
+    grammar_checker : GrammarChecker
+        Shared tool for counting the English grammar errors of a text.
     nlp : spacy
         Spacy library for tokenizing text.
+    rhyme_index : RhymeIndex
+        Precomputed rhyme classes used to check whether words rhyme.
 
     Methods
     -------
@@ -48,6 +90,18 @@ class Fitness():
     rhyme_score():
         Evaluates how much the poem's rhyme scheme aligns with the desired
         rhyme scheme.
+    compute_line_scores():
+        Computes the partial scores of a single line.
+    compute_pair_score():
+        Computes the rhyme score of a single line pairing.
+    update_partial_scores():
+        Recomputes the partial scores of the lines that changed.
+    inherit_partial_scores():
+        Copies partial scores of chosen lines from another poem's fitness.
+    compute_scores():
+        Computes each of the above factors.
+    get_cache_key():
+        Returns the key the poem's fitness is cached under.
     compute_fitness():
         Combines the above factors to generate one fitness score.
     set_test():
@@ -56,15 +110,22 @@ class Fitness():
 
     def __init__(self, text, ref_article, rhyme_scheme):
         """ Sets the relevant poetry text and reference article, and loads
-            the relevant language tools.
+            the relevant language tools from the shared registry.
         """
         self.ref_article = ref_article
         self.text = text
         self.rhyme_scheme = rhyme_scheme
-        self.grammar_tool = LanguageTool('en-US')
-        self.nlp = spacy.load("en_core_web_sm")
+        self.grammar_checker = REGISTRY.get("grammar_checker")
+        self.nlp = REGISTRY.get("spacy")
+        self.rhyme_index = REGISTRY.get("rhyme_index")
         self.fitness = 0
+        self.scores = None
+        self.line_scores = []
+        self.scored_lines = []
+        self.pair_scores = [None] * len(rhyme_scheme)
+        self.scored_pairs = [None] * len(rhyme_scheme)
     
+    @traced("fitness.sentiment")
     def get_sentiment(self):
         """ Computes sentiment of the poem by multiplying the polarity with
             the subjectivity.
@@ -76,25 +137,30 @@ class Fitness():
         sentiments = sentiment_analyzer.get_sentiment_results()
         return sentiments['polarity'] * sentiments['subjectivity']
     
-    def compute_sentiment_difference(self):
+    def compute_sentiment_difference(self, sent_val=None):
         """ Calculates the difference between the poem and reference article's
             polarities.
+            Args:
+                sent_val (float) : the poem's sentiment if already computed
             Returns:
                 The difference between poem and article's sentiment.
         """
-        sent_val = self.get_sentiment()
+        if sent_val is None:
+            sent_val = self.get_sentiment()
         return abs(sent_val - self.ref_article.get_sentiment_score())
     
+    @traced("fitness.grammar")
     def compute_grammar_score(self):
         """ Uses grammar tool to count number of grammatical errors in a
             sentence and divides it by the total number of words. Since the 
             system wants to maximize the fitness, the reciprocal is returned
-            to prioritize poems with less grammar errors.
+            to prioritize poems with less grammar errors. Error counts that
+            were already fetched in a batch for the population are reused.
             Returns:
                 The score corresponding to the poem's grammar.
         """
         text_as_string = " ".join(self.text)
-        n_errors = len(self.grammar_tool.check(text_as_string))
+        n_errors = self.grammar_checker.count_errors(text_as_string)
         n_words = len(text_as_string.split())
         return n_words / (n_errors + 1e-12)
 
@@ -105,12 +171,11 @@ class Fitness():
             Returns:
                 The score corresponding to the number of likely similes.
         """
-        like_as_count = 0
-        for sentence in self.text:
-            if "as" in sentence or "like" in sentence:
-                like_as_count += 1
+        self.update_partial_scores()
+        like_as_count = sum(scores["simile"] for scores in self.line_scores)
         return like_as_count / len(self.text)
     
+    @traced("fitness.coherence")
     def get_coherence(self):
         """ Returns the coherence score using the Reddit bigram as a reference.
         """
@@ -123,17 +188,10 @@ class Fitness():
             Returns:
                 Score corresponding to the amount of alliteration.
         """
-        alliteration_count, n_words = 0, 0
-        for line in self.text:
-            words = line.split()
-            lowercase_words = [word.lower() for word in words]
-
-            # Counts alliterations
-            for i in range(len(lowercase_words) - 1):
-                if lowercase_words[i][0] == lowercase_words[i + 1][0]:
-                    alliteration_count += 1
-                n_words += 1
-
+        self.update_partial_scores()
+        alliteration_count = sum(scores["alliterations"] 
+                                 for scores in self.line_scores)
+        n_words = sum(scores["word pairs"] for scores in self.line_scores)
         return alliteration_count / n_words
     
     def count_assonance(self):
@@ -142,24 +200,10 @@ class Fitness():
             Returns:
                 Score corresponding to the amount of assonance in the poem.
         """
-        vowels = set("aeiouAEIOU")
-        assonance_count, n_words = 0, 0
-        for line in self.text:
-            words = line.split()
-            for i in range(len(words) - 1):
-                word1 = words[i]
-                word2 = words[i + 1]
-
-                # Extract vowels from each word
-                vowels_word1 = [char for char in word1 if char in vowels]
-                vowels_word2 = [char for char in word2 if char in vowels]
-
-                # Check if the last vowel of the first word is the same as the 
-                # first vowel of the second word
-                if vowels_word1 and vowels_word2 and \
-                        vowels_word1[-1].lower() == vowels_word2[0].lower():
-                    assonance_count += 1
-                n_words += 1
+        self.update_partial_scores()
+        assonance_count = sum(scores["assonances"] 
+                              for scores in self.line_scores)
+        n_words = sum(scores["word pairs"] for scores in self.line_scores)
         return assonance_count / n_words
 
     def article_keyword_count(self):
@@ -169,15 +213,9 @@ class Fitness():
                 Score corresponding to how much poem retained keywords from
                 reference article.
         """
-        pos_dics = self.ref_article.get_pos_dics()
-        keyword_count, tot_count = 0, 0
-        for line in self.text:
-            for word in line.split():
-                for dic in pos_dics.values():
-                    if word in list(dic.keys()):
-                        keyword_count += dic[word]
-                tot_count += 1
-        
+        self.update_partial_scores()
+        keyword_count = sum(scores["keywords"] for scores in self.line_scores)
+        tot_count = sum(scores["words"] for scores in self.line_scores)
         return keyword_count / tot_count
     
     def get_last_word(self, sentence):
@@ -201,27 +239,123 @@ class Fitness():
             Returns:
                 Score corresponding to the quality of rhymes
         """
-        rhyme_score = 0
-        for line1, line2 in self.rhyme_scheme:
-            last1 = self.get_last_word(self.text[line1]).lower()
-            last2 = self.get_last_word(self.text[line2]).lower()
-            if last1 == last2:
-                rhyme_score += 0.5
-            elif last1 in " ".join(pronouncing.rhymes(last2)) \
-                or last2 in " ".join(pronouncing.rhymes(last1)):
-                rhyme_score += 1
-        return rhyme_score / len(self.rhyme_scheme)
+        self.update_partial_scores()
+        return sum(self.pair_scores) / len(self.rhyme_scheme)
+
+    def compute_line_scores(self, line):
+        """ Computes the partial scores of a single line that the similes,
+            alliteration, assonance, and article keyword scores are built
+            from.
+            Args:
+                line (string) : the line to score
+            Returns:
+                Dictionary of the line's partial counts.
+        """
+        pos_dics = self.ref_article.get_pos_dics()
+        vowels = set("aeiouAEIOU")
+        words = line.split()
+        lowercase_words = [word.lower() for word in words]
+        scores = {"simile" : int("as" in line or "like" in line),
+                  "alliterations" : 0, "assonances" : 0, 
+                  "word pairs" : max(len(words) - 1, 0), 
+                  "keywords" : 0, "words" : len(words)}
+
+        for i in range(len(words) - 1):
+            # Counts alliterations
+            if lowercase_words[i][0] == lowercase_words[i + 1][0]:
+                scores["alliterations"] += 1
+
+            # Check if the last vowel of the first word is the same as the 
+            # first vowel of the second word
+            vowels_word1 = [char for char in words[i] if char in vowels]
+            vowels_word2 = [char for char in words[i + 1] if char in vowels]
+            if vowels_word1 and vowels_word2 and \
+                    vowels_word1[-1].lower() == vowels_word2[0].lower():
+                scores["assonances"] += 1
+
+        for word in words:
+            for dic in pos_dics.values():
+                if word in dic:
+                    scores["keywords"] += dic[word]
+        return scores
+
+    def compute_pair_score(self, line1, line2):
+        """ Computes the rhyme score of a line pairing. A pairing gets a 
+            score of 1 if the words rhyme and are different, half points if
+            they are the same word, and no points if they do not rhyme.
+            Args:
+                line1 (string) : the first line of the pairing
+                line2 (string) : the second line of the pairing
+            Returns:
+                The rhyme score of the pairing.
+        """
+        last1 = self.get_last_word(line1).lower()
+        last2 = self.get_last_word(line2).lower()
+        if last1 == last2:
+            return 0.5
+        elif self.rhyme_index.rhymes_with(last1, last2):
+            return 1
+        return 0
+
+    @traced("fitness.partial_scores")
+    def update_partial_scores(self):
+        """ Brings the partial line and rhyme pairing scores up to date with
+            the current text. Only lines whose text differs from the text
+            they were last scored with are recomputed, and only rhyme
+            pairings that contain such a line are rescored.
+        """
+        if len(self.scored_lines) != len(self.text):
+            self.line_scores = [None] * len(self.text)
+            self.scored_lines = [None] * len(self.text)
+
+        for i, line in enumerate(self.text):
+            if self.scored_lines[i] != line or self.line_scores[i] is None:
+                self.line_scores[i] = self.compute_line_scores(line)
+                self.scored_lines[i] = line
+                TRACER.count("fitness.lines_rescored")
+
+        for i, (line1, line2) in enumerate(self.rhyme_scheme):
+            pair = (self.text[line1], self.text[line2])
+            if self.scored_pairs[i] != pair:
+                self.pair_scores[i] = self.compute_pair_score(*pair)
+                self.scored_pairs[i] = pair
+                TRACER.count("fitness.pairs_rescored")
+
+    def inherit_partial_scores(self, other, line_idxs):
+        """ Copies the partial scores of the given lines from another poem's
+            fitness, along with the scores of any rhyme pairings made up of
+            only those lines. Used when a poem is crossed over from its 
+            parents so the inherited lines do not have to be rescored. The
+            copied scores are still checked against the current text before
+            they are used.
+            Args:
+                other (Fitness) : the fitness to copy the scores from
+                line_idxs (list) : the indices of the lines to copy
+        """
+        if len(self.scored_lines) != len(self.text):
+            self.line_scores = [None] * len(self.text)
+            self.scored_lines = [None] * len(self.text)
+
+        for i in line_idxs:
+            if i < len(other.scored_lines) and i < len(self.scored_lines):
+                self.line_scores[i] = other.line_scores[i]
+                self.scored_lines[i] = other.scored_lines[i]
+
+        for i, (line1, line2) in enumerate(self.rhyme_scheme):
+            if line1 in line_idxs and line2 in line_idxs and \
+                                                    i < len(other.pair_scores):
+                self.pair_scores[i] = other.pair_scores[i]
+                self.scored_pairs[i] = other.scored_pairs[i]
         
-    def compute_fitness(self):
-        """ Computes the fitness of the poem considering the sentiment
-            alignment, grammar, simile presence, coherence, allitartion,
-            assonance, article keyword alignment, and rhyme proficiency of the
-            poem. Various coefficients are hardcoded to emphasize certain 
-            qualities of the poem (can be changed based on the desired 
-            qualities).
+    @traced("fitness.scores")
+    def compute_scores(self):
+        """ Computes every score that makes up the fitness of the poem, along
+            with the poem's raw sentiment.
+            Returns:
+                Dictionary mapping score names to their values.
         """
-        coefs = [1, .03, 1, 0.2, 1, 1, 0.2, 1]
-        scores = [self.compute_sentiment_difference(), 
+        sentiment = self.get_sentiment()
+        scores = [self.compute_sentiment_difference(sentiment), 
                   self.compute_grammar_score(), 
                   self.simile_detection(),
                   self.get_coherence(),
@@ -229,8 +363,40 @@ class Fitness():
                   self.count_assonance(),
                   self.article_keyword_count(),
                   self.rhyme_score()]
+        scores = dict(zip(SCORE_NAMES, scores))
+        scores["sentiment"] = sentiment
+        return scores
 
-        self.fitness = sum([coefs[i] * scores[i] for i in range(len(coefs))])
+    def get_cache_key(self):
+        """ Returns the key that the fitness of the current text is cached
+            under. The poem's lines are hashed so that identical poems share
+            one entry no matter which Sonnet object they belong to.
+            Returns:
+                Tuple of the article hash, rhyme scheme, and poem hash.
+        """
+        poem_hash = hashlib.blake2b("\x1f".join(self.text).encode(), 
+                                    digest_size=16).hexdigest()
+        rhyme_scheme = tuple(tuple(pair) for pair in self.rhyme_scheme)
+        return (self.ref_article.get_content_hash(), rhyme_scheme, poem_hash)
+
+    def compute_fitness(self):
+        """ Computes the fitness of the poem considering the sentiment
+            alignment, grammar, simile presence, coherence, allitartion,
+            assonance, article keyword alignment, and rhyme proficiency of the
+            poem. Various coefficients are hardcoded to emphasize certain 
+            qualities of the poem (can be changed based on the desired 
+            qualities). Results are memoized in the shared fitness cache so
+            unchanged poems are never rescored.
+        """
+        key = self.get_cache_key()
+        cached = FITNESS_CACHE.get(key)
+        TRACER.count("fitness_cache.misses" if cached is None 
+                     else "fitness_cache.hits")
+        if cached is None:
+            scores = self.compute_scores()
+            cached = (combine_scores(scores), scores)
+            FITNESS_CACHE.put(key, cached)
+        self.fitness, self.scores = cached
     
     def set_text(self, text):
         """ Replaces the poem text with new text.
@@ -246,16 +412,20 @@ class Fitness():
         return self.fitness
 
     def __str__(self):
-        """ Returns a string representation of the poem's fitness.
+        """ Returns a string representation of the poem's fitness using the
+            scores from the last fitness computation.
         """
+        if self.scores is None:
+            self.compute_fitness()
+        scores = self.scores
         out_str = f"total fitness: {self.fitness}\n\n" +\
-            f"sentiment difference: {self.compute_sentiment_difference()} " +\
-                f"(score = {self.get_sentiment()})\n" +\
-            f"grammar score: {self.compute_grammar_score() / 4}\n" +\
-            f"simile score: {self.simile_detection()}\n" +\
-            f"coherence score: {self.get_coherence()}\n" +\
-            f"alliteration score: {self.count_alliterations()}\n" +\
-            f"assonance score: {self.count_assonance()}\n" +\
-            f"article keyword score: {self.article_keyword_count()}\n" +\
-            f"rhyme score: {self.rhyme_score()}"
+            f"sentiment difference: {scores['sentiment difference']} " +\
+                f"(score = {scores['sentiment']})\n" +\
+            f"grammar score: {scores['grammar'] / 4}\n" +\
+            f"simile score: {scores['simile']}\n" +\
+            f"coherence score: {scores['coherence']}\n" +\
+            f"alliteration score: {scores['alliteration']}\n" +\
+            f"assonance score: {scores['assonance']}\n" +\
+            f"article keyword score: {scores['article keyword']}\n" +\
+            f"rhyme score: {scores['rhyme']}"
         return out_str
\ No newline at end of file
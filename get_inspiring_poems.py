@@ -1,5 +1,5 @@
-import requests
-import numpy as np
+import poetry_store # Registers the local poetry corpus
+from nlp_resources import REGISTRY
 
 """ Poets in PoetryDB to be excluded because they write in Old English and 
     this poetry system aims to write modern poetry.
@@ -42,10 +42,14 @@ POETS_B4_1700 = [
 ]
 
 class PoetryDB():
-    """ Class for retrieving poems from PoetryDB.
+    """ Class for retrieving poems from PoetryDB. Poems are read from the
+        local copy of the corpus, which is downloaded from PoetryDB once and
+        shared by the whole process.
         
     Attributes
     ----------
+    store : PoetryStore
+        The local copy of the PoetryDB corpus.
     all_poems : list
         All wanted authors' poems in PoetryDB.
     sonnets : list
@@ -67,6 +71,7 @@ class PoetryDB():
         """ Calls to populate the Sonnet list with poems from PoetryDB that 
             have 14 lines.
         """
+        self.store = REGISTRY.get("poetry_store")
         self.all_poems = []
         self.sonnets = []
         self.retrieve_sonnets()
@@ -75,26 +80,15 @@ class PoetryDB():
         """ Retrieve poems from PoetryDB that have fourteen lines and are not
             in the list of excluded poets.
         """
-        url = "https://poetrydb.org/linecount/14"
-        response = requests.get(url)
-        if response.status_code == 200:
-            poems = response.json()
-            for poem in poems:
-                if len(poem['lines']) == 14 and \
-                                        poem['author'] not in POETS_B4_1700:
-                    self.sonnets.append(poem)
+        self.sonnets = self.store.get_poems(linecount=14, 
+                                            excluded_authors=POETS_B4_1700)
     
     def retrieve_all_poem_types(self):
         """ Retrieve all poems from the PoetryDB that are not in the list of
             excluded poets to be included in Word2Vec corpus.
         """
-        url = "https://poetrydb.org/lines/all"
-        response = requests.get(url)
-        if response.status_code == 200:
-            poems = response.json()
-            for poem in poems:
-                if poem['author'] not in POETS_B4_1700:
-                    self.all_poems.append("\n".join(poem['lines']))
+        self.all_poems = ["\n".join(lines) for lines in 
+                    self.store.get_poems(excluded_authors=POETS_B4_1700)]
     
     def get_poetry_line(self, ix):
         """ Chooses a random poem that contains 14 lines and returns the line
@@ -104,8 +98,8 @@ class PoetryDB():
             Returns:
                 The line of a random poem at the given index.
         """
-        rand_poem = np.random.choice(self.sonnets)
-        return rand_poem['lines'][ix]
+        return self.store.get_random_line(ix, 14, 
+                                          excluded_authors=POETS_B4_1700)
     
     def get_all_poems(self):
         """ Returns all wanted authors' poems.
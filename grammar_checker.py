@@ -0,0 +1,147 @@
+from bisect import bisect_right
+from multiprocessing.util import Finalize
+from lru_cache import LRUCache
+from nlp_resources import REGISTRY
+
+""" Maximum number of characters sent to LanguageTool in one request.
+"""
+MAX_REQUEST_CHARS = 40000
+
+""" Placed between texts in a batched request so LanguageTool treats each
+    text as its own paragraph.
+"""
+TEXT_SEPARATOR = "\n\n"
+
+
+class GrammarChecker():
+    """ Counts grammatical errors with LanguageTool, batching many texts into
+        as few requests as possible and remembering the counts of texts that
+        have already been checked.
+
+    Attributes
+    ----------
+    grammar_tool : LanguageTool
+        Tool for evaluating English grammar of a sentence.
+    error_counts : LRUCache
+        Maps texts to their number of grammatical errors.
+    n_requests : int
+        The number of requests that have been sent to LanguageTool.
+
+    Methods
+    -------
+    count_errors():
+        Returns the number of grammatical errors in a text.
+    check_batch():
+        Returns the number of grammatical errors in each of a list of texts.
+    make_requests():
+        Groups texts into requests that are under the size limit.
+    get_stats():
+        Returns the number of requests and the cache statistics.
+    """
+
+    def __init__(self, grammar_tool):
+        self.grammar_tool = grammar_tool
+        self.error_counts = LRUCache(maxsize=8192)
+        self.n_requests = 0
+
+    def count_errors(self, text):
+        """ Returns the number of grammatical errors in a text, only sending
+            it to LanguageTool if it has not been checked before.
+            Args:
+                text (string) : the text to check
+            Returns:
+                The number of grammatical errors.
+        """
+        return self.check_batch([text])[0]
+
+    def make_requests(self, texts):
+        """ Groups texts into requests by joining them with a paragraph
+            separator, starting a new request whenever adding a text would go
+            over the request size limit.
+            Args:
+                texts (list) : the texts to group
+            Returns:
+                A list of requests, each a list of the texts it contains.
+        """
+        requests, curr_request, curr_size = [], [], 0
+        for text in texts:
+            size = len(text) + len(TEXT_SEPARATOR)
+            if curr_request and curr_size + size > MAX_REQUEST_CHARS:
+                requests.append(curr_request)
+                curr_request, curr_size = [], 0
+            curr_request.append(text)
+            curr_size += size
+        if curr_request:
+            requests.append(curr_request)
+        return requests
+
+    def check_batch(self, texts):
+        """ Counts the grammatical errors of every text. The distinct texts
+            that have not been checked before are joined into as few
+            LanguageTool requests as possible, and each match that comes back
+            is assigned to the text that contains its offset.
+            Args:
+                texts (list) : the texts to check
+            Returns:
+                A list with the number of grammatical errors in each text.
+        """
+        found, unchecked = {}, []
+        for text in texts:
+            if text not in found:
+                found[text] = self.error_counts.get(text)
+                if found[text] is None:
+                    unchecked.append(text)
+
+        for request in self.make_requests(unchecked):
+            starts, offset = [], 0
+            for text in request:
+                starts.append(offset)
+                offset += len(text) + len(TEXT_SEPARATOR)
+
+            counts = [0] * len(request)
+            matches = self.grammar_tool.check(TEXT_SEPARATOR.join(request))
+            self.n_requests += 1
+            for match in matches:
+                counts[bisect_right(starts, match.offset) - 1] += 1
+            for text, count in zip(request, counts):
+                self.error_counts.put(text, count)
+                found[text] = count
+
+        return [found[text] for text in texts]
+
+    def get_stats(self):
+        """ Returns the number of LanguageTool requests that have been made
+            and the statistics of the error count cache.
+        """
+        stats = self.error_counts.get_stats()
+        stats["requests"] = self.n_requests
+        return stats
+
+
+def load_grammar_checker():
+    """ Creates a grammar checker around the shared LanguageTool server.
+    """
+    return GrammarChecker(REGISTRY.get("grammar_tool"))
+
+
+def close_grammar_tool():
+    """ Stops the LanguageTool server of this process, if one was started.
+    """
+    if REGISTRY.is_loaded("grammar_tool"):
+        REGISTRY.get("grammar_tool").close()
+        REGISTRY.unload("grammar_tool")
+        REGISTRY.unload("grammar_checker")
+
+
+def close_grammar_tool_on_worker_exit():
+    """ Called when a worker process starts. If the worker did not inherit a
+        LanguageTool server from its parent, any server it starts is stopped
+        when it exits, since worker processes exit without running the atexit
+        handlers that would otherwise stop it. A server inherited from the
+        parent is left to the parent.
+    """
+    if not REGISTRY.is_loaded("grammar_tool"):
+        Finalize(None, close_grammar_tool, exitpriority=10)
+
+
+REGISTRY.register("grammar_checker", load_grammar_checker)
@@ -3,9 +3,17 @@ from news_article import Article
 import numpy as np
 import random
 import os
+import time
 from datetime import datetime
 from word2vec import MyWord2Vec
 from scrape_reddit import ScrapeReddit
+from nlp_resources import REGISTRY
+import grammar_checker # Registers the shared grammar checker
+import coherence # Registers the shared coherence engine
+from evaluation import ParallelEvaluator
+from poem_generation import ParallelGenerator, seed_rng
+from fitness import FITNESS_CACHE
+from tracing import TRACER, TRACE_FILE, traced
 
 
 """ Contains the traditional Sonnet rhyme scheme, where each element of the
@@ -27,6 +35,19 @@ class GeneratorSystem():
         The article the poems will be based on.
     poems : list
         List of the current poems in the algorithm.
+    workers : int
+        The number of processes used to build and score poems (1 does all of
+        the work in this process).
+    seed_sequence : SeedSequence
+        The master seed that the random streams of each poem and of the
+        genetic algorithm are derived from.
+    evaluator : ParallelEvaluator
+        The pool of processes that score poems, when workers > 1.
+    owns_evaluator : bool
+        Whether the evaluator was started by the system, and is shut down
+        when it closes.
+    trace_was_enabled : bool
+        Whether the shared tracer was on before the system was set up.
 
     Methods
     -------
@@ -41,6 +62,10 @@ class GeneratorSystem():
         Calls to generate a new poem.
     generate_original_poems():
         Calls to generate a chosen number of poems.
+    get_evaluator():
+        Returns the pool of processes that score poems.
+    score_population():
+        Checks the grammar and coherence of a whole population in batches.
     fittest_half():
         Returns fittest 50% of a population.
     crossover():
@@ -49,12 +74,42 @@ class GeneratorSystem():
         Runs a round of the genetic algorithm.
     run_genetetic_algo_iterations():
         Runs a chosen amount of iterations of the genetic algorithm    
+    close():
+        Shuts down the processes used to score poems and restores the 
+        tracer.
+    get_cache_stats():
+        Returns the statistics of the caches used while generating poems.
     """
 
-    def __init__(self, n_poems):
+    def __init__(self, n_poems, workers=1, seed=None, trace=False, 
+                 evaluator=None):
+        """ Sets up the system. Passing a seed makes runs reproducible, and
+            runs with the same seed produce the same poems for any number of
+            workers, since each first generation poem is built with its own
+            random stream and scoring poems does not use randomness. When
+            tracing is on (with trace or the POETRY_TRACE environment
+            variable), the run's stages are recorded and written to a trace
+            file next to the poem. A tracer turned on by trace is turned off
+            again by close. An evaluator may be given to score poems with 
+            when workers > 1, so systems run one after another (such as the
+            jobs of a batch) share its worker processes; it is not shut down
+            by close.
+        """
         self.n_poems = n_poems
         self.ref_article = None
         self.poems = []
+        self.workers = workers
+        self.evaluator = evaluator
+        self.owns_evaluator = evaluator is None
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.trace_was_enabled = TRACER.enabled
+        if trace:
+            TRACER.enable()
+        if TRACER.enabled: # Each run gets a trace of its own
+            TRACER.reset()
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed)
         #self.populate_models() #UNCOMMENT TO TRAIN LARGER MODELS
     
     def populate_models(self):
@@ -73,11 +128,24 @@ class GeneratorSystem():
             the poetry system named by the timestamp. In the folder, writes
             the generated poem, the metrics for the poem, the reference article
             tile, the reference article description, and the reference article
-            content.
+            content. If several runs finish within the same second, a counter
+            is added to the folder name (the folder is claimed by creating
+            it, so runs in different processes never share one). When 
+            tracing is on, the run's trace is written to the folder too.
+            Returns:
+                The path of the folder.
         """
+        start = time.perf_counter_ns()
         curr_path = "generated_poems/" + \
                                 datetime.now().strftime('%Y-%m-%d_%H:%M:%S')
-        os.makedirs(curr_path)
+        base_path, n_runs = curr_path, 1
+        while True:
+            try:
+                os.makedirs(curr_path, exist_ok=False)
+                break
+            except FileExistsError:
+                n_runs += 1
+                curr_path = f"{base_path}_{n_runs}"
         print("Writing top poem to file")
         with open(curr_path + "/reference_article.txt", "w") as f:
                 f.write("\nReference Article: \n")
@@ -99,31 +167,99 @@ class GeneratorSystem():
             f.write(str(poem))
         with open(curr_path + f"/rank_1_metrics.txt", "w") as f:
             f.write(str(poem.fitness))
+        if TRACER.enabled:
+            TRACER.add_span("system.write_files", start, 
+                            time.perf_counter_ns())
+            TRACER.write(os.path.join(curr_path, TRACE_FILE), 
+                         self.get_cache_stats())
+        return curr_path
     
-    def fetch_reference_article(self):
+    @traced("system.article")
+    def fetch_reference_article(self, category=None, url=None, article=None):
         """ Calls to NewsAPI to get a reference article to write a poem based
             on.
+            Args:
+                category (string) : the news category (the user is prompted
+                    for one if neither it, a url, or an article is given)
+                url (string) : the url of an article to use instead
+                article (dictionary) : title, text, and description of an
+                    article to use instead
         """
-        self.ref_article = Article()
+        self.ref_article = Article(category, url, article)
         print("Writing poems based on the following article:")
         print(self.ref_article.get_title())
                 
-    def generate_poem(self):
+    def generate_poem(self, seed_sequence=None):
         """ Generated a Sonnet object and adds it to the system's list of 
             poems.
+            Args:
+                seed_sequence (SeedSequence) : the seed of the poem's random
+                    stream, if it should have its own
         """
+        if seed_sequence is not None:
+            seed_rng(seed_sequence)
         sonnet = Sonnet(SONNET_RHYME_SCHEME, self.ref_article, [])
         sonnet.generate_sonnet()
         self.poems.append(sonnet)
     
+    @traced("system.initial_population")
     def generate_original_poems(self):
-        """ Calls to generate n amount of first generation poems.
+        """ Calls to generate n amount of first generation poems. Each poem
+            is built with its own random stream derived from the master seed.
+            With more than one worker, the poems are built across worker
+            processes and collected as they finish. Afterwards, the genetic
+            algorithm gets a random stream of its own.
         """
         print("Generating First Set of Poems")
-        for i in range(self.n_poems): 
-            print(f"Generating poem {i+1} out of {self.n_poems}")
-            self.generate_poem()
+        seed_sequences = self.seed_sequence.spawn(self.n_poems)
+        if self.workers > 1:
+            generator = ParallelGenerator(self.ref_article, 
+                                          SONNET_RHYME_SCHEME, self.workers)
+            poems = [None] * self.n_poems
+            for n_done, (i, lines) in enumerate(
+                                    generator.generate(seed_sequences), 1):
+                print(f"Generated poem {n_done} out of {self.n_poems}")
+                poems[i] = Sonnet(SONNET_RHYME_SCHEME, self.ref_article, lines)
+            generator.close()
+            self.poems.extend(poems)
+        else:
+            for i in range(self.n_poems): 
+                print(f"Generating poem {i+1} out of {self.n_poems}")
+                self.generate_poem(seed_sequences[i])
+        seed_rng(self.seed_sequence.spawn(1)[0])
     
+    def get_evaluator(self):
+        """ Returns the pool of processes that score poems, set to score them
+            for the reference article, and starts it the first time it is
+            needed if none was given.
+        """
+        if self.evaluator is None:
+            self.evaluator = ParallelEvaluator(self.ref_article, 
+                                               SONNET_RHYME_SCHEME, 
+                                               self.workers)
+        self.evaluator.set_article(self.ref_article)
+        return self.evaluator
+
+    @traced("system.score_population")
+    def score_population(self, poems):
+        """ Counts the grammatical errors of every poem in a population with
+            as few LanguageTool requests as possible, and scores the coherence
+            of every poem in one vectorized pass. The results are kept by the
+            shared grammar checker and coherence engine, so computing the
+            poems' fitnesses afterwards reuses them. With more than one 
+            worker, the grammar is checked the same way here, and the rest
+            of the scores are computed across the worker processes and 
+            cached.
+            Args:
+                poems (list) : list of poems
+        """
+        if self.workers > 1:
+            self.get_evaluator().evaluate(poems)
+            return
+        texts = [" ".join(poem.sonnet) for poem in poems]
+        REGISTRY.get("grammar_checker").check_batch(texts)
+        REGISTRY.get("coherence_engine").score_texts(texts)
+
     def fittest_half(self, poems):
         """ Returns the fittest 50% of a given population.
             Args:
@@ -134,29 +270,41 @@ class GeneratorSystem():
         sorted_poems = sorted(poems, key = lambda x : x.get_fitness())
         return sorted_poems[int(len(poems)/2):]
     
+    @traced("system.crossover")
     def crossover(self, poem_opts):
         """ Crosses over two poems while maintaining the rhyming scheme. For
             each line pair in the rhyming scheme, takes both lines from a
-            randomly selected poem to maintain scheme. 
+            randomly selected poem to maintain scheme. The new poem inherits
+            the partial fitness scores of the lines it takes from each parent
+            so that only lines changed later are rescored.
             Args:
                 poem_opts (list) : contains the two poems to be crossed
             Returns:
                 The newly crossed poem.
         """
         new_poem = [""] * 14
+        inherited = []
         for line1, line2 in SONNET_RHYME_SCHEME:
             rand_poem = np.random.choice(poem_opts)
             new_poem[line1] = rand_poem.get_line(line1)  
             new_poem[line2] = rand_poem.get_line(line2)
-        return Sonnet(SONNET_RHYME_SCHEME, self.ref_article, new_poem)
+            inherited.append((rand_poem, [line1, line2]))
+
+        child = Sonnet(SONNET_RHYME_SCHEME, self.ref_article, new_poem)
+        for parent, line_idxs in inherited:
+            child.fitness.inherit_partial_scores(parent.fitness, line_idxs)
+        return child
     
+    @traced("system.genetic_algo")
     def genetic_algo(self):
         """ Iterates for the number of poems in the set. For each iteration,
             the algorithm randomly selects two poems based on their fitnesses
             to crossover. Then, there is a 70% chance the poem will get
             mutated. After that, the top fittest 50% of the old generation
             and new generation move on to the next round of the algorithm.
+            The grammar and coherence of each generation are scored in batches.
         """
+        self.score_population(self.poems)
         new_poems = []
         for _ in range(self.n_poems):
             fitnesses = [poem.get_fitness() for poem in self.poems]
@@ -169,6 +317,7 @@ class GeneratorSystem():
                 new_poem.mutate()
             new_poems.append(new_poem)
 
+        self.score_population(new_poems)
         self.poems = self.fittest_half(self.poems) + \
                      self.fittest_half(new_poems)
     
@@ -182,6 +331,34 @@ class GeneratorSystem():
             print(f"Running iteration {i+1} of {n_iterations}")
             self.genetic_algo()
 
+    def close(self):
+        """ Shuts down the processes used to score poems, if the system 
+            started them, and turns the shared tracer off again if it was only
+            turned on for this system, so later runs in the process are not
+            traced.
+        """
+        if self.evaluator is not None and self.owns_evaluator:
+            self.evaluator.close()
+        self.evaluator = None
+        if not self.trace_was_enabled:
+            TRACER.disable()
+
+    def get_cache_stats(self):
+        """ Returns the statistics of the fitness cache, and of the grammar,
+            coherence, and article caches if they have been loaded.
+            Returns:
+                Dictionary mapping cache names to their statistics.
+        """
+        stats = {"fitness" : FITNESS_CACHE.get_stats()}
+        if REGISTRY.is_loaded("grammar_checker"):
+            stats["grammar"] = REGISTRY.get("grammar_checker").get_stats()
+        if REGISTRY.is_loaded("coherence_engine"):
+            stats["coherence"] = \
+                        REGISTRY.get("coherence_engine").scores.get_stats()
+        if REGISTRY.is_loaded("article_cache"):
+            stats["article"] = REGISTRY.get("article_cache").get_stats()
+        return stats
+
 
 def main():
     generator = GeneratorSystem(n_poems=5)
@@ -189,6 +366,7 @@ def main():
     generator.generate_original_poems()
     generator.run_genetic_algo_iterations(n_iterations=5)
     generator.write_poems_to_files()
+    generator.close()
     print("All done :)")
 
 
@@ -0,0 +1,239 @@
+from concurrent.futures import ProcessPoolExecutor
+from nlp_resources import REGISTRY
+from evaluation import ArticleData
+from poem_generation import seed_rng
+from high_level_system import GeneratorSystem, SONNET_RHYME_SCHEME
+from poem import Sonnet
+import grammar_checker # Registers the shared grammar checker
+from tracing import TRACER
+
+""" Built-in migration topologies. In a "ring", each island sends its
+    migrants to the next island, and when "fully_connected", each island
+    sends its migrants to every other island.
+"""
+MIGRATION_TOPOLOGIES = ["ring", "fully_connected"]
+
+""" Resources every island worker loads when it starts.
+"""
+WORKER_RESOURCES = ["spacy", "grammar_checker", "rhyme_index", 
+                    "coherence_engine", "base_word2vec"]
+
+""" State of an island worker process, set once when it starts.
+"""
+WORKER_STATE = {}
+
+
+def get_migration_targets(topology, n_islands):
+    """ Returns the islands that each island sends its migrants to.
+        Args:
+            topology (string or dictionary) : one of MIGRATION_TOPOLOGIES, or
+                a dictionary mapping each island to a list of target islands
+            n_islands (int) : the number of islands
+        Returns:
+            Dictionary mapping each island to the islands it sends migrants to.
+    """
+    if isinstance(topology, dict):
+        return {i : list(topology.get(i, [])) for i in range(n_islands)}
+    if topology == "ring":
+        return {i : [(i + 1) % n_islands] if n_islands > 1 else []
+                for i in range(n_islands)}
+    if topology == "fully_connected":
+        return {i : [j for j in range(n_islands) if j != i] 
+                for i in range(n_islands)}
+    raise ValueError(f"Unknown migration topology '{topology}', expected " +
+                     f"one of {MIGRATION_TOPOLOGIES} or a dictionary")
+
+
+def init_worker(article_data):
+    """ Loads the models used to evolve poems in a worker process, so each
+        worker pays for them once. Workers are not traced. Workers use the
+        LanguageTool server of the parent when they inherit it, and otherwise
+        stop the one they start when they exit.
+        Args:
+            article_data (ArticleData) : the reference article's data
+    """
+    TRACER.disable()
+    grammar_checker.close_grammar_tool_on_worker_exit()
+    for name in WORKER_RESOURCES:
+        REGISTRY.get(name)
+    article_data.get_keyword_similarity()
+    WORKER_STATE["article_data"] = article_data
+
+
+def evolve_island(poem_lines, n_generations, seed_sequence):
+    """ Runs the genetic algorithm on one island's population in a worker
+        process.
+        Args:
+            poem_lines (list) : the lines of each poem on the island
+            n_generations (int) : the number of generations to run
+            seed_sequence (SeedSequence) : the seed of the island's random
+                stream for these generations
+        Returns:
+            The lines and fitness of each poem after the last generation, and
+            the best fitness on the island after each generation.
+    """
+    seed_rng(seed_sequence)
+    article_data = WORKER_STATE["article_data"]
+    system = GeneratorSystem(len(poem_lines))
+    system.ref_article = article_data
+    system.poems = [Sonnet(SONNET_RHYME_SCHEME, article_data, list(lines))
+                    for lines in poem_lines]
+
+    best_fitnesses = []
+    for _ in range(n_generations):
+        system.genetic_algo()
+        best_fitnesses.append(max(poem.get_fitness() 
+                                  for poem in system.poems))
+    return [(poem.sonnet, poem.get_fitness()) for poem in system.poems], \
+           best_fitnesses
+
+
+class IslandModel():
+    """ Island model version of the genetic algorithm. The generator's poems
+        are split into sub-populations (islands) that evolve independently
+        in separate worker processes. Every few generations, each island
+        sends copies of its fittest poems to the islands given by the
+        migration topology, where they replace the least fit poems. The
+        poems are split as evenly as possible, and every island gets at least
+        two of them.
+
+    Attributes
+    ----------
+    generator : GeneratorSystem
+        The system whose poems are evolved.
+    n_islands : int
+        The number of islands.
+    migration_interval : int
+        The number of generations between migrations.
+    n_migrants : int
+        The number of poems each island sends to each of its targets.
+    targets : dictionary
+        Maps each island to the islands it sends migrants to.
+    islands : list
+        The lines and fitness of each poem on each island.
+    seed_sequences : list
+        The master seed of each island's random streams.
+    history : list
+        The best fitness of each island and of all islands per generation.
+    pool : ProcessPoolExecutor
+        The pool of worker processes.
+
+    Methods
+    -------
+    migrate():
+        Sends the fittest poems of each island to its targets.
+    run():
+        Evolves the islands for a number of generations.
+    get_history():
+        Returns the best fitnesses per generation.
+    close():
+        Shuts the worker processes down.
+    """
+
+    def __init__(self, generator, n_islands, migration_interval=5, 
+                 n_migrants=1, topology="ring", workers=None):
+        self.generator = generator
+        self.n_islands = n_islands
+        self.migration_interval = migration_interval
+        self.n_migrants = n_migrants
+        # Each island needs two poems to pick a pair of parents from
+        if n_islands < 1 or len(generator.poems) < 2 * n_islands:
+            raise ValueError(f"Cannot split {len(generator.poems)} poems " +
+                             f"into {n_islands} islands of at least 2 poems")
+        self.targets = get_migration_targets(topology, n_islands)
+        # The first islands take one of the leftover poems each
+        island_size, n_leftover = divmod(len(generator.poems), n_islands)
+        bounds = [i * island_size + min(i, n_leftover)
+                  for i in range(n_islands + 1)]
+        self.islands = [[(poem.sonnet, None) for poem in
+                         generator.poems[bounds[i]:bounds[i + 1]]]
+                        for i in range(n_islands)]
+        self.seed_sequences = generator.seed_sequence.spawn(n_islands)
+        self.history = []
+        # Started once here and shared by the forked workers
+        REGISTRY.get("grammar_checker")
+        self.pool = ProcessPoolExecutor(max_workers=workers or n_islands,
+                        initializer=init_worker,
+                        initargs=(ArticleData.from_article(
+                                                generator.ref_article),))
+
+    def migrate(self):
+        """ Copies the fittest poems of each island to each of the islands it
+            sends migrants to, where they replace the least fit poems. The
+            migrants are chosen before any island receives poems, so a poem
+            moves at most one island per migration.
+        """
+        migrants = [sorted(island, key=lambda x : x[1], 
+                           reverse=True)[:self.n_migrants]
+                    for island in self.islands]
+        for source, targets in self.targets.items():
+            for target in targets:
+                island = sorted(self.islands[target], key=lambda x : x[1])
+                n_replaced = min(len(migrants[source]), len(island))
+                self.islands[target] = migrants[source][:n_replaced] + \
+                                       island[n_replaced:]
+
+    def run(self, n_generations):
+        """ Evolves every island in parallel for a number of generations,
+            migrating poems every migration_interval generations. Prints the
+            best fitness of each island and of all islands after each
+            generation. Afterwards, the generator's poems are the poems of 
+            every island.
+            Args:
+                n_generations (int) : the number of generations to run
+        """
+        print(f"Running Genetic Algorithm on {self.n_islands} islands")
+        generation = 0
+        while generation < n_generations:
+            n_epoch = min(self.migration_interval, n_generations - generation)
+            futures = [self.pool.submit(evolve_island, 
+                            [lines for lines, _ in island], n_epoch,
+                            self.seed_sequences[i].spawn(1)[0])
+                       for i, island in enumerate(self.islands)]
+            results = [future.result() for future in futures]
+            self.islands = [island for island, _ in results]
+
+            for i in range(n_epoch):
+                island_best = [best[i] for _, best in results]
+                self.history.append({"generation" : generation + i + 1,
+                                     "island_best" : island_best,
+                                     "global_best" : max(island_best)})
+                print(f"Generation {generation + i + 1}: best fitness " +
+                      f"{max(island_best)} (islands: {island_best})")
+            generation += n_epoch
+            if generation < n_generations:
+                self.migrate()
+
+        self.generator.poems = [Sonnet(SONNET_RHYME_SCHEME, 
+                                       self.generator.ref_article, 
+                                       list(lines))
+                                for island in self.islands 
+                                for lines, _ in island]
+
+    def get_history(self):
+        """ Returns the best fitness of each island and of all islands after
+            every generation that has been run.
+        """
+        return self.history
+
+    def close(self):
+        """ Shuts the worker processes down.
+        """
+        self.pool.shutdown()
+
+
+def main():
+    n_islands = 4
+    generator = GeneratorSystem(n_poems=5 * n_islands, workers=n_islands)
+    generator.fetch_reference_article()
+    generator.generate_original_poems()
+    island_model = IslandModel(generator, n_islands, migration_interval=2)
+    island_model.run(n_generations=6)
+    island_model.close()
+    generator.write_poems_to_files()
+    generator.close()
+    print("All done :)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
-import spacy 
 from collections import Counter
 from gensim.models import Word2Vec
+import numpy as np
+import time
 from scrape_reddit import ScrapeReddit
+from nlp_resources import REGISTRY
 
 
 class KeywordExtractor():
@@ -22,6 +24,11 @@ class KeywordExtractor():
         Strings corresponding to adjectives mapped to their frequency.
     verbs : Counter
         Strings corresponding to verbs mapped to their frequency.
+    article_word2vec : Word2Vec
+        Word2Vec model trained on the article, trained once when first needed.
+    timings : dictionary
+        Time spent training the article model and finding synonyms, along 
+        with the sizes they depend on.
 
     Methods
     -------
@@ -32,8 +39,12 @@ class KeywordExtractor():
     calculate_frequencies():
         Stores how many times each word occurs in article scaled by their
         overall frequency in a greater corpus.
+    get_article_word2vec():
+        Returns the Word2Vec model trained on the article.
     get_context_aware_synonyms():
         Uses Word2Vec to compute context-aware synonyms.
+    get_batch_synonyms():
+        Computes context-aware synonyms of many words in one pass.
     add_context_aware_synonyms():
         Expands keyword counters mined from ref article to include synonyms.
     process_text():
@@ -47,6 +58,8 @@ class KeywordExtractor():
         Returns adjective Counter
     get_verbs():
         Returns verb Counter
+    get_timings():
+        Returns the synonym expansion timing metrics
     """
     def __init__(self, text):
         self.text = text
@@ -56,7 +69,10 @@ class KeywordExtractor():
         self.adjectives = Counter()
         self.verbs = Counter()
 
-        self.nlp = spacy.load("en_core_web_sm") # Load the spaCy language model
+        self.article_word2vec = None
+        self.timings = {}
+
+        self.nlp = REGISTRY.get("spacy") # Shared spaCy language model
     
     def is_wanted_tok(self, token):
         """ Returns whether a token should be filtered out to avoid non-word
@@ -95,21 +111,22 @@ class KeywordExtractor():
 
     def calculate_frequencies(self):
         """ Iterates through all of words in the text. For each word, it 
-            calculates how frequently it occurs in the aritcle, and divides
-            it by how frequently it occurs in the Reddit corpus to emphasize
-            more unique words relevant to the article. Then, it stores the word
-            and its associated value sorted by part of speech.
+            calculates how frequently it occurs in the aritcle, and scales it
+            by how rare the word is across the Reddit corpus (its TF-IDF) to
+            emphasize more unique words relevant to the article. Then, it 
+            stores the word and its associated value sorted by part of speech.
+            Every occurrence adds at least 1, so a keyword's value is never
+            below its number of occurrences. The Reddit document frequencies
+            of all of the words are looked up in one call.
         """
         reddit_scraper = ScrapeReddit()
-        #Get frequency of words in ref article
-        total_counts = Counter()
-        for word in self.text:
-            total_counts[word] = reddit_scraper.get_amount(word) 
-
-        #scale by overall frequency and sort by POS
         processed_text = self.nlp(self.text)
-        for token in processed_text:
-            val = int(1 / (total_counts[token.text] + 1)) 
+
+        #Get frequency of words in ref article and scale by rarity on Reddit
+        vals = reddit_scraper.get_idfs([token.text for token in processed_text])
+
+        #sort by POS
+        for token, val in zip(processed_text, vals.tolist()):
             if token.ent_type_:
                 self.entities[token.text] += val
             if token.pos_ == "NOUN":
@@ -119,6 +136,22 @@ class KeywordExtractor():
             elif token.pos_ == "VERB":
                 self.verbs[token.text] += val
     
+    def get_article_word2vec(self):
+        """ Trains a Word2Vec model on the sentences of the article the first
+            time it is needed and reuses it afterwards.
+            Returns:
+                The Word2Vec model trained on the article.
+        """
+        if self.article_word2vec is None:
+            start = time.perf_counter()
+            sentences = [s.split() for s in self.text.split('.') if s.strip()]
+            self.article_word2vec = Word2Vec(sentences=sentences, 
+                                             vector_size=100, window=5, 
+                                             min_count=1, workers=4)
+            self.timings["train_seconds"] = time.perf_counter() - start
+            self.timings["vocab_size"] = len(self.article_word2vec.wv)
+        return self.article_word2vec
+
     def get_context_aware_synonyms(self, word):
         """ Uses Word2Vec library to compute context-aware synonyms of a given
             word.
@@ -127,35 +160,65 @@ class KeywordExtractor():
             Returns:
                 List of context-aware synoynms
         """
-        sentences = [s.split() for s in self.text.split('.') if s.strip()]
-        word2vec_model = Word2Vec(sentences=sentences, vector_size=100, 
-                                  window=5, min_count=1, workers=4)
+        word2vec_model = self.get_article_word2vec()
         if word in word2vec_model.wv.key_to_index:
             sim_words = word2vec_model.wv.most_similar(word, topn=5)
             context_aware_synonyms = [sim_word for sim_word, _ in sim_words]
             return context_aware_synonyms
         return []
 
+    def get_batch_synonyms(self, words, topn=5):
+        """ Computes the context-aware synonyms of many words at once using
+            the article's Word2Vec model. The cosine similarities between all
+            of the words and the whole vocabulary are computed in one matrix
+            product, and the top matches of each word are selected together.
+            Arguments:
+                words (list) : words to get synonyms of
+                topn (int) : number of synonyms per word
+            Returns:
+                Dictionary mapping each word to its list of synonyms (empty 
+                for words the model does not know).
+        """
+        wv = self.get_article_word2vec().wv
+        known = [word for word in words if word in wv.key_to_index]
+        synonyms = {word : [] for word in words}
+        topn = min(topn, len(wv) - 1)
+        if not known or topn <= 0:
+            return synonyms
+
+        vectors = wv.get_normed_vectors()
+        word_idxs = np.array([wv.key_to_index[word] for word in known])
+        sims = vectors[word_idxs] @ vectors.T
+        sims[np.arange(len(known)), word_idxs] = -np.inf # Exclude the word
+
+        top = np.argpartition(-sims, topn - 1, axis=1)[:, :topn]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        top = np.take_along_axis(top, np.argsort(-top_sims, axis=1), axis=1)
+        for word, idxs in zip(known, top):
+            synonyms[word] = [wv.index_to_key[idx] for idx in idxs]
+        return synonyms
+
     def add_context_aware_synonyms(self):
         """ Generates context-aware synonyms of every keyword used in the
             article to expand the possible vocabulary set that relates to 
             the article. Records the frequency of the synonyms as one count
-            less than the original word.
+            less than the original word. The article model is trained once
+            and the synonyms of every keyword are found in one batch.
         """
-        for noun, count in self.nouns.copy().items():
-            synonyms = self.get_context_aware_synonyms(noun)
-            for synonym in synonyms:
-                self.nouns[synonym] += count - 1 
-        
-        for adj, count in self.adjectives.copy().items():
-            synonyms = self.get_context_aware_synonyms(adj)
-            for synonym in synonyms:
-                self.adjectives[synonym] += count - 1
-        
-        for verb, count in self.verbs.copy().items():
-            synonyms = self.get_context_aware_synonyms(verb)
-            for synonym in synonyms:
-                self.verbs[synonym] += count - 1
+        pos_counters = [self.nouns, self.adjectives, self.verbs]
+        originals = [counter.copy() for counter in pos_counters]
+        keywords = list({word for counter in originals for word in counter})
+
+        self.get_article_word2vec()
+        start = time.perf_counter()
+        synonyms = self.get_batch_synonyms(keywords)
+        self.timings["synonym_seconds"] = time.perf_counter() - start
+        self.timings["n_keywords"] = len(keywords)
+
+        for counter, original in zip(pos_counters, originals):
+            for word, count in original.items():
+                for synonym in synonyms[word]:
+                    counter[synonym] += count - 1
     
     def process_text(self):
         """ High-level function that collects and preprocesses the reference
@@ -185,4 +248,10 @@ class KeywordExtractor():
         """ Returns the Counter of verbs.
         """
         return self.verbs
+
+    def get_timings(self):
+        """ Returns how long training the article model and finding synonyms
+            took, with the article vocabulary size and number of keywords.
+        """
+        return self.timings
     
\ No newline at end of file
@@ -0,0 +1,109 @@
+import numpy as np
+
+
+class KeywordSimilarity():
+    """ Precomputed structures for finding article keywords that are
+        semantically similar to a word. For each part of speech, stores the
+        keywords that have embeddings, a matrix of their normalized Word2Vec
+        vectors, and a weight vector of the square roots of their prevalence
+        scores, so the similarity of a word to every keyword is one
+        matrix-vector product.
+
+    Attributes
+    ----------
+    word_vectors : KeyedVectors
+        The Word2Vec vectors used to compare words.
+    pos_dics : dictionary
+        Maps parts of speech to Counters of keyword prevalence scores.
+    keywords : dictionary
+        Maps parts of speech to the keywords that have embeddings.
+    matrices : dictionary
+        Maps parts of speech to matrices of normalized keyword vectors.
+    weights : dictionary
+        Maps parts of speech to the square roots of keyword prevalence scores.
+    choices : dictionary
+        Memoized candidate words and probabilities for (word, pos) pairs.
+
+    Methods
+    -------
+    build_matrices():
+        Builds the keyword matrix and weight vector of each part of speech.
+    get_choices():
+        Returns the candidate keywords and probabilities for a word.
+    choose_similar_word():
+        Returns a random keyword weighted by similarity to a word.
+    """
+
+    def __init__(self, word_vectors, pos_dics):
+        self.word_vectors = word_vectors
+        self.pos_dics = pos_dics
+        self.keywords = {}
+        self.matrices = {}
+        self.weights = {}
+        self.choices = {}
+        self.build_matrices()
+
+    def build_matrices(self):
+        """ Builds, for every part of speech, the matrix of normalized vectors
+            of the keywords that are in the Word2Vec model and the vector of
+            the square roots of their prevalence scores.
+        """
+        for pos, word_freqs in self.pos_dics.items():
+            keywords = [word for word in word_freqs
+                        if word in self.word_vectors]
+            self.keywords[pos] = keywords
+            self.matrices[pos] = np.array(
+                [self.word_vectors.get_vector(word, norm=True)
+                 for word in keywords], dtype=np.float32).reshape(
+                            len(keywords), self.word_vectors.vector_size)
+            self.weights[pos] = np.sqrt(np.maximum(
+                [word_freqs[word] for word in keywords], 0))
+
+    def get_choices(self, original_word, pos):
+        """ Computes the candidate keywords that could replace a word and the
+            probability of choosing each. If the word is in the Word2Vec
+            model, each keyword of the same part of speech is weighted by its
+            similarity to the word multiplied by the square root of its
+            prevalence score. Otherwise, every keyword is weighted by its
+            prevalence score. Results are memoized per word and part of
+            speech.
+            Args:
+                original_word (string) : word to be replaced
+                pos (string) : part of speech of original word
+            Returns:
+                List of candidate keywords and array of their probabilities.
+        """
+        key = (original_word, pos)
+        if key not in self.choices:
+            if original_word in self.word_vectors and self.keywords[pos]:
+                query = self.word_vectors.get_vector(original_word,
+                                                     norm=True)
+                words = self.keywords[pos]
+                sims = self.matrices[pos] @ query
+                weights = np.maximum(sims, 0) * self.weights[pos]
+            else:
+                words = list(self.pos_dics[pos].keys())
+                weights = np.maximum(list(self.pos_dics[pos].values()), 0)
+
+            weights = np.asarray(weights, dtype=np.float64)
+            if len(weights) and weights.sum() > 0:
+                probs = weights / weights.sum()
+            else: # No keyword stands out, so every keyword is equally likely
+                probs = np.full(len(words), 1 / max(len(words), 1))
+            self.choices[key] = (words, probs)
+        return self.choices[key]
+
+    def choose_similar_word(self, original_word, pos):
+        """ Chooses a random article keyword of the given part of speech,
+            weighted by its similarity to the original word.
+            Args:
+                original_word (string) : word to be replaced
+                pos (string) : part of speech of original word
+            Returns:
+                The chosen keyword (the original word if there are no
+                keywords of that part of speech).
+        """
+        words, probs = self.get_choices(original_word, pos)
+        if not words:
+            return original_word
+        return words[np.random.choice(len(words), p=probs)]
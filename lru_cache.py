@@ -0,0 +1,97 @@
+from collections import OrderedDict
+import threading
+
+
+class LRUCache():
+    """ A bounded cache that evicts the least recently used entry once it is
+        full and keeps count of its hits and misses.
+
+    Attributes
+    ----------
+    maxsize : int
+        The maximum number of entries stored at once.
+    entries : OrderedDict
+        Maps keys to values, ordered from least to most recently used.
+    hits : int
+        The number of lookups that found their key.
+    misses : int
+        The number of lookups that did not find their key.
+    lock : Lock
+        Keeps the entries consistent when the cache is shared by threads.
+
+    Methods
+    -------
+    get():
+        Returns the value stored for a key, or a default if it is missing.
+    put():
+        Stores a value for a key, evicting the oldest entry if needed.
+    clear():
+        Removes every entry and resets the counters.
+    get_stats():
+        Returns the size, hits, misses, and hit rate of the cache.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """ Returns the value stored for a key and marks it as most recently
+            used.
+            Args:
+                key (hashable) : the key to look up
+                default (object) : returned when the key is not stored
+            Returns:
+                The stored value, or the default.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """ Stores a value for a key. If the cache is over its size limit, the
+            least recently used entry is dropped.
+            Args:
+                key (hashable) : the key to store the value under
+                value (object) : the value to store
+        """
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def __contains__(self, key):
+        """ Returns whether a key is stored, without counting a lookup.
+        """
+        return key in self.entries
+
+    def __len__(self):
+        """ Returns the number of stored entries.
+        """
+        return len(self.entries)
+
+    def clear(self):
+        """ Removes every entry and resets the hit and miss counters.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        """ Returns the statistics of the cache.
+            Returns:
+                Dictionary with the size, hits, misses, and hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {"size" : len(self.entries), "maxsize" : self.maxsize,
+                "hits" : self.hits, "misses" : self.misses,
+                "hit_rate" : self.hits / lookups if lookups else 0.0}
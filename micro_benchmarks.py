@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+from nlp_resources import REGISTRY
+from news_article import Article
+from fitness import Fitness
+from mutations import Mutator
+from high_level_system import SONNET_RHYME_SCHEME
+from benchmark_fixtures import setup_fixtures
+import grammar_checker # Registers the shared grammar checker
+import coherence # Registers the shared coherence engine
+
+""" Names of the benchmarked functions, in the order they are run.
+"""
+BENCHMARKS = ["compute_grammar_score", "get_coherence", "rhyme_score",
+              "article_keyword_count", "incorporate_rhyme_scheme",
+              "swap_words_using_bigram", "replace_keywords"]
+
+""" Percentiles of the call latencies that are reported.
+"""
+PERCENTILES = [50, 90, 99]
+
+""" Folder the results are written to when no output file is given.
+"""
+RESULTS_DIR = "benchmark_results"
+
+
+def get_commit():
+    """ Returns the short hash of the checked out commit, or "unknown" if
+        it cannot be found.
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def summarize(times_ns):
+    """ Summarizes the latencies of the timed calls of a benchmark.
+        Args:
+            times_ns (list) : the latency of each call in nanoseconds
+        Returns:
+            Dictionary with the number of calls and the mean, minimum,
+            maximum, and percentile latencies in microseconds.
+    """
+    times_us = np.array(times_ns, dtype=np.float64) / 1000
+    summary = {"calls" : len(times_us), "mean_us" : float(times_us.mean()),
+               "min_us" : float(times_us.min()),
+               "max_us" : float(times_us.max())}
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}_us"] = float(np.percentile(times_us,
+                                                           percentile))
+    return summary
+
+
+class MicroBenchmarks():
+    """ Times the fitness scores and mutation operators of the system one
+        call at a time on fixed fixtures. Before each call, a fresh Fitness or
+        Mutator is made for one of the fixture sonnets, the caches that would
+        otherwise answer the call are cleared, and the random number
+        generators are seeded, so every run does the same work. Only the call
+        itself is timed.
+
+    Attributes
+    ----------
+    article : Article
+        The fixture reference article.
+    sonnets : list
+        The fixture sonnets, each a list of lines.
+    rhyme_scheme : list
+        The rhyme scheme the sonnets are scored and mutated with.
+    n_calls : int
+        The number of timed calls of each benchmark.
+    n_warmup : int
+        The number of untimed calls made before the timed ones.
+    seed : int
+        Seed of the random number generators.
+
+    Methods
+    -------
+    seed_call():
+        Seeds the random number generators for one call.
+    make_fitness():
+        Returns a fresh Fitness of a sonnet.
+    make_mutator():
+        Returns a fresh Mutator of a sonnet.
+    prepare():
+        Sets up one call of a benchmark.
+    time_benchmark():
+        Times the calls of one benchmark.
+    run():
+        Times every chosen benchmark.
+    """
+
+    def __init__(self, article, sonnets, n_calls=200, n_warmup=10, seed=0):
+        self.article = article
+        self.sonnets = sonnets
+        self.rhyme_scheme = SONNET_RHYME_SCHEME
+        self.n_calls = n_calls
+        self.n_warmup = n_warmup
+        self.seed = seed
+
+    def seed_call(self, call_idx):
+        """ Seeds the random number generators so a call's mutation only
+            depends on the seed and the index of the call.
+            Args:
+                call_idx (int) : the index of the call
+        """
+        random.seed(self.seed * 1000003 + call_idx)
+        np.random.seed((self.seed, call_idx))
+
+    def make_fitness(self, sonnet):
+        """ Returns a Fitness of a sonnet that has no partial scores yet.
+        """
+        return Fitness(sonnet, self.article, self.rhyme_scheme)
+
+    def make_mutator(self, sonnet):
+        """ Returns a Mutator of a copy of a sonnet's lines.
+        """
+        return Mutator(list(sonnet), self.article, self.rhyme_scheme)
+
+    def prepare(self, name, sonnet):
+        """ Sets up one call of a benchmark. The grammar and coherence caches
+            are cleared so each call does its full work.
+            Args:
+                name (string) : the benchmark (one of BENCHMARKS)
+                sonnet (list) : the lines the call works on
+            Returns:
+                Function that makes the call.
+        """
+        if name == "compute_grammar_score":
+            REGISTRY.get("grammar_checker").error_counts.clear()
+            return self.make_fitness(sonnet).compute_grammar_score
+        if name == "get_coherence":
+            REGISTRY.get("coherence_engine").scores.clear()
+            return self.make_fitness(sonnet).get_coherence
+        if name in ["rhyme_score", "article_keyword_count"]:
+            return getattr(self.make_fitness(sonnet), name)
+        if name in ["incorporate_rhyme_scheme", "swap_words_using_bigram",
+                    "replace_keywords"]:
+            return getattr(self.make_mutator(sonnet), name)
+        raise ValueError(f"Unknown benchmark '{name}', expected one of " +
+                         f"{BENCHMARKS}")
+
+    def time_benchmark(self, name):
+        """ Times the calls of one benchmark, cycling through the fixture
+            sonnets. The warmup calls are not timed.
+            Args:
+                name (string) : the benchmark (one of BENCHMARKS)
+            Returns:
+                Summary of the latencies of the timed calls.
+        """
+        times_ns = []
+        for i in range(self.n_warmup + self.n_calls):
+            call = self.prepare(name, self.sonnets[i % len(self.sonnets)])
+            self.seed_call(i)
+            start = time.perf_counter_ns()
+            call()
+            elapsed = time.perf_counter_ns() - start
+            if i >= self.n_warmup:
+                times_ns.append(elapsed)
+        return summarize(times_ns)
+
+    def run(self, names=BENCHMARKS):
+        """ Times every chosen benchmark and prints a row of results for each.
+            Args:
+                names (list) : the benchmarks to run
+            Returns:
+                Dictionary mapping benchmark names to their summaries.
+        """
+        results = {}
+        print(f"{'benchmark':<26}{'calls':>7}" +
+              "".join(f"{f'p{p} (us)':>12}" for p in PERCENTILES) +
+              f"{'mean (us)':>12}")
+        for name in names:
+            results[name] = self.time_benchmark(name)
+            print(f"{name:<26}{results[name]['calls']:>7}" +
+                  "".join(f"{results[name][f'p{p}_us']:>12.1f}"
+                          for p in PERCENTILES) +
+                  f"{results[name]['mean_us']:>12.1f}")
+        return results
+
+
+def compare_results(results, baseline_path):
+    """ Prints how the median latency of each benchmark changed from a
+        previous run's results.
+        Args:
+            results (dictionary) : the summaries of the current run
+            baseline_path (string) : the JSON results of the previous run
+    """
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    print(f"\nCompared to {baseline['commit']} ({baseline['timestamp']}):")
+    for name, summary in results.items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["p50_us"]
+        change = (summary["p50_us"] - before) / before * 100
+        print(f"{name:<26}{before:>12.1f} -> {summary['p50_us']:>10.1f} us" +
+              f"{change:>+10.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the fitness scores " +
+                                     "and mutation operators offline.")
+    parser.add_argument("--calls", type=int, default=200,
+                        help="timed calls per benchmark")
+    parser.add_argument("--warmup", type=int, default=10,
+                        help="untimed calls made before the timed ones")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS,
+                        default=BENCHMARKS, help="benchmarks to run")
+    parser.add_argument("--output", help="file to write the JSON results " +
+                        f"to (default: {RESULTS_DIR}/micro_<commit>.json)")
+    parser.add_argument("--compare", help="JSON results of an earlier run " +
+                        "to compare against")
+    args = parser.parse_args()
+
+    commit = get_commit()
+    with tempfile.TemporaryDirectory() as work_dir:
+        fixtures = setup_fixtures(work_dir)
+        article = Article(article=fixtures["article"])
+        benchmarks = MicroBenchmarks(article, fixtures["sonnets"], args.calls,
+                                     args.warmup, args.seed)
+        results = benchmarks.run(args.only)
+
+    output = {"commit" : commit, "timestamp" : datetime.now().isoformat(),
+              "python" : platform.python_version(),
+              "settings" : {"calls" : args.calls, "warmup" : args.warmup,
+                            "seed" : args.seed,
+                            "sonnets" : len(fixtures["sonnets"])},
+              "results" : results}
+    path = args.output or os.path.join(RESULTS_DIR, f"micro_{commit}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(output, file, indent=2)
+    print(f"Results written to {path}")
+
+    if args.compare:
+        compare_results(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
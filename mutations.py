@@ -1,11 +1,11 @@
 import random
 import numpy as np
-import pronouncing
 import string
-import spacy
-from language_tool_python import LanguageTool
-from gensim.models import Word2Vec as GensimWord2Vec
 from scrape_reddit import ScrapeReddit
+from nlp_resources import REGISTRY
+import rhyme_index # Registers the shared rhyme index
+import parsed_lines # Registers the parsed inspiring set lines
+from tracing import TRACER, traced
 
 class Mutator():
     """ Contains tools for mutating and altering the associated poem.
@@ -20,23 +20,23 @@ class Mutator():
         List encoding the desired rhyme scheme.
     nlp : spacy 
         Spacy tool for tokenizing words.
-    word2vec : Word2Vec
-        Pretrained Word2Vec for semantic embedding of words.
     grammar_tool : LanguageTool
-        Tool for checking grammar
+        Tool for checking grammar, loaded the first time it is needed.
+    rhyme_index : RhymeIndex
+        Precomputed index of rhyming words and their parts of speech.
+    parsed_lines : ParsedLines
+        Precomputed tokens, tags, and entities of the inspiring set lines.
 
     Methods
     -------
-    get_random_word():
-        Selects random word from article keywords weighted by their freq.
     get_semantically_similar_word():
         Uses Word2Vec to return a semantically similar word.
     replace_keyword():
         Calls to get semantically similar keyword based on pos.
     replace_keywords():
         Calls to replace all nouns, verbs, and adjectives in a text.
-    filter_subwords():
-        Ensures no potential rhymes are subwords of the rhyming word.
+    get_pos():
+        Returns the part of speech of a single word.
     generate_rhyme():
         Generates a rhyme of a given word and a desires part of speech.
     get_last_word_and_idx():
@@ -46,6 +46,8 @@ class Mutator():
     punctuation_spacing():
         Helper function to counteract de-spacing between words and punctuation
         in corrector method to correspond to rest of system.
+    get_grammar_tool():
+        Returns the LanguageTool grammar tool.
     correct_grammar():
         Uses LanguageTool to correct grammar of randomly selected line.
     swap_words_from_article():
@@ -61,24 +63,16 @@ class Mutator():
     """
 
     def __init__(self, sonnet, ref_article, rhyme_scheme):
-        """ Stores the poem information and the relevant language tools.
+        """ Stores the poem information and the relevant language tools,
+            which are shared through the process-wide registry.
         """
         self.sonnet = sonnet
         self.ref_article = ref_article
         self.rhyme_scheme = rhyme_scheme
-        self.nlp = spacy.load("en_core_web_sm")
-        self.word2vec = GensimWord2Vec.load("nlp_models/word2vec.model")
-        self.grammar_tool = LanguageTool('en-US')   
-
-    def get_random_word(self, dic):
-        """ Given a dictionary of words mapped to values, selects a random 
-            word based on the probability of their associated value.
-            Returns:
-                a randomly selected word
-        """
-        words, freqs = list(dic.keys()), list(dic.values())
-        norm_freqs = [freq / sum(freqs) for freq in freqs]
-        return np.random.choice(words, p = norm_freqs)
+        self.nlp = REGISTRY.get("spacy")
+        self.grammar_tool = None
+        self.rhyme_index = REGISTRY.get("rhyme_index")
+        self.parsed_lines = REGISTRY.get("parsed_lines")
 
     def get_semantically_similar_word(self, original_word, pos):
         """ Uses the trained Word2Vec Model to compute the semantic similarity
@@ -86,26 +80,15 @@ class Mutator():
             of speech extracted from the reference article. Then it chooses
             a random article keyword weighted by the similarity score
             multiplied by the square root of the prevelence scores computed
-            earlier.
+            earlier. If the word is not in the model, returns a random keyword
+            weighted by prevalence. The similarities are computed with the
+            article's precomputed keyword matrices.
             Args:
                 original_word (string) : word to be replaces
                 pos (string) : part of speech of original word
         """
-        pos_dics = self.ref_article.get_pos_dics()
-        word_freqs = pos_dics[pos]
-
-        # If the word is not in the model, return a random word
-        if original_word not in self.word2vec.wv:
-            return self.get_random_word(word_freqs)
-
-        # Weight each potential word by the square root 
-        weighted_sims = {}
-        for new_word, freq in word_freqs.items():
-            if new_word in self.word2vec.wv:
-                sim = self.word2vec.wv.similarity(original_word, new_word)
-                weighted_sims[new_word] = max(0, sim) * np.sqrt(freq)
-
-        return self.get_random_word(weighted_sims)
+        keyword_similarity = self.ref_article.get_keyword_similarity()
+        return keyword_similarity.choose_similar_word(original_word, pos)
     
     def replace_keyword(self, token):
         """ Given a token, finds a semantically similar keyword of the same
@@ -131,66 +114,51 @@ class Mutator():
             new_text = token.text
         return new_text
 
+    @traced("mutator.replace_keywords")
     def replace_keywords(self):
         """ Replaces all of the nouns, adjectives, and verbs in the first 
             generation poems with keywords (and their synonyms) from the 
-            reference articles.
+            reference articles. Lines from the inspiring set were parsed
+            ahead of time, so spaCy only runs on lines that were not.
         """
         for i in range(len(self.sonnet)):
             tokens = []
-            for token in self.nlp(self.sonnet[i]):
+            parsed = self.parsed_lines.get_tokens(self.sonnet[i])
+            if parsed is None:
+                parsed = self.nlp(self.sonnet[i])
+            for token in parsed:
                 tokens.append(self.replace_keyword(token))
             self.sonnet[i] = ' '.join(tokens)
         self.incorporate_rhyme_scheme()
             
-    def filter_subwords(self, original_word, rhyming_words):
-        """ Filters list of potential rhymes to exclude any words that contain
-            the original word or vice versa. This function is motivated by 
-            getting a more diverse set of rhymes.
+    def get_pos(self, word):
+        """ Returns the part of speech of a single word, using the tag 
+            precomputed in the rhyme index and only running spaCy for words
+            that are not in it.
             Args:
-                original_word (string) : the word to be rhymed with
-                rhyming_words (list) : the list of potential rhyming words
+                word (string) : the word to tag
             Returns:
-                A filtered version of rhyming words that does not contain
-                subwords.
+                The part of speech of the word.
         """
-        new_potential_rhymes = []
-        for new_word in rhyming_words:
-            if original_word not in new_word.text and \
-                                            new_word.text not in original_word:
-                new_potential_rhymes.append(new_word)
-        return new_potential_rhymes
-    
+        pos = self.rhyme_index.get_pos(word)
+        if pos is None:
+            pos = self.nlp(word)[0].pos_
+        return pos
+
     def generate_rhyme(self, pos, to_rhyme):
-        """ Given a tokenized version of a word to rhyme with, returns a rhyme
-            that is of a specified part of speech. If there are no rhymes of
-            that part of speech, returns a random rhyming word. If there are
-            no rhyming words, returns the word to rhyme with.
+        """ Given a word to rhyme with, returns a rhyme that is of a 
+            specified part of speech. If there are no rhymes of that part of
+            speech, returns a random rhyming word. If there are no rhyming
+            words, returns the word to rhyme with. Potential rhymes that 
+            contain the original word or vice versa are excluded to get a more
+            diverse set of rhymes.
             Args:
                 pos (string) : the desired part of speech of the new rhyme
                 to_rhyme (string) : the word to rhyme with
             Returns:
                 The rhyming word
         """
-        rhyming_words = self.nlp(" ".join(pronouncing.rhymes(to_rhyme.text)))
-        rhyming_words = self.filter_subwords(to_rhyme.text, rhyming_words)
-        if pos == "NOUN":
-            rhyme_options = [r for r in rhyming_words if r.pos_ == "NOUN"]
-        elif pos == "ADJ":
-            rhyme_options = [r for r in rhyming_words if r.pos_ == "ADJ"]
-        elif pos == "VERB":
-            rhyme_options = [r for r in rhyming_words if r.pos_ == "VERB"]
-        else:
-            rhyme_options = [r for r in rhyming_words if r.pos_ != "ADJ" \
-                             and r.pos_ != "NOUN" and r.pos_ != "VERB"]
-        
-        if not rhyming_words: # Return original word if no rhymes
-            return to_rhyme.text
-        if not rhyme_options: # Return random rhyme if none of the correct pos
-            return np.random.choice(rhyming_words).text 
-        
-        # Optimally, return rhyme of the desired pos
-        return np.random.choice(rhyme_options).text 
+        return self.rhyme_index.generate_rhyme(pos, to_rhyme)
     
     def get_last_word_and_idx(self, words):
         """ Returns the last word (excluding punctuation) and its
@@ -204,6 +172,7 @@ class Mutator():
             if words[i] not in string.punctuation:
                 return words[i], i
 
+    @traced("mutator.rhyme_scheme")
     def incorporate_rhyme_scheme(self):
         """ This function imposes the rhyme scheme of the poem. For each 
             rhyming line pairs, it gets the last word from each line. If the
@@ -215,12 +184,13 @@ class Mutator():
             to_rhyme, _ = self.get_last_word_and_idx(self.sonnet[line1].split())
             prev_word, idx_to_replace = self.get_last_word_and_idx(self.sonnet[line2].split())
             
-            if prev_word != to_rhyme and \
-                          prev_word in " ".join(pronouncing.rhymes(to_rhyme)):
+            if self.rhyme_index.rhymes_with(prev_word, to_rhyme):
+                TRACER.count("mutator.rhymes_kept")
                 continue  # lines already rhyme
+            TRACER.count("mutator.rhymes_replaced")
 
-            pos = self.nlp(prev_word)[0].pos_
-            new_word = self.generate_rhyme(pos, self.nlp(to_rhyme)[0])
+            pos = self.get_pos(prev_word)
+            new_word = self.generate_rhyme(pos, to_rhyme)
             
             prev_line = self.sonnet[line2].split()
             prev_line[idx_to_replace] = new_word
@@ -253,15 +223,26 @@ class Mutator():
                 result.append(word)
         return ' '.join(result)
 
+    def get_grammar_tool(self):
+        """ Returns the shared LanguageTool grammar tool. It is only loaded
+            when a poem is first corrected, so building poems does not start
+            a LanguageTool server.
+        """
+        if self.grammar_tool is None:
+            self.grammar_tool = REGISTRY.get("grammar_tool")
+        return self.grammar_tool
+
+    @traced("mutator.correct_grammar")
     def correct_grammar(self):
         """ Chooses a random line of the Sonnet and applied the LanguageTool
             grammar correct method on it.
         """
         idx = random.randint(0, 13)
-        corrected_line = self.grammar_tool.correct(self.sonnet[idx])
+        corrected_line = self.get_grammar_tool().correct(self.sonnet[idx])
         new_line = self.punctuation_spacing(corrected_line)
         self.sonnet[idx] = new_line
     
+    @traced("mutator.swap_from_article")
     def swap_words_from_article(self):
         """ For each line of the Sonnet, selects one keyword to be swapped
             with a semantically similar word of the same part of speech
@@ -276,11 +257,13 @@ class Mutator():
             new_sonnet.append(line)
         self.sonnet = new_sonnet
     
+    @traced("mutator.swap_using_bigram")
     def swap_words_using_bigram(self):
         """ Chooses a random line from the Sonnet and a random starting index
             of the line to start the swap. From the start index on, uses the
             reddit bigram to predict the next most likely word given the
-            previous word and continues until the end of the line.
+            previous word and continues until the end of the line. The whole
+            tail of the line is generated in one call to the bigram model.
         """
         # Chooses a random line and random start index of line that is not
         # punctuation
@@ -293,16 +276,18 @@ class Mutator():
 
         # Uses reddit bigram to generate next most likely word until the end
         # of the line
+        # (words not in bigram are left alone)
         reddit_scraper = ScrapeReddit()
+        to_replace = [w for w in line[start_idx + 1:] 
+                      if w not in string.punctuation]
+        new_words = iter(reddit_scraper.generate_line_tail(curr_word, 
+                                                           to_replace))
         new_line = line[:start_idx + 1]
         for i in range(start_idx + 1, len(line)):
             if line[i] in string.punctuation:
                 new_line.append(line[i]) # Preserve punctuation
             else:
-                curr_word = reddit_scraper.get_probable_next_word(curr_word)
-                if not curr_word: #word not in bigram -> leave alone
-                    curr_word = line[i]
-                new_line.append(curr_word)
+                new_line.append(next(new_words))
 
         new_line = " ".join(new_line)
         self.sonnet[line_idx] = new_line
@@ -3,6 +3,8 @@ import bs4
 from bs4 import BeautifulSoup
 import re
 import numpy as np
+from article_fetcher import ArticleFetcher, REQUEST_TIMEOUT
+from nlp_resources import REGISTRY
 
 """ Minimum article length to be permitted."""
 MIN_ARTICLE_LENGTH = 500
@@ -11,6 +13,86 @@ MIN_ARTICLE_LENGTH = 500
 CATEGORIES = ['business', 'entertainment', 'general', 'health', 'science', 
               'sports', 'technology']
 
+""" Maximum number of times NewsAPI is asked for articles before giving up."""
+MAX_API_ATTEMPTS = 3
+
+
+def filter_unwanted_elements(soup):
+    """ Filters unwanted HTML elements, text patterns, and characters from
+        the text scraped from a website.
+        Args:
+            soup (BeautifulSoup) : result of website scraping
+    """
+    #Excludes certain HTML elements
+    elements_to_exclude = [
+        ('div', {'class': ['subscription', 'ads', 'related-articles', 
+                           'sidebar']}),
+        ('a', {'class': 'navigation-link'}),
+        ('ul', {'class': 'social-media-links'}),
+        ('div', {'id': re.compile(r'comment', re.IGNORECASE)}),
+    ]
+    for tag_name, attrs in elements_to_exclude:
+        for tag in soup.find_all(tag_name, attrs=attrs):
+            tag.decompose()
+
+    # Excludes unwanted text patterns related to the website itself
+    unwanted_patterns = [
+        re.compile(r'copyright', re.IGNORECASE),
+        re.compile(r'\bAll rights reserved\b', re.IGNORECASE),
+        re.compile(r'cookie', re.IGNORECASE),
+        re.compile(r'consent', re.IGNORECASE),
+        re.compile(r'privacy policy', re.IGNORECASE),
+        re.compile(r'All Rights Reserved', re.IGNORECASE),
+        re.compile(r'Follow Us', re.IGNORECASE),
+        re.compile(r'nt', re.IGNORECASE)
+    ]
+    for pattern in unwanted_patterns:
+        for element in soup.find_all(text=pattern):
+            if isinstance(element, bs4.element.Tag):
+                element.parent.decompose() 
+
+    # Excludes special characters + non-ASCII characters
+    special_character_pattern = r'[^\x00-\x7F]+'
+    for text_element in soup.find_all(text=True):
+        cleaned_text = re.sub(special_character_pattern, '', text_element)
+        text_element.replace_with(cleaned_text)
+    
+    return soup
+
+
+def extract_article_text(html):
+    """ Calls for BeautifulSoup to scrape the HTML of an article's
+        website. Then, it performs filtering to remove unwanted element of
+        texts.
+        Args:
+            html (string) : the HTML of the article's website
+        Returns:
+            The text of the article.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Filter out unwanted elements of website scrape
+    article_text = ""
+    modified_text = filter_unwanted_elements(soup)
+    for element in modified_text.find_all(['p', 'h1', 'h2', 'h3']):
+        article_text += element.get_text() + "\n"
+    return article_text
+
+
+def load_article_fetcher():
+    """ Creates the article fetcher shared by every NewsGetter in the
+        process, so its HTTP connections and threads are reused across
+        articles and its metrics cover all of them.
+    """
+    return ArticleFetcher(extract_article_text, MIN_ARTICLE_LENGTH)
+
+
+def get_fetch_metrics():
+    """ Returns the request and latency metrics of the article fetches made
+        in this process.
+    """
+    return REGISTRY.get("article_fetcher").get_metrics()
+
 
 class NewsGetter():
     """ Extracts news article from newsapi based on a user-selected category.
@@ -21,13 +103,14 @@ class NewsGetter():
         Contains title, description, and content of a news article.
     category : String
         The user-selected news category.
+    fetcher : ArticleFetcher
+        The shared fetcher that downloads candidate articles concurrently
+        with deadlines.
 
     Methods
     -------
     get_user_input_category():
         Prompts user to select a news category.
-    filter_unwanted_elements():
-        Filters unwanted HTML elements, text patterns, and characters from soup
     call_api():
         Calls NewsAPI to get news articles.
     scrape_article_website():
@@ -36,19 +119,29 @@ class NewsGetter():
     fetch_article():
         Gets all articles of a given category from the NewsAPI and gets a 
         singular article that meets length requirements.
+    fetch_url():
+        Gets the article at a given url.
     get_category():
         Returns the user-selected news category.
     get_article():
         Returns the retrieved article information.
     """
-    def __init__(self):
-        """ Prompts user to select an article category and fetches the 
-            corresponding article.
+    def __init__(self, category=None, url=None):
+        """ Prompts user to select an article category, unless one is given,
+            and fetches the corresponding article. If a url is given, the
+            article at that url is scraped instead.
         """
         self.article = {}
         self.category = ""
-        self.get_user_input_category()
-        self.fetch_article()
+        self.fetcher = REGISTRY.get("article_fetcher")
+        if url is not None:
+            self.fetch_url(url)
+        else:
+            if category is None:
+                self.get_user_input_category()
+            else:
+                self.category = category
+            self.fetch_article()
 
     def get_user_input_category(self):
         """ Prompts user to select a category of news.
@@ -61,48 +154,6 @@ class NewsGetter():
         choice = input("Choice: ")
         self.category = CATEGORIES[int(choice)]
 
-    def filter_unwanted_elements(self, soup):
-        """ Filters unwanted HTML elements, text patterns, and characters from
-            the text scraped from a website.
-            Args:
-                soup (BeautifulSoup) : result of website scraping
-        """
-        #Excludes certain HTML elements
-        elements_to_exclude = [
-            ('div', {'class': ['subscription', 'ads', 'related-articles', 
-                               'sidebar']}),
-            ('a', {'class': 'navigation-link'}),
-            ('ul', {'class': 'social-media-links'}),
-            ('div', {'id': re.compile(r'comment', re.IGNORECASE)}),
-        ]
-        for tag_name, attrs in elements_to_exclude:
-            for tag in soup.find_all(tag_name, attrs=attrs):
-                tag.decompose()
-
-        # Excludes unwanted text patterns related to the website itself
-        unwanted_patterns = [
-            re.compile(r'copyright', re.IGNORECASE),
-            re.compile(r'\bAll rights reserved\b', re.IGNORECASE),
-            re.compile(r'cookie', re.IGNORECASE),
-            re.compile(r'consent', re.IGNORECASE),
-            re.compile(r'privacy policy', re.IGNORECASE),
-            re.compile(r'All Rights Reserved', re.IGNORECASE),
-            re.compile(r'Follow Us', re.IGNORECASE),
-            re.compile(r'nt', re.IGNORECASE)
-        ]
-        for pattern in unwanted_patterns:
-            for element in soup.find_all(text=pattern):
-                if isinstance(element, bs4.element.Tag):
-                    element.parent.decompose() 
-
-        # Excludes special characters + non-ASCII characters
-        special_character_pattern = r'[^\x00-\x7F]+'
-        for text_element in soup.find_all(text=True):
-            cleaned_text = re.sub(special_character_pattern, '', text_element)
-            text_element.replace_with(cleaned_text)
-        
-        return soup
-
     def call_api(self):
         """ Makes a call to extract news articles from newsapi using predefined
             details.
@@ -116,52 +167,60 @@ class NewsGetter():
             'category': self.category,
             'apiKey': api_key,
         }
-        response = requests.get(base_url, params=parameters)
+        response = requests.get(base_url, params=parameters, 
+                                timeout=REQUEST_TIMEOUT)
         return response
 
     def scrape_article_website(self, articles):
-        """ Chooses a random article from a list of articles and calls for
-            BeautifulSoup to scrape it. Then, it performs filtering to remove
-            unwanted element of texts, and saves information about the article
-            if it is of sufficient length. Repeats until an article is
-            successfully scraped (sometimes issues with request).
+        """ Shuffles a list of articles and scrapes their websites several at
+            a time, saving information about the first article that is of
+            sufficient length. The fetch is bounded in time and in the number
+            of articles tried.
             Args:
                 articles (list) : list of articles to chose from.
+            Returns:
+                Whether an article was successfully scraped.
         """
-        while True:
-            article = np.random.choice(articles)
-
-            article_response = requests.get(article['url'])
-            if article_response.status_code == 200:
-                soup = BeautifulSoup(article_response.text, 'html.parser')
-                
-                # Filter out unwanted elements of website scrape
-                article_text = ""
-                modified_text = self.filter_unwanted_elements(soup)
-                for element in modified_text.find_all(['p', 'h1', 'h2', 'h3']):
-                    article_text += element.get_text() + "\n"
-
-                # Save article if it is of sufficient length
-                if len(article_text) >= MIN_ARTICLE_LENGTH:
-                    self.article = {"title" : article['title'], 
-                                    "text" : article_text,
-                                    "description" : article['title']}
-                    return
+        candidates = [articles[i] for i in np.random.permutation(len(articles))]
+        result = self.fetcher.fetch(candidates)
+        if result is None:
+            return False
+
+        article, article_text = result
+        self.article = {"title" : article['title'], 
+                        "text" : article_text,
+                        "description" : article['title']}
+        return True
 
     def fetch_article(self):
         """ Make a request to newsapi to retrieve news articles corresponding
             to a user-chosen category. Then, calls for the article to be
-            scraped for relevant text. Repeats until an article is successfully
-            extracted (sometimes issues with request).
+            scraped for relevant text. Repeats a bounded number of times until
+            an article is successfully extracted (sometimes issues with 
+            request).
         """
-        while True:
-            response = self.call_api()
+        for _ in range(MAX_API_ATTEMPTS):
+            try:
+                response = self.call_api()
+            except requests.RequestException:
+                continue
             if response.status_code == 200:
                 news_data = response.json()
                 if 'articles' in news_data and len(news_data['articles']) > 0:
                     articles = news_data['articles']
-                    self.scrape_article_website(articles)
-                    return
+                    if self.scrape_article_website(articles):
+                        return
+        raise RuntimeError(f"Could not fetch a {self.category} article " +
+                           f"after {MAX_API_ATTEMPTS} attempts")
+
+    def fetch_url(self, url):
+        """ Scrapes the article at a given url, which is used as the 
+            article's title.
+            Args:
+                url (string) : the url of the article
+        """
+        if not self.scrape_article_website([{"url" : url, "title" : url}]):
+            raise RuntimeError(f"Could not fetch an article from {url}")
     
     def get_category(self):
         """ Returns user-chosen news category.
@@ -172,4 +231,6 @@ class NewsGetter():
         """ Returns article that was chosen.
         """
         return self.article
-    
\ No newline at end of file
+
+
+REGISTRY.register("article_fetcher", load_article_fetcher)
@@ -2,6 +2,11 @@ from sentiment_analysis import SentimentAnalysis
 from keyword_extraction import KeywordExtractor
 from news_api import NewsGetter
 from word2vec import MyWord2Vec
+from keyword_similarity import KeywordSimilarity
+from nlp_resources import REGISTRY
+import article_cache # Registers the shared article analysis cache
+from tracing import TRACER, traced
+import hashlib
 
 class Article():
     """ Contains functions to interact with the news article that is retrieved
@@ -14,8 +19,17 @@ class Article():
     sentiments : dictionary
         Contains the polarity and subjectivity retrieved from the sentiment
         analysis.
-    keyword_extractor : KeyWordExtractor
-        Class that is used to determine most important words in the article.
+    pos_dics : dictionary
+        Maps entities/parts of speech to Counters of the article's keywords.
+    content_hash : string
+        Hash of the article's text, computed when first requested.
+    word_vectors : VectorOverlay
+        The article's trained word vectors on top of the base Word2Vec model.
+    keyword_similarity : KeywordSimilarity
+        Precomputed keyword embeddings for finding similar keywords.
+    keyword_timings : dictionary
+        How long the steps of the keyword extraction took (empty if the
+        analysis was loaded from the article cache).
 
     Methods
     -------
@@ -23,37 +37,86 @@ class Article():
         Calls other classes to perform analyses on the article's text.
     get_pos_dicts():
         Maps part of speech to their corresponding counter of word freq.
+    get_word_vectors():
+        Returns the article's word vectors.
+    get_keyword_similarity():
+        Returns the precomputed keyword similarity structures.
+    get_keyword_timings():
+        Returns how long the steps of the keyword extraction took.
     get_sentiment_score():
         Returns score corresponding to sentiment of article.
     get_title():
         Returns the article's title
     get_description():
         Returns the article's description
+    get_content_hash():
+        Returns a hash of the article's text
     get_text():
         Returns a formatted version of the article's text
     """
-    def __init__(self):
+    def __init__(self, category=None, url=None, article=None):
         """ Gets a news article from NewsAPI and calls for the text to be 
-            preprocessed.
+            preprocessed. The article can instead be scraped from a given
+            url, or given directly as a dictionary with a title, text, and
+            description.
         """
-        news_getter = NewsGetter()
-        self.article = news_getter.get_article()
+        if article is None:
+            with TRACER.span("article.fetch"):
+                news_getter = NewsGetter(category, url)
+                article = news_getter.get_article()
+        self.article = article
+        self.content_hash = None
+        self.keyword_timings = {}
         self.preprocess_text()
     
+    @traced("article.preprocess")
     def preprocess_text(self):
         """ Performs sentiment analysis on the text, extracts keywords from
             the text, and then adds the keywords it extracts to the text corpus
-            stored in Word2Vec.
+            stored in an overlay on the Word2Vec model. The results are saved
+            in the article cache, so if the article was analyzed before, they
+            are loaded from it instead. Finally, precomputes the keyword
+            embeddings used to find keywords similar to the words of a poem.
+            Each step is recorded as a span of the shared tracer, and the
+            timings of the keyword extraction are kept and recorded as 
+            counters.
         """
-        sentiment_analyzer = SentimentAnalysis(self.article['text'])
-        self.sentiments = sentiment_analyzer.get_sentiment_results()
-
-        self.keyword_extractor = KeywordExtractor(self.article['text'])
-        self.keyword_extractor.process_text()
-
+        cache = REGISTRY.get("article_cache")
+        analysis = cache.get(self.get_content_hash())
         word2vec = MyWord2Vec()
-        word2vec.add_vocab(self.article['text'])
+        TRACER.count("article_cache.misses" if analysis is None 
+                     else "article_cache.hits")
+        if analysis is None:
+            with TRACER.span("article.sentiment"):
+                sentiment_analyzer = SentimentAnalysis(self.article['text'])
+            with TRACER.span("article.keywords"):
+                keyword_extractor = KeywordExtractor(self.article['text'])
+                keyword_extractor.process_text()
+            self.keyword_timings = keyword_extractor.get_timings()
+            for name, value in self.keyword_timings.items():
+                TRACER.count(f"article.keywords.{name}", value)
+            with TRACER.span("article.word2vec"):
+                self.word_vectors = word2vec.add_vocab(self.article['text'])
+
+            analysis = {"sentiments" : 
+                                sentiment_analyzer.get_sentiment_results(),
+                        "pos_dics" : 
+                            {"entities" : keyword_extractor.get_entities(),
+                             "nouns" : keyword_extractor.get_nouns(),
+                             "adjectives" : keyword_extractor.get_adjectives(),
+                             "verbs" : keyword_extractor.get_verbs()},
+                        "words" : self.word_vectors.words, 
+                        "vectors" : self.word_vectors.vectors}
+            cache.put(self.get_content_hash(), analysis)
+        else:
+            self.word_vectors = word2vec.load_overlay(analysis["words"], 
+                                                      analysis["vectors"])
 
+        self.sentiments = analysis["sentiments"]
+        self.pos_dics = analysis["pos_dics"]
+        with TRACER.span("article.keyword_similarity"):
+            self.keyword_similarity = KeywordSimilarity(self.word_vectors, 
+                                                        self.get_pos_dics())
     
     def get_pos_dics(self):
         """ Returns a dictionary mapping entities/parts of speech to the
@@ -61,11 +124,25 @@ class Article():
             Returns:
                 The part of speech dictionaries
         """
-        return {"entities" : self.keyword_extractor.get_entities(),
-                "nouns" : self.keyword_extractor.get_nouns(),
-                "adjectives" : self.keyword_extractor.get_adjectives(),
-                "verbs" : self.keyword_extractor.get_verbs()}
+        return self.pos_dics
     
+    def get_word_vectors(self):
+        """ Returns the article's word vectors.
+        """
+        return self.word_vectors
+
+    def get_keyword_similarity(self):
+        """ Returns the article's precomputed keyword similarity structures.
+        """
+        return self.keyword_similarity
+
+    def get_keyword_timings(self):
+        """ Returns how long training the article model and finding synonyms
+            took, with the article vocabulary size and number of keywords.
+            Empty if the article's analysis was loaded from the cache.
+        """
+        return self.keyword_timings
+
     def get_sentiment_score(self):
         """ Returns the polartiy of the sentiment analysis times the
             subjectivity.
@@ -82,6 +159,15 @@ class Article():
         """
         return self.article['description']
     
+    def get_content_hash(self):
+        """ Returns a hash of the article's text, which identifies the
+            article in caches.
+        """
+        if self.content_hash is None:
+            self.content_hash = hashlib.sha256(
+                                self.article['text'].encode()).hexdigest()
+        return self.content_hash
+
     def get_text(self):
         """ Formats the text of the article.
             Returns:
@@ -0,0 +1,178 @@
+import os
+import resource
+import threading
+import time
+
+""" Paths of the models that are stored on disk in the nlp_models folder.
+"""
+BASE_WORD2VEC_PATH = "nlp_models/base_word2vec.model"
+BIGRAM_MODEL_PATH = "nlp_models/bigram_model"
+PICKLED_BIGRAM_MODEL_PATH = "nlp_models/bigram_model.pkl"
+RHYME_INDEX_PATH = "nlp_models/rhyme_index.pkl"
+POETRY_DB_PATH = "nlp_models/poetry.db"
+PARSED_LINES_PATH = "nlp_models/parsed_lines.npz"
+ARTICLE_CACHE_DIR = "nlp_models/article_cache"
+
+
+def get_rss_mb():
+    """ Returns the current resident memory of the process in megabytes. Uses
+        /proc when it is available and falls back to the peak resident memory
+        reported by getrusage otherwise.
+        Returns:
+            The resident memory of the process in megabytes.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            n_pages = int(f.read().split()[1])
+        return n_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_spacy():
+    """ Loads the small English spaCy language model.
+    """
+    import spacy
+    return spacy.load("en_core_web_sm")
+
+
+def load_grammar_tool():
+    """ Starts a LanguageTool server for checking English grammar.
+    """
+    from language_tool_python import LanguageTool
+    return LanguageTool('en-US')
+
+
+def load_base_word2vec():
+    """ Loads the Word2Vec model trained on PoetryDB, which articles' vectors
+        are layered on top of.
+    """
+    from gensim.models import Word2Vec as GensimWord2Vec
+    return GensimWord2Vec.load(BASE_WORD2VEC_PATH)
+
+
+def load_bigram_model():
+    """ Opens the memory-mapped bigram model built from the Reddit corpus.
+    """
+    from bigram_store import BigramStore
+    return BigramStore.load(BIGRAM_MODEL_PATH)
+
+
+class ResourceRegistry():
+    """ Process-wide registry of the expensive language tools used by the
+        system. Each resource is loaded lazily the first time it is requested
+        and then shared by every poem, fitness, and mutator in the process.
+
+    Attributes
+    ----------
+    loaders : dict
+        Maps resource names to the functions that load them.
+    resources : dict
+        Maps resource names to the resources that have been loaded.
+    metrics : dict
+        Maps resource names to their load count, load time, and the change in
+        resident memory caused by loading them.
+    lock : RLock
+        Ensures a resource is only loaded once when accessed from threads.
+
+    Methods
+    -------
+    register():
+        Adds a named resource and the function that loads it.
+    get():
+        Returns a resource, loading it first if needed.
+    set():
+        Replaces a loaded resource with a new one.
+    is_loaded():
+        Returns whether a resource has been loaded.
+    unload():
+        Drops a resource so it is reloaded the next time it is requested.
+    get_metrics():
+        Returns the load metrics of every resource.
+    """
+
+    def __init__(self):
+        self.loaders = {}
+        self.resources = {}
+        self.metrics = {}
+        self.lock = threading.RLock()
+
+    def register(self, name, loader):
+        """ Adds a resource that can be retrieved from the registry.
+            Args:
+                name (string) : the name of the resource
+                loader (function) : takes no arguments and returns the resource
+        """
+        with self.lock:
+            self.loaders[name] = loader
+            self.metrics.setdefault(name, {"loads" : 0, "load_seconds" : 0.0,
+                                           "rss_delta_mb" : 0.0})
+
+    def get(self, name):
+        """ Returns the resource with the given name, loading it the first
+            time it is requested and recording how long the load took and how
+            much memory it used.
+            Args:
+                name (string) : the name of the resource
+            Returns:
+                The shared resource.
+        """
+        if name in self.resources:
+            return self.resources[name]
+        with self.lock:
+            if name not in self.resources:
+                if name not in self.loaders:
+                    raise KeyError(f"No resource registered as '{name}'")
+                rss_before = get_rss_mb()
+                start = time.perf_counter()
+                self.resources[name] = self.loaders[name]()
+                metrics = self.metrics[name]
+                metrics["loads"] += 1
+                metrics["load_seconds"] += time.perf_counter() - start
+                metrics["rss_delta_mb"] += get_rss_mb() - rss_before
+        return self.resources[name]
+
+    def set(self, name, value):
+        """ Replaces a resource with a new value (e.g. after a model has been
+            retrained) without counting it as a load.
+            Args:
+                name (string) : the name of the resource
+                value (object) : the new resource
+        """
+        with self.lock:
+            self.metrics.setdefault(name, {"loads" : 0, "load_seconds" : 0.0,
+                                           "rss_delta_mb" : 0.0})
+            self.resources[name] = value
+
+    def is_loaded(self, name):
+        """ Returns whether the resource with the given name has been loaded.
+        """
+        return name in self.resources
+
+    def unload(self, name):
+        """ Drops a loaded resource so the next request reloads it.
+            Args:
+                name (string) : the name of the resource
+        """
+        with self.lock:
+            self.resources.pop(name, None)
+
+    def get_metrics(self):
+        """ Returns a copy of the load metrics of every registered resource,
+            along with the current resident memory of the process.
+            Returns:
+                Dictionary of per-resource metrics.
+        """
+        with self.lock:
+            metrics = {name : dict(vals) for name, vals in self.metrics.items()}
+        metrics["process"] = {"rss_mb" : get_rss_mb()}
+        return metrics
+
+
+""" The registry shared by everything in the process.
+"""
+REGISTRY = ResourceRegistry()
+REGISTRY.register("spacy", load_spacy)
+REGISTRY.register("grammar_tool", load_grammar_tool)
+REGISTRY.register("base_word2vec", load_base_word2vec)
+REGISTRY.register("bigram_model", load_bigram_model)
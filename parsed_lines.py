@@ -0,0 +1,155 @@
+import os
+from collections import namedtuple
+import numpy as np
+from nlp_resources import REGISTRY, PARSED_LINES_PATH
+
+""" Stand-in for a spaCy token that has the attributes used when replacing
+    keywords in the first generation of poems.
+"""
+ParsedToken = namedtuple("ParsedToken", ["text", "pos_", "ent_type_"])
+
+
+class ParsedLines():
+    """ Tokens, part of speech tags, and entity types of every inspiring set
+        line, computed with spaCy once and saved as compact arrays. Line i's
+        tokens are at positions offsets[i] to offsets[i + 1] of the token
+        arrays, and each token's text, tag, and entity type are stored as ids
+        into small vocabularies.
+
+    Attributes
+    ----------
+    lines : array
+        The text of each line, by line id.
+    line_ids : dictionary
+        Maps the text of each line to its line id.
+    offsets : array
+        Start of each line's tokens in the token arrays.
+    vocab : array
+        The distinct token texts.
+    pos_tags : array
+        The distinct part of speech tags.
+    ent_types : array
+        The distinct entity types ("" for tokens that are not entities).
+    token_ids : array
+        Id of each token's text in vocab.
+    pos_ids : array
+        Id of each token's part of speech in pos_tags.
+    ent_ids : array
+        Id of each token's entity type in ent_types.
+
+    Methods
+    -------
+    build():
+        Parses lines with spaCy.
+    load():
+        Loads saved parses.
+    save():
+        Saves the parses.
+    get_tokens():
+        Returns the parsed tokens of a line.
+    """
+
+    def __init__(self, lines, offsets, vocab, pos_tags, ent_types, token_ids,
+                 pos_ids, ent_ids):
+        self.lines = lines
+        self.line_ids = {line : i for i, line in enumerate(lines.tolist())}
+        self.offsets = offsets
+        self.vocab = vocab.tolist()
+        self.pos_tags = pos_tags.tolist()
+        self.ent_types = ent_types.tolist()
+        self.token_ids = token_ids
+        self.pos_ids = pos_ids
+        self.ent_ids = ent_ids
+
+    @classmethod
+    def build(cls, lines, nlp):
+        """ Tokenizes, tags, and finds the entities of every distinct line in
+            one batched pass of spaCy.
+            Args:
+                lines (list) : the lines to parse
+                nlp (spacy) : spaCy language model
+            Returns:
+                The ParsedLines of the lines.
+        """
+        lines = list(dict.fromkeys(lines))
+        vocabs = [{}, {}, {"" : 0}]
+        columns = [[], [], []]
+        offsets = [0]
+        for doc in nlp.pipe(lines, batch_size=1000):
+            for token in doc:
+                for vocab, column, val in zip(vocabs, columns, 
+                                    [token.text, token.pos_, token.ent_type_]):
+                    column.append(vocab.setdefault(val, len(vocab)))
+            offsets.append(offsets[-1] + len(doc))
+
+        return cls(np.array(lines, dtype=str), 
+                   np.array(offsets, dtype=np.int64),
+                   *[np.array(list(vocab), dtype=str) for vocab in vocabs],
+                   np.array(columns[0], dtype=np.int32),
+                   np.array(columns[1], dtype=np.int8),
+                   np.array(columns[2], dtype=np.int8))
+
+    @classmethod
+    def load(cls, path):
+        """ Loads parses that were saved to a file.
+            Args:
+                path (string) : the file the parses were saved to
+            Returns:
+                The loaded ParsedLines.
+        """
+        with np.load(path) as arrays:
+            return cls(arrays["lines"], arrays["offsets"], arrays["vocab"],
+                       arrays["pos_tags"], arrays["ent_types"], 
+                       arrays["token_ids"], arrays["pos_ids"], 
+                       arrays["ent_ids"])
+
+    def save(self, path):
+        """ Saves the parses to a file.
+            Args:
+                path (string) : the file to save the parses to
+        """
+        np.savez(path, lines=self.lines, offsets=self.offsets, 
+                 vocab=np.array(self.vocab, dtype=str), 
+                 pos_tags=np.array(self.pos_tags, dtype=str), 
+                 ent_types=np.array(self.ent_types, dtype=str), 
+                 token_ids=self.token_ids, pos_ids=self.pos_ids, 
+                 ent_ids=self.ent_ids)
+
+    def get_tokens(self, line):
+        """ Returns the parsed tokens of a line.
+            Args:
+                line (string) : the text of the line
+            Returns:
+                List of ParsedTokens, or None if the line was not parsed.
+        """
+        line_id = self.line_ids.get(line)
+        if line_id is None:
+            return None
+        start, end = self.offsets[line_id], self.offsets[line_id + 1]
+        return [ParsedToken(self.vocab[text], self.pos_tags[pos], 
+                            self.ent_types[ent])
+                for text, pos, ent in zip(self.token_ids[start:end].tolist(),
+                                          self.pos_ids[start:end].tolist(),
+                                          self.ent_ids[start:end].tolist())]
+
+    def __len__(self):
+        """ Returns the number of parsed lines.
+        """
+        return len(self.lines)
+
+
+def load_parsed_lines():
+    """ Loads the saved parses of the inspiring set lines, parsing every line
+        of the inspiring set's sonnets and saving them first if they do not
+        exist yet.
+    """
+    if os.path.exists(PARSED_LINES_PATH):
+        return ParsedLines.load(PARSED_LINES_PATH)
+    from get_inspiring_poems import PoetryDB
+    lines = [line for poem in PoetryDB().sonnets for line in poem]
+    parsed_lines = ParsedLines.build(lines, REGISTRY.get("spacy"))
+    parsed_lines.save(PARSED_LINES_PATH)
+    return parsed_lines
+
+
+REGISTRY.register("parsed_lines", load_parsed_lines)
@@ -1,6 +1,7 @@
 from get_inspiring_poems import PoetryDB
 from fitness import Fitness
 from mutations import Mutator
+from tracing import traced
 import string
 
 class Sonnet():
@@ -51,6 +52,7 @@ class Sonnet():
         self.fitness = Fitness(text, ref_article, rhyme_scheme)
         self.mutator = Mutator(text, ref_article, rhyme_scheme)
     
+    @traced("sonnet.inspiring_lines")
     def fill_w_rand_inspiring_set_lines(self):
         """ Generates a poem where each of the 14 lines contain random lines
             from the poetry dataset. 
@@ -60,6 +62,7 @@ class Sonnet():
             line = inspiring_set.get_poetry_line(i)
             self.sonnet.append(line)
 
+    @traced("sonnet.generate")
     def generate_sonnet(self):
         """ Generates a first generation Sonnet by populating random lines
             from the poetry database, swapping key words in the poem with
@@ -70,6 +73,7 @@ class Sonnet():
         self.mutator.replace_keywords()
         self.sonnet = self.mutator.get_sonnet()
 
+    @traced("sonnet.mutate")
     def mutate(self):
         """ Calls to mutate the poem. Then, saves the new poetry text.
         """
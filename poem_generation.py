@@ -0,0 +1,112 @@
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from nlp_resources import REGISTRY
+from evaluation import ArticleData
+from get_inspiring_poems import PoetryDB
+from mutations import Mutator
+import parsed_lines # Registers the parsed inspiring set lines
+import rhyme_index # Registers the shared rhyme index
+from tracing import TRACER
+
+""" Resources every generation worker loads when it starts.
+"""
+WORKER_RESOURCES = ["base_word2vec", "rhyme_index", "parsed_lines", 
+                    "poetry_store"]
+
+""" State of a generation worker process, set once when it starts.
+"""
+WORKER_STATE = {}
+
+
+def seed_rng(seed_sequence):
+    """ Seeds the random and numpy random number generators from a seed 
+        sequence, so the work done afterwards is reproducible.
+        Args:
+            seed_sequence (SeedSequence) : the seed of the random stream
+    """
+    np.random.seed(seed_sequence.generate_state(4))
+    random.seed(int(seed_sequence.generate_state(1, np.uint64)[0]))
+
+
+def init_worker(article_data, rhyme_scheme):
+    """ Loads the models used to build poems in a worker process, along with
+        the article's keyword embeddings, so each worker pays for them once.
+        Workers are not traced.
+        Args:
+            article_data (ArticleData) : the reference article's data
+            rhyme_scheme (list) : the rhyme scheme of the poems
+    """
+    TRACER.disable()
+    for name in WORKER_RESOURCES:
+        REGISTRY.get(name)
+    article_data.get_keyword_similarity()
+    WORKER_STATE["article_data"] = article_data
+    WORKER_STATE["rhyme_scheme"] = rhyme_scheme
+
+
+def build_poem_lines(seed_sequence):
+    """ Builds the lines of a first generation poem in a worker process the
+        same way Sonnet.generate_sonnet does, using its own random stream.
+        Args:
+            seed_sequence (SeedSequence) : the seed of the poem's random stream
+        Returns:
+            The lines of the poem.
+    """
+    seed_rng(seed_sequence)
+    inspiring_set = PoetryDB()
+    lines = [inspiring_set.get_poetry_line(i) for i in range(14)]
+    mutator = Mutator(lines, WORKER_STATE["article_data"], 
+                      WORKER_STATE["rhyme_scheme"])
+    mutator.replace_keywords()
+    return mutator.get_sonnet()
+
+
+class ParallelGenerator():
+    """ Builds first generation poems across a pool of worker processes. The
+        article's keyword data is sent to each worker once when it starts,
+        and each poem is built with its own random stream, so the poems do
+        not depend on which worker builds them.
+
+    Attributes
+    ----------
+    workers : int
+        The number of worker processes.
+    pool : ProcessPoolExecutor
+        The pool of worker processes.
+
+    Methods
+    -------
+    generate():
+        Builds poems and yields them as they finish.
+    close():
+        Shuts the worker processes down.
+    """
+
+    def __init__(self, article, rhyme_scheme, workers):
+        self.workers = workers
+        # Read the inspiring set before the workers are started so they 
+        # inherit it instead of each querying the corpus
+        PoetryDB()
+        self.pool = ProcessPoolExecutor(max_workers=workers, 
+                        initializer=init_worker,
+                        initargs=(ArticleData.from_article(article), 
+                                  rhyme_scheme))
+
+    def generate(self, seed_sequences):
+        """ Builds one poem per seed sequence and yields each poem as soon as
+            it is finished.
+            Args:
+                seed_sequences (list) : the seeds of each poem's random stream
+            Yields:
+                The index of the poem's seed sequence and the poem's lines.
+        """
+        futures = {self.pool.submit(build_poem_lines, seed_sequence) : i
+                   for i, seed_sequence in enumerate(seed_sequences)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+    def close(self):
+        """ Shuts the worker processes down.
+        """
+        self.pool.shutdown()
@@ -0,0 +1,316 @@
+import json
+import os
+import sqlite3
+import sys
+import numpy as np
+import requests
+from nlp_resources import REGISTRY, POETRY_DB_PATH
+
+""" PoetryDB endpoint that returns every poem in the database.
+"""
+ALL_POEMS_URL = "https://poetrydb.org/lines/all"
+
+""" Seconds the download of the PoetryDB corpus may take before it is
+    abandoned. The whole corpus is sent in one response, so this is generous.
+"""
+POETRY_DB_TIMEOUT = 120
+
+""" Seconds a connection waits for another process that is writing to the
+    database, such as one filling it, before giving up.
+"""
+POETRY_DB_LOCK_TIMEOUT = 60
+
+""" Number of lines of the poems the system takes its starting lines from.
+"""
+SONNET_LINECOUNT = 14
+
+
+def fetch_poems(url=ALL_POEMS_URL):
+    """ Downloads poems from PoetryDB. A RuntimeError is raised if the
+        request fails or times out.
+        Args:
+            url (string) : the PoetryDB endpoint to download poems from
+        Returns:
+            List of poems, each a dictionary with a title, author, and lines.
+    """
+    try:
+        response = requests.get(url, timeout=POETRY_DB_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+    except (requests.RequestException, ValueError) as error:
+        raise RuntimeError(f"Could not download poems from {url}: " +
+                           f"{error}") from error
+
+
+def read_poems(path):
+    """ Reads the poems of a JSON dump of PoetryDB, a list of poems in the
+        format the API returns.
+        Args:
+            path (string) : the JSON file
+        Returns:
+            List of poems, each a dictionary with a title, author, and lines.
+    """
+    with open(path) as file:
+        return json.load(file)
+
+
+class PoetryStore():
+    """ Local SQLite copy of the PoetryDB corpus. It is filled once, either
+        from the API or from a JSON dump of it, and indexed by line count,
+        author, and line position. Query results are kept in memory, so after
+        the first query picking a random line does not touch the database.
+
+    Attributes
+    ----------
+    path : string
+        The file the database is stored in.
+    connection : Connection
+        The connection to the database.
+    pid : int
+        The process the connection was opened in.
+    poems : dictionary
+        Memoized lists of poem lines, keyed by the query that found them.
+
+    Methods
+    -------
+    connect():
+        Opens a connection to the database in the current process.
+    get_connection():
+        Returns the connection of the current process.
+    create_tables():
+        Creates the tables and indexes if they do not exist.
+    is_empty():
+        Returns whether the store has no poems.
+    insert_poems():
+        Inserts poems in the current transaction.
+    add_poems():
+        Adds poems to the store.
+    fill_if_empty():
+        Adds poems to the store only if it has none.
+    fill_from_api():
+        Adds every poem in PoetryDB to the store.
+    fill_from_json():
+        Adds every poem in a JSON dump of PoetryDB to the store.
+    get_poems():
+        Returns the lines of every poem that meets the given conditions.
+    get_lines():
+        Returns every line at a given position of poems of a given length.
+    get_random_line():
+        Returns the line at a given position of a random poem.
+    """
+
+    def __init__(self, path=POETRY_DB_PATH):
+        self.path = path
+        self.connect()
+        self.poems = {}
+        self.create_tables()
+
+    def connect(self):
+        """ Opens a connection to the database in the current process.
+        """
+        self.connection = sqlite3.connect(self.path, check_same_thread=False,
+                                          timeout=POETRY_DB_LOCK_TIMEOUT)
+        self.pid = os.getpid()
+
+    def get_connection(self):
+        """ Returns the connection to the database, opening a new one first
+            if the store was created in a process this one was forked from.
+            SQLite connections must not be carried across a fork, so each
+            process uses its own.
+        """
+        if self.pid != os.getpid():
+            self.connect()
+        return self.connection
+
+    def create_tables(self):
+        """ Creates a table of poems and a table of their lines, along with
+            the indexes used to look them up, if they do not exist yet.
+        """
+        connection = self.get_connection()
+        with connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS poems (
+                    id INTEGER PRIMARY KEY,
+                    title TEXT,
+                    author TEXT,
+                    linecount INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS lines (
+                    poem_id INTEGER REFERENCES poems(id),
+                    position INTEGER,
+                    text TEXT,
+                    PRIMARY KEY (poem_id, position)
+                );
+                CREATE INDEX IF NOT EXISTS poems_linecount 
+                    ON poems(linecount);
+                CREATE INDEX IF NOT EXISTS poems_author ON poems(author);
+                CREATE INDEX IF NOT EXISTS lines_position 
+                    ON lines(position);
+            """)
+
+    def is_empty(self):
+        """ Returns whether no poems have been added to the store.
+        """
+        cursor = self.get_connection().execute("SELECT 1 FROM poems LIMIT 1")
+        return cursor.fetchone() is None
+
+    def insert_poems(self, poems):
+        """ Inserts poems in the current transaction. The line count of each
+            poem is the number of lines it actually has.
+            Args:
+                poems (list) : dictionaries with a title, author, and lines
+        """
+        connection = self.get_connection()
+        for poem in poems:
+            cursor = connection.execute(
+                "INSERT INTO poems (title, author, linecount) " +
+                "VALUES (?, ?, ?)", 
+                (poem['title'], poem['author'], len(poem['lines'])))
+            connection.executemany(
+                "INSERT INTO lines (poem_id, position, text) " +
+                "VALUES (?, ?, ?)",
+                [(cursor.lastrowid, i, line) 
+                 for i, line in enumerate(poem['lines'])])
+
+    def add_poems(self, poems):
+        """ Adds poems to the store in one transaction.
+            Args:
+                poems (list) : dictionaries with a title, author, and lines
+        """
+        with self.get_connection():
+            self.insert_poems(poems)
+        self.poems = {}
+
+    def fill_if_empty(self, get_poems=fetch_poems):
+        """ Adds poems to the store if it has none. The poems are fetched 
+            before the database is locked, then the store is checked again
+            and filled in one transaction that holds the write lock, so
+            processes that open an empty store at the same time add the
+            poems only once.
+            Args:
+                get_poems (function) : returns the poems to add
+            Returns:
+                Whether the poems were added.
+        """
+        if not self.is_empty():
+            return False
+        poems = get_poems()
+        connection = self.get_connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            if not self.is_empty(): # Another process filled it first
+                return False
+            self.insert_poems(poems)
+        self.poems = {}
+        return True
+
+    def fill_from_api(self):
+        """ Downloads every poem in PoetryDB and adds it to the store.
+        """
+        self.add_poems(fetch_poems())
+
+    def fill_from_json(self, path):
+        """ Adds every poem in a JSON dump of PoetryDB (a list of poems in the
+            format the API returns) to the store.
+            Args:
+                path (string) : the JSON file
+        """
+        self.add_poems(read_poems(path))
+
+    def get_poems(self, linecount=None, author=None, excluded_authors=()):
+        """ Returns the lines of every poem that meets the given conditions,
+            in the order they were added. Results are memoized.
+            Args:
+                linecount (int) : the number of lines the poems must have
+                author (string) : the author who must have written the poems
+                excluded_authors (list) : authors whose poems are left out
+            Returns:
+                List of poems, each a list of lines.
+        """
+        key = (linecount, author, tuple(excluded_authors))
+        if key not in self.poems:
+            conditions, params = [], []
+            if linecount is not None:
+                conditions.append("poems.linecount = ?")
+                params.append(linecount)
+            if author is not None:
+                conditions.append("poems.author = ?")
+                params.append(author)
+            if excluded_authors:
+                conditions.append("poems.author NOT IN (" + 
+                                  ", ".join("?" * len(excluded_authors)) + ")")
+                params.extend(excluded_authors)
+            where = " WHERE " + " AND ".join(conditions) if conditions else ""
+            rows = self.get_connection().execute(
+                "SELECT lines.poem_id, lines.text FROM poems " +
+                "JOIN lines ON lines.poem_id = poems.id" + where +
+                " ORDER BY lines.poem_id, lines.position", params)
+
+            poems, curr_id = [], None
+            for poem_id, text in rows:
+                if poem_id != curr_id:
+                    poems.append([])
+                    curr_id = poem_id
+                poems[-1].append(text)
+            self.poems[key] = poems
+        return self.poems[key]
+
+    def get_lines(self, position, linecount, excluded_authors=()):
+        """ Returns the line at a given position of every poem with a given
+            number of lines.
+            Args:
+                position (int) : the index of the lines
+                linecount (int) : the number of lines the poems must have
+                excluded_authors (list) : authors whose poems are left out
+            Returns:
+                List of lines.
+        """
+        return [poem[position] for poem in 
+                self.get_poems(linecount, excluded_authors=excluded_authors)]
+
+    def get_random_line(self, position, linecount, excluded_authors=()):
+        """ Chooses a random poem with a given number of lines and returns its
+            line at the given position.
+            Args:
+                position (int) : the index of the line
+                linecount (int) : the number of lines the poem must have
+                excluded_authors (list) : authors whose poems are left out
+            Returns:
+                The line of a random poem at the given position.
+        """
+        poems = self.get_poems(linecount, excluded_authors=excluded_authors)
+        if not poems:
+            raise ValueError(f"{self.path} has no {linecount}-line poems " +
+                             "to choose a line from")
+        return poems[np.random.randint(len(poems))][position]
+
+
+def load_poetry_store():
+    """ Opens the local poetry corpus, downloading it from PoetryDB first if
+        it has not been filled yet. A RuntimeError is raised if it has no
+        sonnets to start poems from.
+    """
+    os.makedirs(os.path.dirname(POETRY_DB_PATH), exist_ok=True)
+    poetry_store = PoetryStore(POETRY_DB_PATH)
+    poetry_store.fill_if_empty()
+    if not poetry_store.get_poems(linecount=SONNET_LINECOUNT):
+        raise RuntimeError(f"{POETRY_DB_PATH} has no {SONNET_LINECOUNT}-line " +
+                           "poems. Delete it to download PoetryDB again, or " +
+                           "fill it from a JSON dump with " +
+                           "'python poetry_store.py <dump.json>'")
+    return poetry_store
+
+
+REGISTRY.register("poetry_store", load_poetry_store)
+
+
+if __name__ == "__main__":
+    # Fills the local corpus from a JSON dump if one is given, and from the
+    # PoetryDB API otherwise.
+    store = PoetryStore(POETRY_DB_PATH)
+    if len(sys.argv) > 1:
+        filled = store.fill_if_empty(lambda: read_poems(sys.argv[1]))
+    else:
+        filled = store.fill_if_empty()
+    if not filled:
+        print(f"{POETRY_DB_PATH} is already filled")
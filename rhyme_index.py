@@ -0,0 +1,232 @@
+import os
+import pickle
+from collections import defaultdict
+import numpy as np
+import pronouncing
+from nlp_resources import REGISTRY, RHYME_INDEX_PATH
+
+""" Parts of speech that rhyming words are grouped by. Words with any other
+    part of speech are grouped under OTHER_POS.
+"""
+RHYME_POS_TAGS = ["NOUN", "ADJ", "VERB"]
+OTHER_POS = "OTHER"
+
+""" Number of random picks tried before falling back to filtering every
+    candidate rhyme for subwords.
+"""
+MAX_RHYME_PICKS = 8
+
+
+class RhymeIndex():
+    """ Index of the CMU pronouncing dictionary that is built once and saved.
+        Maps each rhyming part (the sounds from a word's last stressed vowel
+        on) to the words that end with it, grouped by each word's dominant
+        part of speech, so finding a rhyme of a given part of speech is a
+        dictionary lookup and a random pick.
+
+    Attributes
+    ----------
+    rhymes : dictionary
+        Maps rhyming parts to dictionaries of part of speech groups to words.
+    word_parts : dictionary
+        Maps words to the rhyming parts of each of their pronunciations.
+    word_pos : dictionary
+        Maps words to their dominant part of speech.
+    rhyme_keys : dictionary
+        Memoized sets of rhyming parts of words that have been looked up.
+
+    Methods
+    -------
+    build():
+        Creates the index from the CMU dictionary.
+    load():
+        Loads a saved index.
+    save():
+        Saves the index.
+    get_pos():
+        Returns the dominant part of speech of a word.
+    get_rhyme_keys():
+        Returns the set of rhyming parts of a word.
+    rhymes_with():
+        Returns whether two different words rhyme.
+    is_distinct():
+        Returns whether a rhyme is not a subword of the original word.
+    pick():
+        Picks a random word that is not a subword of the original word.
+    generate_rhyme():
+        Returns a random rhyme of a word with a desired part of speech.
+    """
+
+    def __init__(self, rhymes, word_parts, word_pos):
+        self.rhymes = rhymes
+        self.word_parts = word_parts
+        self.word_pos = word_pos
+        self.rhyme_keys = {}
+
+    @classmethod
+    def build(cls, nlp):
+        """ Builds the index by computing the rhyming part of every
+            pronunciation in the CMU dictionary and tagging every word with
+            spaCy once.
+            Args:
+                nlp (spacy) : spaCy language model used for tagging
+            Returns:
+                The built RhymeIndex.
+        """
+        pronouncing.init_cmu()
+        word_parts = defaultdict(set)
+        for word, phones in pronouncing.pronunciations:
+            rhyming_part = pronouncing.rhyming_part(phones)
+            if rhyming_part is not None:
+                word_parts[word].add(rhyming_part)
+
+        words = sorted(word_parts.keys())
+        word_pos = {}
+        for word, doc in zip(words, nlp.pipe(words, batch_size=1000)):
+            word_pos[word] = doc[0].pos_ if len(doc) else OTHER_POS
+
+        rhymes = defaultdict(lambda: defaultdict(list))
+        for word in words:
+            pos = word_pos[word] if word_pos[word] in RHYME_POS_TAGS \
+                                                            else OTHER_POS
+            for rhyming_part in word_parts[word]:
+                rhymes[rhyming_part][pos].append(word)
+
+        rhymes = {part : dict(groups) for part, groups in rhymes.items()}
+        word_parts = {word : tuple(sorted(parts))
+                      for word, parts in word_parts.items()}
+        return cls(rhymes, word_parts, word_pos)
+
+    @classmethod
+    def load(cls, path):
+        """ Loads an index that was saved to a file.
+            Args:
+                path (string) : the file the index was saved to
+            Returns:
+                The loaded RhymeIndex.
+        """
+        with open(path, 'rb') as file:
+            return cls(*pickle.load(file))
+
+    def save(self, path):
+        """ Saves the index to a file.
+            Args:
+                path (string) : the file to save the index to
+        """
+        with open(path, 'wb') as file:
+            pickle.dump((self.rhymes, self.word_parts, self.word_pos), file)
+
+    def get_pos(self, word):
+        """ Returns the dominant part of speech of a word, or None if the word
+            is not in the CMU dictionary.
+        """
+        return self.word_pos.get(word.lower())
+
+    def get_rhyme_keys(self, word):
+        """ Returns the rhyming parts of every pronunciation of a word, which
+            act as the word's rhyme classes. Results are memoized.
+            Args:
+                word (string) : the word to look up
+            Returns:
+                Frozen set of rhyming parts (empty if the word is unknown).
+        """
+        keys = self.rhyme_keys.get(word)
+        if keys is None:
+            keys = frozenset(self.word_parts.get(word.lower(), ()))
+            self.rhyme_keys[word] = keys
+        return keys
+
+    def rhymes_with(self, word1, word2):
+        """ Returns whether two different words rhyme, which is the case 
+            when they share a rhyme class. Unlike searching for one word in
+            the joined rhymes of the other, this has no false positives from
+            one word appearing inside another (e.g. "at" in "cat").
+            Args:
+                word1 (string) : the first word
+                word2 (string) : the second word
+            Returns:
+                Whether the words rhyme.
+        """
+        if word1.lower() == word2.lower():
+            return False
+        return not self.get_rhyme_keys(word1).isdisjoint(
+                                                self.get_rhyme_keys(word2))
+
+    def is_distinct(self, original_word, rhyme):
+        """ Returns whether a potential rhyme neither contains nor is
+            contained in the original word. This is motivated by getting a
+            more diverse set of rhymes.
+            Args:
+                original_word (string) : the word to be rhymed with
+                rhyme (string) : the potential rhyme
+            Returns:
+                Whether the rhyme is not a subword of the original word.
+        """
+        return original_word not in rhyme and rhyme not in original_word
+
+    def pick(self, original_word, groups):
+        """ Picks a random word, other than a subword of the original word,
+            from lists of candidate words. A few random picks are tried first,
+            and only if all of them are subwords are the lists filtered.
+            Args:
+                original_word (string) : the word to be rhymed with
+                groups (list) : lists of candidate words
+            Returns:
+                The chosen word, or None if every candidate is a subword.
+        """
+        sizes = np.array([len(group) for group in groups])
+        total = sizes.sum()
+        if total == 0:
+            return None
+        ends = np.cumsum(sizes)
+        for idx in np.random.randint(total, size=MAX_RHYME_PICKS):
+            group = np.searchsorted(ends, idx, side='right')
+            word = groups[group][idx - (ends[group] - sizes[group])]
+            if self.is_distinct(original_word, word):
+                return word
+
+        options = [word for group in groups for word in group
+                   if self.is_distinct(original_word, word)]
+        if not options:
+            return None
+        return options[np.random.randint(len(options))]
+
+    def generate_rhyme(self, pos, to_rhyme):
+        """ Returns a rhyme of a word that is of a specified part of speech.
+            If there are no rhymes of that part of speech, returns a random
+            rhyming word. If there are no rhyming words, returns the word to
+            rhyme with. Rhymes that are subwords of the word are excluded.
+            Args:
+                pos (string) : the desired part of speech of the new rhyme
+                to_rhyme (string) : the word to rhyme with
+            Returns:
+                The rhyming word
+        """
+        word = to_rhyme.lower()
+        pos = pos if pos in RHYME_POS_TAGS else OTHER_POS
+        rhyme_groups = [self.rhymes.get(part, {})
+                        for part in self.word_parts.get(word, ())]
+
+        # Optimally, return rhyme of the desired pos
+        rhyme = self.pick(word, [groups.get(pos, [])
+                                 for groups in rhyme_groups])
+        if rhyme is None: # Return random rhyme if none of the correct pos
+            rhyme = self.pick(word, [group for groups in rhyme_groups
+                                     for group in groups.values()])
+        if rhyme is None: # Return original word if no rhymes
+            return to_rhyme
+        return rhyme
+
+
+def load_rhyme_index():
+    """ Loads the saved rhyme index, building and saving it first if it does
+        not exist yet.
+    """
+    if os.path.exists(RHYME_INDEX_PATH):
+        return RhymeIndex.load(RHYME_INDEX_PATH)
+    rhyme_index = RhymeIndex.build(REGISTRY.get("spacy"))
+    rhyme_index.save(RHYME_INDEX_PATH)
+    return rhyme_index
+
+
+REGISTRY.register("rhyme_index", load_rhyme_index)
@@ -0,0 +1,289 @@
+import argparse
+import contextlib
+import itertools
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import resource
+import tempfile
+import time
+import traceback
+from datetime import datetime
+import numpy as np
+from nlp_resources import REGISTRY, get_rss_mb
+from fitness import FITNESS_CACHE
+from high_level_system import GeneratorSystem
+from article_cache import ArticleCache
+from benchmark_fixtures import setup_fixtures
+from micro_benchmarks import get_commit, RESULTS_DIR
+import rhyme_index # Registers the shared rhyme index
+
+""" Phases of a run that are timed separately, in the order they run.
+"""
+PHASES = ["article", "initial_population", "genetic_algo", "write"]
+
+""" Population sizes, genetic algorithm iterations, and worker counts that
+    are swept when none are given.
+"""
+DEFAULT_N_POEMS = [4, 8, 16, 32]
+DEFAULT_N_ITERATIONS = [1, 2, 4, 8]
+DEFAULT_WORKERS = [1]
+
+
+def get_peak_rss_mb(who=resource.RUSAGE_SELF):
+    """ Returns the peak resident memory of this process (or of the largest
+        of its finished child processes) in megabytes.
+    """
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def get_children_cpu_seconds():
+    """ Returns the CPU time used by the finished child processes.
+    """
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_point(article, n_poems, n_iterations, workers, seed, work_dir):
+    """ Runs the whole system once on the fixture article and measures it.
+        Meant to be run in a fresh process, so the caches start empty and the
+        peak memory belongs to this run alone. The fitness cache is made large
+        enough to hold every poem of the run, so its size at the end is the
+        number of fitness evaluations.
+        Args:
+            article (dictionary) : the fixture article
+            n_poems (int) : the number of poems in each generation
+            n_iterations (int) : the number of genetic algorithm iterations
+            workers (int) : the number of processes used for the poems
+            seed (int) : the seed of the run
+            work_dir (string) : folder the run's article cache and poem are
+                written to
+        Returns:
+            Dictionary of the run's measurements.
+    """
+    FITNESS_CACHE.clear()
+    FITNESS_CACHE.maxsize = max(FITNESS_CACHE.maxsize,
+                                n_poems * (n_iterations + 1))
+    REGISTRY.set("article_cache",
+                 ArticleCache(os.path.join(work_dir, "article_cache")))
+
+    start_rss = get_rss_mb()
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    phases, iterations = {}, []
+    generator = GeneratorSystem(n_poems, workers=workers, seed=seed)
+    try:
+        phase_start = time.perf_counter()
+        generator.fetch_reference_article(article=article)
+        phases["article"] = time.perf_counter() - phase_start
+
+        phase_start = time.perf_counter()
+        generator.generate_original_poems()
+        phases["initial_population"] = time.perf_counter() - phase_start
+
+        phase_start = time.perf_counter()
+        for _ in range(n_iterations):
+            iteration_start = time.perf_counter()
+            generator.genetic_algo()
+            iterations.append(time.perf_counter() - iteration_start)
+        phases["genetic_algo"] = time.perf_counter() - phase_start
+        best_fitness = max(poem.get_fitness() for poem in generator.poems)
+
+        phase_start = time.perf_counter()
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            generator.write_poems_to_files()
+        finally:
+            os.chdir(cwd)
+        phases["write"] = time.perf_counter() - phase_start
+    finally:
+        generator.close()
+
+    wall_seconds = time.perf_counter() - start_wall
+    cpu_seconds = time.process_time() - start_cpu + get_children_cpu_seconds()
+    n_evaluations = len(FITNESS_CACHE)
+    return {"n_poems" : n_poems, "n_iterations" : n_iterations,
+            "workers" : workers, "seed" : seed,
+            "wall_seconds" : wall_seconds, "cpu_seconds" : cpu_seconds,
+            "start_rss_mb" : start_rss, "peak_rss_mb" : get_peak_rss_mb(),
+            "peak_worker_rss_mb" :
+                        get_peak_rss_mb(resource.RUSAGE_CHILDREN),
+            "fitness_evaluations" : n_evaluations,
+            "evaluations_per_second" : n_evaluations / phases["genetic_algo"]
+                            if phases["genetic_algo"] > 0 else 0.0,
+            "best_fitness" : float(best_fitness),
+            "phases" : phases, "iteration_seconds" : iterations}
+
+
+def run_point_in_child(queue, *args):
+    """ Runs run_point and sends back its measurements, or the error that
+        stopped it. The output of the system is discarded.
+        Args:
+            queue (Queue) : where the result is put
+            args : the arguments of run_point
+    """
+    try:
+        with open(os.devnull, "w") as devnull, \
+                                        contextlib.redirect_stdout(devnull):
+            result = run_point(*args)
+    except Exception:
+        result = {"error" : traceback.format_exc()}
+    queue.put(result)
+
+
+def fit_exponents(results, variable):
+    """ Estimates how the time of each phase grows with a variable of the
+        grid. For every group of runs that only differ in that variable, the
+        slope of log time against log variable is fit, and the slopes of the
+        groups are averaged. A slope of 1 means the phase grows linearly and
+        a slope of 2 quadratically.
+        Args:
+            results (list) : the measurements of each run
+            variable (string) : "n_poems" or "n_iterations"
+        Returns:
+            Dictionary mapping phases (and "total") to their exponents.
+    """
+    others = [name for name in ["n_poems", "n_iterations", "workers"]
+              if name != variable]
+    groups = {}
+    for result in results:
+        if "error" not in result:
+            key = tuple(result[name] for name in others)
+            groups.setdefault(key, []).append(result)
+
+    exponents = {}
+    for phase in PHASES + ["total"]:
+        slopes = []
+        for group in groups.values():
+            xs = [result[variable] for result in group]
+            ys = [result["wall_seconds"] if phase == "total"
+                  else result["phases"][phase] for result in group]
+            if len(set(xs)) > 1 and min(ys) > 0:
+                slopes.append(np.polyfit(np.log(xs), np.log(ys), 1)[0])
+        if slopes:
+            exponents[phase] = float(np.mean(slopes))
+    return exponents
+
+
+def print_results(results):
+    """ Prints a row of measurements for every run, followed by the growth
+        exponent of each phase.
+        Args:
+            results (list) : the measurements of each run
+    """
+    print(f"{'poems':>6}{'iters':>6}{'workers':>8}{'wall (s)':>10}" +
+          f"{'cpu (s)':>10}{'rss (MB)':>10}{'evals/s':>10}{'best':>10}" +
+          "".join(f"{phase:>20}" for phase in PHASES))
+    for result in results:
+        row = f"{result['n_poems']:>6}{result['n_iterations']:>6}" + \
+              f"{result['workers']:>8}"
+        if "error" in result:
+            print(row + "  failed: " + result["error"].strip().split("\n")[-1])
+            continue
+        print(row + f"{result['wall_seconds']:>10.2f}" +
+              f"{result['cpu_seconds']:>10.2f}" +
+              f"{result['peak_rss_mb']:>10.1f}" +
+              f"{result['evaluations_per_second']:>10.1f}" +
+              f"{result['best_fitness']:>10.3f}" +
+              "".join(f"{result['phases'][phase]:>20.3f}"
+                      for phase in PHASES))
+
+    for variable in ["n_poems", "n_iterations"]:
+        exponents = fit_exponents(results, variable)
+        if exponents:
+            print(f"\nTime ~ {variable}^k, k per phase: " +
+                  ", ".join(f"{phase} {exponent:.2f}"
+                            for phase, exponent in exponents.items()))
+
+
+def run_grid(article, n_poems_list, n_iterations_list, workers_list, seed,
+             work_dir):
+    """ Runs the system for every combination of the given population sizes,
+        iteration counts, and worker counts, each in a fresh process forked
+        from this one so it shares the fixture models but none of the caches
+        of earlier runs.
+        Args:
+            article (dictionary) : the fixture article
+            n_poems_list (list) : the population sizes
+            n_iterations_list (list) : the genetic algorithm iteration counts
+            workers_list (list) : the worker counts
+            seed (int) : the seed of every run
+            work_dir (string) : folder the runs write to
+        Returns:
+            List with the measurements of each run.
+    """
+    context = multiprocessing.get_context("fork")
+    results = []
+    grid = list(itertools.product(n_poems_list, n_iterations_list,
+                                  workers_list))
+    for i, (n_poems, n_iterations, workers) in enumerate(grid):
+        print(f"Run {i+1} of {len(grid)}: {n_poems} poems, {n_iterations} " +
+              f"iterations, {workers} workers")
+        point_dir = os.path.join(work_dir, f"run_{i}")
+        os.makedirs(point_dir)
+        queue = context.Queue()
+        process = context.Process(target=run_point_in_child,
+                                  args=(queue, article, n_poems, n_iterations,
+                                        workers, seed, point_dir))
+        process.start()
+        while True:
+            try:
+                result = queue.get(timeout=1)
+                break
+            except queue_module.Empty:
+                if not process.is_alive(): # Exited without a result
+                    result = {"error" : "Run exited with code " +
+                                        f"{process.exitcode}"}
+                    break
+        process.join()
+        if "error" in result:
+            print(result["error"])
+            result.update({"n_poems" : n_poems, "n_iterations" : n_iterations,
+                           "workers" : workers, "seed" : seed})
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures how the time and "
+                                     + "memory of a run grow with the "
+                                     + "population size, number of "
+                                     + "iterations, and number of workers.")
+    parser.add_argument("--n_poems", type=int, nargs="+",
+                        default=DEFAULT_N_POEMS)
+    parser.add_argument("--n_iterations", type=int, nargs="+",
+                        default=DEFAULT_N_ITERATIONS)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=DEFAULT_WORKERS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write the JSON results " +
+                        f"to (default: {RESULTS_DIR}/scaling_<commit>.json)")
+    args = parser.parse_args()
+
+    commit = get_commit()
+    with tempfile.TemporaryDirectory() as work_dir:
+        fixtures = setup_fixtures(work_dir)
+        for name in ["spacy", "rhyme_index"]: # Shared by every run
+            REGISTRY.get(name)
+        results = run_grid(fixtures["article"], args.n_poems,
+                           args.n_iterations, args.workers, args.seed,
+                           work_dir)
+    print_results(results)
+
+    output = {"commit" : commit, "timestamp" : datetime.now().isoformat(),
+              "settings" : {"n_poems" : args.n_poems,
+                            "n_iterations" : args.n_iterations,
+                            "workers" : args.workers, "seed" : args.seed},
+              "results" : results,
+              "exponents" : {variable : fit_exponents(results, variable)
+                             for variable in ["n_poems", "n_iterations"]}}
+    path = args.output or os.path.join(RESULTS_DIR, f"scaling_{commit}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(output, file, indent=2)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 import praw
 from collections import defaultdict, Counter
 import re
-import pickle
 import numpy as np
+from bigram_store import BigramStore
+import coherence # Registers the shared coherence engine
+from nlp_resources import REGISTRY, BIGRAM_MODEL_PATH
 
 """ Relevant subreddits to scrape for the word corpus.
 """
@@ -179,7 +181,7 @@ class ScrapeReddit():
     ----------
     model_path : string
         The path the bigram model will be saved to.
-    model : dictionary
+    model : BigramStore
         Maps words to words that have proceeded them in a text and the 
         frequencies that they have done so.
 
@@ -190,7 +192,7 @@ class ScrapeReddit():
     create_bigrams():
         Creates a list of bigrams in a text.
     build_bigram_model():
-        Creates bigram lists and converts them into a dictionary format.
+        Creates bigram lists and converts them into an array-backed format.
     reset_model():
         Creates a new bigram model that extracts text from reddit pages.
     text_coherence():
@@ -199,19 +201,25 @@ class ScrapeReddit():
     get_probable_next_word():
         Chooses random next word based on the frequency of co-occurence with
         the previous word in Reddit posts.
+    generate_line_tail():
+        Chooses a chain of probable next words to fill the end of a line.
     get_amount():
         Returns how prevalent a word is in the Reddit submissions gathered.
+    get_amounts():
+        Returns how prevalent each of a list of words is in the Reddit corpus.
+    get_idfs():
+        Returns how rare each of a list of words is across Reddit texts.
     get_bigram_size():
         Returns the number of words in the bigram.
     """
 
     def __init__(self):
-        """ Defines file path and opens previously made bigram model (do not
-            necessarily need to remake model every time).
+        """ Defines file path and retrieves the previously made bigram model
+            from the shared registry (do not necessarily need to remake model
+            every time, and it is only loaded once per process).
         """
-        self.model_path = 'nlp_models/bigram_model.pkl'
-        with open(self.model_path, 'rb') as file:
-            self.model = pickle.load(file)
+        self.model_path = BIGRAM_MODEL_PATH
+        self.model = REGISTRY.get("bigram_model")
 
     def preprocess_text(self, text):
         """ Removes punctuation of text and converts it to lowercase.
@@ -241,22 +249,29 @@ class ScrapeReddit():
             lists, and then constructs a bigram model. The model is a 
             dictionary where the keys are words and the values are Counters 
             that map the following words to the frequency they followed the
-            original key. Then it saves the model.
+            original key. Then it converts the model to a compact 
+            array-backed store and saves it, along with how many times each
+            word appeared and how many texts each word appeared in.
             Args:
                 reddit_texts (list) : strings to form base of bigram model
         """
         bigram_model = defaultdict(Counter)
+        doc_freqs = Counter()
         for text in reddit_texts:
             preprocessed_text = self.preprocess_text(text)
+            doc_freqs.update(set(preprocessed_text.split()))
             bigrams = self.create_bigrams(preprocessed_text)
             for bigram in bigrams:
                 bigram_model[bigram[0]][bigram[1]] += 1
         
         print(f"Created bigram model with {len(bigram_model.keys())} words")
-        with open(self.model_path, 'wb') as file:
-            pickle.dump(bigram_model, file)
+        bigram_store = BigramStore.from_model(bigram_model, doc_freqs, 
+                                              len(reddit_texts))
+        bigram_store.save(self.model_path)
 
-        self.model = bigram_model
+        self.model = bigram_store
+        REGISTRY.set("bigram_model", bigram_store)
+        REGISTRY.unload("coherence_engine")
     
     def reset_model(self):
         """ Uses the Reddit API to access various subreddit pages, accesses 
@@ -285,36 +300,54 @@ class ScrapeReddit():
         """ Evalutes how coherent the text is using the bigram model. To 
             compute this value, the algorithm sums the frequency of every 
             consequetive word coming after the previous word, and divides the
-            total by the number of words.
-
+            total by the number of word pairs. The shared coherence engine
+            does the scoring, so texts scored in a population batch are not
+            scored again.
+            Args:
+                text (string) : the text to evaluate
+            Returns:
+                The coherence of the text.
         """
-        sentence = self.preprocess_text(text) 
-        coherence_weighted_count, total_weight = 0, 0
-        for i in range(len(sentence) - 1):
-            prev, next = sentence[i], sentence[i+1]
-            if prev in self.model and next in self.model[prev].keys():
-                coherence_weighted_count += self.model[prev][next]
-            total_weight += 1
-
-        return coherence_weighted_count / total_weight
+        return REGISTRY.get("coherence_engine").score(text)
     
     def get_probable_next_word(self, word):
         """ Given a word, returns a random word that is likely to come next.
             The probabilities are weighted by how frequent each word in the
-            bigram came after the previous word in the existing Reddit corpus.
+            bigram came after the previous word in the existing Reddit corpus,
+            and sampled from the word's precomputed alias table.
             Args:
                 word (string) : the most recent word
             Returns:
-                The next word to be added to the poem
+                The next word to be added to the poem (None if the word is not
+                in the bigram model)
         """
-        word = self.preprocess_text(word)
-        if word not in self.model: #word not in bigram model
-            return None
+        return self.generate_line_tail(word, [None])[0]
 
-        # Probability based on freq of word combination in bigram
-        probs = [self.model[word][next] for next in self.model[word].keys()]
-        probs = np.array(probs) / sum(probs)
-        return np.random.choice(list(self.model[word].keys()), p=probs)
+    def generate_line_tail(self, word, fallback_words):
+        """ Generates a chain of words where each word is sampled from the
+            words likely to follow the previous one. When the previous word 
+            has never been followed by another word, the fallback word for
+            that position is used instead and the chain continues from it. All
+            of the random numbers are drawn in one call.
+            Args:
+                word (string) : the word before the chain
+                fallback_words (list) : the word to use at each position of 
+                    the chain if no next word can be sampled
+            Returns:
+                The list of generated words.
+        """
+        rands = np.random.random((len(fallback_words), 2))
+        tail = []
+        for fallback, (rand_idx, rand_accept) in zip(fallback_words, rands):
+            next_id = -1
+            word_id = self.model.get_id(self.preprocess_text(word)) \
+                                                            if word else -1
+            if word_id >= 0:
+                next_id = self.model.sample_successor(word_id, rand_idx, 
+                                                      rand_accept)
+            word = self.model.words[next_id] if next_id >= 0 else fallback
+            tail.append(word)
+        return tail
 
     def get_amount(self, word):
         """ Returns the number of times a given word appears in the reddit
@@ -324,11 +357,40 @@ class ScrapeReddit():
             Returns:
                 The frequency of the word in the Reddit corpus
         """
-        if word in self.model.keys():
-            return sum(self.model[word].values())
-        else:
-            return 0
+        return self.model.get_total(word)
+
+    def get_amounts(self, words):
+        """ Returns the number of times each word in a list appears in the
+            reddit corpus, using the unigram totals stored with the model.
+            Words are preprocessed the same way as the corpus before they are
+            looked up.
+            Args:
+                words (list) : the words whose frequencies are desired
+            Returns:
+                Array of the frequencies of the words in the Reddit corpus
+        """
+        return self.model.lookup_totals([self.preprocess_text(word) 
+                                         for word in words])
     
+    def get_idfs(self, words):
+        """ Returns the smoothed inverse document frequency of each word in a
+            list, log((1 + n_texts) / (1 + doc_freq)) + 1, where n_texts is
+            the number of Reddit texts and doc_freq is the number of them the
+            word appeared in. Words are preprocessed the same way as the
+            corpus before they are looked up. Every value is at least 1, and
+            is exactly 1 for every word if the model has no document
+            frequencies.
+            Args:
+                words (list) : the words whose idfs are desired
+            Returns:
+                Array of the idfs of the words.
+        """
+        doc_freqs = self.model.lookup_doc_freqs([self.preprocess_text(word)
+                                                 for word in words])
+        n_texts = max(self.model.get_n_texts(), int(np.max(doc_freqs, 
+                                                           initial=0)))
+        return np.log((1 + n_texts) / (1 + doc_freqs)) + 1
+
     def get_bigram_size(self):
         """ Returns the size of the bigram
         """
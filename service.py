@@ -0,0 +1,408 @@
+import argparse
+import json
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.connection import wait
+from high_level_system import GeneratorSystem
+from news_api import CATEGORIES
+from nlp_resources import REGISTRY
+
+""" Resources loaded when the service starts, so requests never pay for
+    loading them.
+"""
+WARM_RESOURCES = ["spacy", "grammar_checker", "rhyme_index", 
+                  "coherence_engine", "base_word2vec", "parsed_lines", 
+                  "poetry_store"]
+
+""" Default number of generation jobs that run at the same time.
+"""
+MAX_CONCURRENT_JOBS = 2
+
+
+def generate(request, n_poems, n_iterations):
+    """ Generates a poem for a generation request and writes it to the
+        generated_poems folder.
+        Args:
+            request (dictionary) : the generation request
+            n_poems (int) : number of poems in each generation, if the
+                request does not set it
+            n_iterations (int) : number of genetic algorithm iterations, if
+                the request does not set it
+        Returns:
+            Dictionary with the folder the poem was written to, the poem, and
+            the article.
+    """
+    generator = GeneratorSystem(request.get("n_poems", n_poems), 
+                                seed=request.get("seed"))
+    try:
+        if "category" in request:
+            generator.fetch_reference_article(category=request["category"])
+        elif "text" in request:
+            title = request.get("title", "Untitled")
+            generator.fetch_reference_article(article={
+                    "title" : title, "text" : request["text"], 
+                    "description" : request.get("description", title)})
+        else:
+            generator.fetch_reference_article(url=request["url"])
+        generator.generate_original_poems()
+        generator.run_genetic_algo_iterations(
+                                    request.get("n_iterations", n_iterations))
+        path = generator.write_poems_to_files()
+
+        poem = generator.poems[0]
+        article = generator.ref_article
+        return {"path" : path,
+                "poem" : {"title" : poem.generate_title(), 
+                          "lines" : str(poem).splitlines(),
+                          "fitness" : poem.get_fitness(),
+                          "scores" : poem.fitness.scores},
+                "article" : {"title" : article.get_title(), 
+                             "description" : article.get_description()}}
+    finally:
+        generator.close()
+
+
+def generate_in_child(connection, request, n_poems, n_iterations):
+    """ Runs generate in a job's process and sends back the finished job's
+        fields, or the error that stopped it.
+        Args:
+            connection (Connection) : where the result is sent
+            request (dictionary) : the generation request
+            n_poems (int) : default number of poems in each generation
+            n_iterations (int) : default number of genetic algorithm 
+                iterations
+    """
+    try:
+        result = generate(request, n_poems, n_iterations)
+        result["status"] = "done"
+    except Exception as error:
+        result = {"status" : "failed", "error" : repr(error)}
+    connection.send(result)
+    connection.close()
+
+
+class GenerationService():
+    """ Runs poem generation jobs in the background of a long-lived process
+        that keeps the models loaded. Jobs are queued and at most max_jobs
+        of them run at once. The models are loaded in a launcher process,
+        which is started before the service has any other threads and forks
+        a process for each job, so the jobs never fork from a process with
+        running threads. Each job starts with the loaded models but has its
+        own random number generators, tracer, caches, and database
+        connection, and jobs that run at the same time cannot change each
+        other's results.
+
+    Attributes
+    ----------
+    jobs : dictionary
+        Maps job ids to the state of each job.
+    lock : Lock
+        Protects the jobs from concurrent updates.
+    send_lock : Lock
+        Keeps the jobs of concurrent requests from being sent at once.
+    max_jobs : int
+        Number of jobs that run at the same time.
+    n_poems : int
+        Default number of poems in each generation.
+    n_iterations : int
+        Default number of genetic algorithm iterations.
+    launcher : Process
+        The process the models are loaded in and the jobs are forked from.
+    connection : Connection
+        Sends jobs to the launcher and receives the updates to them.
+
+    Methods
+    -------
+    warm():
+        Loads the models ahead of the first request.
+    start():
+        Starts the launcher and waits until the models are loaded.
+    run_launcher():
+        Loads the models and runs each job in a new process.
+    receive_updates():
+        Applies the updates the launcher sends to the jobs.
+    submit():
+        Validates a generation request and queues it.
+    update_job():
+        Updates the state of a job.
+    get_job():
+        Returns the state of a job.
+    list_jobs():
+        Returns the state of every job.
+    close():
+        Stops the launcher.
+    """
+
+    def __init__(self, max_jobs=MAX_CONCURRENT_JOBS, n_poems=5, 
+                 n_iterations=5):
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.max_jobs = max_jobs
+        self.n_poems = n_poems
+        self.n_iterations = n_iterations
+        self.launcher = None
+        self.connection = None
+
+    def warm(self):
+        """ Loads every model used for generation.
+        """
+        for name in WARM_RESOURCES:
+            print(f"Loading {name}")
+            REGISTRY.get(name)
+
+    def start(self):
+        """ Starts the launcher process and waits until it has loaded the
+            models. It must be called before the server is created, so the
+            launcher is forked from a process with no other threads. A 
+            RuntimeError is raised if the models cannot be loaded.
+        """
+        context = multiprocessing.get_context("fork")
+        self.connection, launcher_connection = context.Pipe()
+        self.launcher = context.Process(target=self.run_launcher, 
+                                        args=(launcher_connection,))
+        self.launcher.start()
+        launcher_connection.close()
+        error = self.connection.recv()
+        if error is not None:
+            self.close()
+            raise RuntimeError(f"Could not load the models: {error}")
+        threading.Thread(target=self.receive_updates, daemon=True).start()
+
+    def run_launcher(self, connection):
+        """ Loads the models, then starts each job the service sends in a 
+            process forked from this one, queueing the jobs that arrive 
+            while max_jobs are running. The launcher has no threads of its
+            own, so it is safe to fork. It sends None once the models are
+            loaded (or the error that stopped them), and then an update for
+            each job that starts or finishes, until the service closes the
+            connection.
+            Args:
+                connection (Connection) : the connection to the service
+        """
+        try:
+            self.warm()
+        except Exception as error:
+            connection.send(repr(error))
+            return
+        connection.send(None)
+
+        context = multiprocessing.get_context("fork")
+        queued, running = deque(), {}
+        while True:
+            for ready in wait([connection] + list(running)):
+                if ready is connection:
+                    try:
+                        job = connection.recv()
+                    except EOFError: # The service exited without closing
+                        job = None
+                    if job is None:
+                        return
+                    queued.append(job)
+                    continue
+                job_id, process = running.pop(ready)
+                try:
+                    result = ready.recv()
+                except EOFError: # The process exited without sending a result
+                    result = {"status" : "failed", 
+                              "error" : "Job process exited unexpectedly"}
+                process.join()
+                ready.close()
+                connection.send((job_id, dict(result, finished=time.time())))
+
+            while queued and len(running) < self.max_jobs:
+                job_id, request = queued.popleft()
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=generate_in_child, 
+                                          args=(sender, request, self.n_poems,
+                                                self.n_iterations))
+                process.start()
+                sender.close()
+                running[receiver] = (job_id, process)
+                connection.send((job_id, {"status" : "running", 
+                                          "started" : time.time()}))
+
+    def receive_updates(self):
+        """ Applies the updates the launcher sends to the jobs, until the
+            connection to it is closed.
+        """
+        while True:
+            try:
+                job_id, updates = self.connection.recv()
+            except (EOFError, OSError):
+                return
+            self.update_job(job_id, **updates)
+
+    def submit(self, request):
+        """ Validates a generation request and queues it as a new job. A 
+            request gives either a news "category", the "url" of an article,
+            or the "text" of an article (with an optional "title"), and may
+            set "n_poems", "n_iterations", and "seed".
+            Args:
+                request (dictionary) : the generation request
+            Returns:
+                The id of the job.
+        """
+        if not isinstance(request, dict):
+            raise ValueError("The request must be a JSON object")
+        if "category" in request:
+            if request["category"] not in CATEGORIES:
+                raise ValueError(f"Unknown category '{request['category']}'"
+                                 + f", expected one of {CATEGORIES}")
+        elif "text" in request:
+            if not isinstance(request["text"], str) or not request["text"]:
+                raise ValueError("The article text must be a string")
+        elif "url" not in request:
+            raise ValueError("The request must have a category, url, or text")
+        for name in ["n_poems", "n_iterations"]:
+            if name in request and (not isinstance(request[name], int) or 
+                                    request[name] < 2):
+                raise ValueError(f"{name} must be an integer of at least 2")
+
+        job_id = uuid.uuid4().hex[:12]
+        with self.lock:
+            self.jobs[job_id] = {"id" : job_id, "status" : "queued", 
+                                 "submitted" : time.time()}
+        with self.send_lock:
+            self.connection.send((job_id, request))
+        return job_id
+
+    def update_job(self, job_id, **updates):
+        """ Updates the state of a job.
+            Args:
+                job_id (string) : the id of the job
+                updates (dictionary) : the fields to update
+        """
+        with self.lock:
+            self.jobs[job_id].update(updates)
+
+    def get_job(self, job_id):
+        """ Returns a copy of the state of a job, or None if there is no job
+            with the given id.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else dict(job)
+
+    def list_jobs(self):
+        """ Returns the id and status of every job.
+        """
+        with self.lock:
+            return [{"id" : job["id"], "status" : job["status"]} 
+                    for job in self.jobs.values()]
+
+    def close(self):
+        """ Tells the launcher to stop and waits for the jobs it is running to
+            finish.
+        """
+        with self.send_lock:
+            try:
+                self.connection.send(None)
+            except OSError: # The launcher has already exited
+                pass
+        self.launcher.join()
+        self.connection.close()
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """ Handles the HTTP requests of the generation service.
+        POST /jobs submits a job, GET /jobs lists the jobs, and 
+        GET /jobs/<id> returns the status of a job and, once it is done, its
+        poem.
+
+    Methods
+    -------
+    send_json():
+        Sends a JSON response.
+    do_OPTIONS():
+        Answers CORS preflight requests.
+    do_GET():
+        Returns jobs.
+    do_POST():
+        Submits a job.
+    """
+
+    def send_json(self, status, body):
+        """ Sends a JSON response that any page may read, so speech.html can
+            be served from a different port.
+            Args:
+                status (int) : the HTTP status code
+                body (object) : the JSON body
+        """
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_OPTIONS(self):
+        """ Allows pages on other origins to POST JSON to the service.
+        """
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.end_headers()
+
+    def do_GET(self):
+        """ Returns the list of jobs, or the state of one job.
+        """
+        service = self.server.service
+        path = self.path.rstrip("/")
+        if path == "/jobs":
+            self.send_json(200, {"jobs" : service.list_jobs()})
+        elif path.startswith("/jobs/"):
+            job = service.get_job(path[len("/jobs/"):])
+            if job is None:
+                self.send_json(404, {"error" : "No such job"})
+            else:
+                self.send_json(200, job)
+        else:
+            self.send_json(404, {"error" : "Not found"})
+
+    def do_POST(self):
+        """ Submits a generation job and returns its id.
+        """
+        if self.path.rstrip("/") != "/jobs":
+            self.send_json(404, {"error" : "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            job_id = self.server.service.submit(request)
+        except ValueError as error:
+            self.send_json(400, {"error" : str(error)})
+            return
+        self.send_json(202, {"id" : job_id, "status" : "queued"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves poem generation " +
+                                     "requests with the models kept loaded.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--max_jobs", type=int, default=MAX_CONCURRENT_JOBS)
+    parser.add_argument("--n_poems", type=int, default=5)
+    parser.add_argument("--n_iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    service = GenerationService(args.max_jobs, args.n_poems, 
+                                args.n_iterations)
+    service.start()
+    server = ThreadingHTTPServer((args.host, args.port), RequestHandler)
+    server.service = service
+    print(f"Serving poem generation on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
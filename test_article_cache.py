@@ -0,0 +1,40 @@
+import os
+import article_cache
+from article_cache import ArticleCache
+
+""" Analysis saved by the tests.
+"""
+ANALYSIS = {"sentiments" : {"polarity" : 0.5, "subjectivity" : 0.5}}
+
+
+def make_cache(tmp_path):
+    """ Returns a cache in a temporary folder with a saved base model file.
+    """
+    model_path = tmp_path / "base_word2vec.model"
+    model_path.write_bytes(b"model")
+    return ArticleCache(str(tmp_path / "cache"), str(model_path))
+
+
+def test_returns_saved_analysis(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get("abc") is None
+    cache.put("abc", ANALYSIS)
+    assert cache.get("abc") == ANALYSIS and cache.get("def") is None
+    assert cache.get_stats() == {"hits" : 1, "misses" : 2}
+
+
+def test_misses_after_model_is_saved_again(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("abc", ANALYSIS)
+    stat = os.stat(cache.model_path)
+    os.utime(cache.model_path, ns=(stat.st_atime_ns, 
+                                   stat.st_mtime_ns + 10 ** 9))
+    assert cache.get("abc") is None
+
+
+def test_misses_after_version_changes(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path)
+    cache.put("abc", ANALYSIS)
+    monkeypatch.setattr(article_cache, "ARTICLE_CACHE_VERSION", 
+                        article_cache.ARTICLE_CACHE_VERSION + 1)
+    assert cache.get("abc") is None
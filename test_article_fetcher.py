@@ -0,0 +1,161 @@
+import multiprocessing
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from article_fetcher import ArticleFetcher
+from news_api import NewsGetter, MIN_ARTICLE_LENGTH, extract_article_text, \
+                     get_fetch_metrics
+from nlp_resources import REGISTRY
+
+""" Seconds the stub server waits before answering a request for the slow
+    page. Every test sets its request timeout or deadline below this.
+"""
+SLOW_PAGE_SECONDS = 3
+
+""" Pages served by the stub server, each with its status code and HTML. The
+    short page is below the minimum article length and the long page above.
+"""
+PAGES = {"/short" : (200, "<html><p>Too short to be an article.</p></html>"),
+         "/long" : (200, "<html><h1>Stub article</h1>" +
+                         "<p>A long enough article. </p>" *
+                         (MIN_ARTICLE_LENGTH // 20) + "</html>"),
+         "/slow" : (200, "<html><p>Answered too late.</p></html>")}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """ Answers the requests made to the stub server. Pages that are not in
+        PAGES are answered with a 404.
+    """
+
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(SLOW_PAGE_SECONDS)
+        status, html = PAGES.get(self.path, (404, "<html>Not found</html>"))
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        self.end_headers()
+        self.wfile.write(html.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """ Local HTTP server for the tests. Clients that give up on the slow
+        page close their connection, which is not reported as an error.
+    """
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    """ Runs the stub server on a free local port for the tests of the module.
+        Returns:
+            The server's base url.
+    """
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def make_candidates(base_url, paths):
+    """ Returns NewsAPI-style candidate articles for pages of the stub server.
+    """
+    return [{"url" : base_url + path, "title" : path} for path in paths]
+
+
+def make_fetcher(**settings):
+    """ Returns a fetcher that extracts article text like NewsGetter does.
+    """
+    return ArticleFetcher(extract_article_text, MIN_ARTICLE_LENGTH,
+                          **settings)
+
+
+def test_returns_first_long_page(base_url):
+    fetcher = make_fetcher(request_timeout=1)
+    start = time.perf_counter()
+    result = fetcher.fetch(make_candidates(base_url, ["/slow", "/missing",
+                                                      "/short", "/long"]))
+    assert time.perf_counter() - start < SLOW_PAGE_SECONDS
+    assert result is not None and result[0]["title"] == "/long"
+    assert len(result[1]) >= MIN_ARTICLE_LENGTH
+    metrics = fetcher.get_metrics()
+    assert metrics["failures"] == 1 and metrics["failed_fetches"] == 0
+
+
+def test_gives_up_without_long_page(base_url):
+    fetcher = make_fetcher(request_timeout=1)
+    result = fetcher.fetch(make_candidates(base_url, ["/missing", "/short"]))
+    assert result is None
+    metrics = fetcher.get_metrics()
+    assert metrics["requests"] == 2 and metrics["failures"] == 1
+    assert metrics["failed_fetches"] == 1
+
+
+def test_request_timeout(base_url):
+    fetcher = make_fetcher(request_timeout=1, deadline=2 * SLOW_PAGE_SECONDS)
+    start = time.perf_counter()
+    assert fetcher.fetch(make_candidates(base_url, ["/slow"])) is None
+    assert time.perf_counter() - start < SLOW_PAGE_SECONDS
+    assert fetcher.get_metrics()["timeouts"] == 1
+
+
+def test_deadline(base_url):
+    fetcher = make_fetcher(request_timeout=2 * SLOW_PAGE_SECONDS, deadline=1)
+    start = time.perf_counter()
+    assert fetcher.fetch(make_candidates(base_url, ["/slow"] * 8)) is None
+    assert time.perf_counter() - start < SLOW_PAGE_SECONDS
+
+
+def test_deadline_frees_threads(base_url):
+    fetcher = make_fetcher(n_concurrent=2,
+                           request_timeout=2 * SLOW_PAGE_SECONDS, deadline=1)
+    assert fetcher.fetch(make_candidates(base_url, ["/slow"] * 4)) is None
+    # The slow downloads stop at the deadline, so the threads are free
+    start = time.perf_counter()
+    assert fetcher.fetch(make_candidates(base_url, ["/long"])) is not None
+    assert time.perf_counter() - start < 1
+    metrics = fetcher.get_metrics()
+    assert metrics["timeouts"] == 2 and metrics["requests"] == 3
+
+
+def test_max_attempts(base_url):
+    fetcher = make_fetcher(n_concurrent=2, max_attempts=3)
+    assert fetcher.fetch(make_candidates(base_url, ["/short"] * 10)) is None
+    assert fetcher.get_metrics()["requests"] == 3
+
+
+def test_news_getters_share_fetcher(base_url):
+    before = get_fetch_metrics()["fetches"]
+    getters = [NewsGetter(url=base_url + "/long") for _ in range(2)]
+    assert getters[0].fetcher is getters[1].fetcher
+    assert getters[0].fetcher is REGISTRY.get("article_fetcher")
+    assert getters[0].get_article()["text"].startswith("Stub article")
+    with pytest.raises(RuntimeError):
+        NewsGetter(url=base_url + "/short")
+    assert get_fetch_metrics()["fetches"] == before + 3
+
+
+def fetch_in_child(connection, base_url):
+    """ Fetches the long page with the shared fetcher in a forked process and
+        sends back whether it was found.
+    """
+    result = NewsGetter(url=base_url + "/long").get_article()
+    connection.send(bool(result))
+
+
+def test_fetch_after_fork(base_url):
+    NewsGetter(url=base_url + "/long")
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=fetch_in_child,
+                              args=(sender, base_url))
+    process.start()
+    assert receiver.poll(2 * SLOW_PAGE_SECONDS), "Fetch hung after a fork"
+    assert receiver.recv()
+    process.join()
@@ -0,0 +1,57 @@
+from collections import Counter
+import numpy as np
+import pytest
+from nlp_resources import REGISTRY
+from bigram_store import BigramStore
+from coherence import CoherenceEngine, COHERENCE_METHODS
+from fitness import Fitness, FITNESS_CACHE
+from news_article import Article
+from high_level_system import SONNET_RHYME_SCHEME
+
+""" Texts scored by the engine tests, including ones with unknown words, a
+    single word, and no words.
+"""
+TEXTS = ["the cat sat on the mat", "the cat", "the dog sat",
+         "zebra quantum the mat", "cat", ""]
+
+
+def make_engine(method):
+    """ Returns a coherence engine around a small bigram model.
+    """
+    bigram_model = {"the" : Counter({"cat" : 3, "mat" : 2, "dog" : 1}),
+                    "cat" : Counter({"sat" : 2}), "sat" : Counter({"on" : 2}),
+                    "on" : Counter({"the" : 2}), "dog" : Counter({"sat" : 1})}
+    return CoherenceEngine(BigramStore.from_model(bigram_model), method)
+
+
+@pytest.mark.parametrize("method", COHERENCE_METHODS)
+def test_scores_are_finite_and_non_negative(method):
+    scores = make_engine(method).score_texts(TEXTS)
+    assert np.all(np.isfinite(scores)) and np.all(scores >= 0)
+    assert scores[-2] == scores[-1] == 0
+
+
+def test_log_prob_is_inverse_perplexity():
+    engine = make_engine("log_prob")
+    scores = engine.score_texts(TEXTS)
+    assert np.all(scores <= 1)
+    # Seen pairs are more probable than unseen ones, whatever the length
+    assert scores[0] > scores[3] and scores[1] > scores[3]
+    ids = engine.tokenize(TEXTS[0])
+    log_probs = engine.score_pairs(ids[:-1], ids[1:], "log_prob", 1.0)
+    assert scores[0] == pytest.approx(np.exp(log_probs.mean()))
+
+
+@pytest.mark.parametrize("method", COHERENCE_METHODS)
+def test_fitness_is_finite_and_non_negative(fixtures, monkeypatch, method):
+    engine = REGISTRY.get("coherence_engine")
+    monkeypatch.setattr(engine, "method", method)
+    engine.scores.clear()
+    FITNESS_CACHE.clear()
+    article = Article(article=fixtures["article"])
+    for sonnet in fixtures["sonnets"]:
+        fitness = Fitness(list(sonnet), article, SONNET_RHYME_SCHEME)
+        fitness.compute_fitness()
+        assert np.isfinite(fitness.fitness) and fitness.fitness >= 0
+        assert 0 <= fitness.scores["coherence"] < np.inf
+    FITNESS_CACHE.clear()
@@ -0,0 +1,49 @@
+import pytest
+from nlp_resources import REGISTRY
+from evaluation import ParallelEvaluator
+from fitness import FITNESS_CACHE
+from high_level_system import GeneratorSystem, SONNET_RHYME_SCHEME
+
+
+def run_generator(article, workers, seed, n_poems=6, n_iterations=2, 
+                  evaluator=None):
+    """ Runs the system on an article with every cache emptied first, so a
+        run does not reuse the scores of the one before it.
+        Returns:
+            The lines and fitness of each poem of the last generation.
+    """
+    FITNESS_CACHE.clear()
+    REGISTRY.get("grammar_checker").error_counts.clear()
+    REGISTRY.get("coherence_engine").scores.clear()
+    generator = GeneratorSystem(n_poems, workers=workers, seed=seed,
+                                evaluator=evaluator)
+    try:
+        generator.fetch_reference_article(article=article)
+        generator.generate_original_poems()
+        generator.run_genetic_algo_iterations(n_iterations)
+        return [(poem.sonnet, poem.get_fitness()) for poem in generator.poems]
+    finally:
+        generator.close()
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_parallel_scores_match_serial(fixtures, seed):
+    serial = run_generator(fixtures["article"], 1, seed)
+    parallel = run_generator(fixtures["article"], 3, seed)
+    assert [lines for lines, _ in parallel] == [lines for lines, _ in serial]
+    assert [fitness for _, fitness in parallel] == \
+           [fitness for _, fitness in serial]
+
+
+def test_shared_evaluator_scores_each_article(fixtures):
+    article = fixtures["article"]
+    words = article["text"].split()
+    articles = [article, dict(article, title="Second half", 
+                              text=" ".join(words[len(words) // 2:]))]
+    evaluator = ParallelEvaluator(None, SONNET_RHYME_SCHEME, 3)
+    try:
+        shared = [run_generator(article, 3, 0, evaluator=evaluator) 
+                  for article in articles]
+    finally:
+        evaluator.close()
+    assert shared == [run_generator(article, 1, 0) for article in articles]
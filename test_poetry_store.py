@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+from poetry_store import PoetryStore
+
+""" Poems added to the stores of the tests.
+"""
+POEMS = [{"title" : "First", "author" : "A", "lines" : ["one", "two"]},
+         {"title" : "Second", "author" : "B", "lines" : ["three", "four"]}]
+
+
+def query_in_child(connection, store):
+    """ Reads the store in a forked process and sends back the lines it found
+        and whether it used a connection of its own.
+    """
+    parent_connection = store.connection
+    lines = store.get_lines(1, 2)
+    connection.send((lines, store.connection is not parent_connection and 
+                     store.pid == os.getpid()))
+
+
+def test_reconnects_after_fork(tmp_path):
+    store = PoetryStore(str(tmp_path / "poetry.sqlite"))
+    store.add_poems(POEMS)
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=query_in_child, args=(sender, store))
+    process.start()
+    assert receiver.poll(10), "The forked process did not answer"
+    assert receiver.recv() == (["two", "four"], True)
+    process.join()
+    assert store.pid == os.getpid()
+    assert store.get_lines(0, 2) == ["one", "three"]
+
+
+def fill_in_child(connection, path, barrier):
+    """ Fills a new store in a forked process once every process has seen
+        that it is empty, and sends back whether it added the poems.
+    """
+    def get_poems():
+        barrier.wait()
+        return POEMS
+    connection.send(PoetryStore(path).fill_if_empty(get_poems))
+
+
+def test_concurrent_fills_add_poems_once(tmp_path):
+    path = str(tmp_path / "poetry.sqlite")
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(3)
+    receivers, processes = [], []
+    for _ in range(3):
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=fill_in_child, 
+                                  args=(sender, path, barrier))
+        process.start()
+        receivers.append(receiver)
+        processes.append(process)
+    assert sorted(receiver.recv() for receiver in receivers) == \
+           [False, False, True]
+    for process in processes:
+        process.join()
+    assert PoetryStore(path).get_poems() == [["one", "two"], 
+                                             ["three", "four"]]
@@ -0,0 +1,40 @@
+import time
+import pytest
+from service import GenerationService
+
+""" Seconds the tests wait for the jobs of the service to finish.
+"""
+JOB_TIMEOUT = 300
+
+
+def wait_for_jobs(service, job_ids):
+    """ Waits until every job has finished.
+        Returns:
+            The state of each job.
+    """
+    end_time = time.monotonic() + JOB_TIMEOUT
+    while time.monotonic() < end_time:
+        jobs = [service.get_job(job_id) for job_id in job_ids]
+        if all(job["status"] not in ["queued", "running"] for job in jobs):
+            return jobs
+        time.sleep(0.2)
+    pytest.fail("The jobs did not finish in time")
+
+
+def test_runs_jobs_in_launcher(fixtures, tmp_path, monkeypatch):
+    # Jobs write their poems to the working directory
+    monkeypatch.chdir(tmp_path)
+    service = GenerationService(max_jobs=2, n_poems=4, n_iterations=2)
+    service.start()
+    try:
+        request = {"text" : fixtures["article"]["text"], "title" : "Fixture"}
+        job_ids = [service.submit(dict(request, seed=seed)) 
+                   for seed in [0, 1, 0]]
+        assert len(service.list_jobs()) == 3
+        jobs = wait_for_jobs(service, job_ids)
+    finally:
+        service.close()
+    assert all(job["status"] == "done" for job in jobs), jobs
+    # The jobs ran in their own processes, so equal seeds give equal poems
+    assert jobs[0]["poem"] == jobs[2]["poem"]
+    assert not service.launcher.is_alive()
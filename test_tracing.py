@@ -0,0 +1,20 @@
+from high_level_system import GeneratorSystem
+from tracing import TRACER
+
+
+def test_close_turns_off_tracing_it_turned_on():
+    TRACER.disable()
+    generator = GeneratorSystem(2, trace=True)
+    assert TRACER.enabled
+    generator.close()
+    assert not TRACER.enabled
+
+
+def test_close_keeps_tracing_that_was_on():
+    TRACER.enable()
+    try:
+        generator = GeneratorSystem(2, trace=True)
+        generator.close()
+        assert TRACER.enabled
+    finally:
+        TRACER.disable()
@@ -0,0 +1,241 @@
+import functools
+import json
+import os
+import threading
+import time
+
+""" Environment variable that turns tracing on for every run in the process
+    when it is set to anything other than an empty string.
+"""
+TRACE_ENV_VAR = "POETRY_TRACE"
+
+""" Name of the trace file written next to each generated poem.
+"""
+TRACE_FILE = "trace.json"
+
+
+class NullSpan():
+    """ Span used while tracing is off, which does nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+""" The span returned by every call to Tracer.span while tracing is off.
+"""
+NULL_SPAN = NullSpan()
+
+
+class Span():
+    """ Times a block of code and records it in a tracer when the block ends.
+        Spans that start inside another span on the same thread are shown
+        nested inside it.
+
+    Attributes
+    ----------
+    tracer : Tracer
+        The tracer the span is recorded in.
+    name : string
+        The name of the span.
+    args : dictionary
+        Extra values shown with the span.
+    start : int
+        When the span started, in nanoseconds.
+    """
+
+    __slots__ = ["tracer", "name", "args", "start"]
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.add_span(self.name, self.start, time.perf_counter_ns(),
+                             self.args)
+        return False
+
+
+class Tracer():
+    """ Records how long each stage of a run takes, how often each stage and
+        event happens, and the hit rates of the caches, and writes them in
+        the Chrome trace event format (viewable in chrome://tracing or
+        Perfetto). While tracing is off, spans and counters return right
+        away, so the instrumentation can stay in the code.
+
+        Only the process the tracer is enabled in is traced. Work done in
+        worker processes shows up as the span of the call that waits for it.
+
+    Attributes
+    ----------
+    enabled : bool
+        Whether spans and counters are being recorded.
+    events : list
+        The trace events that have been recorded.
+    calls : dictionary
+        Maps span names to their number of calls and total time.
+    counters : dictionary
+        Maps counter names to their values.
+    start : int
+        When recording started, in nanoseconds.
+    lock : Lock
+        Keeps the call statistics consistent when spans end on threads.
+
+    Methods
+    -------
+    enable():
+        Starts recording.
+    disable():
+        Stops recording.
+    reset():
+        Drops everything that has been recorded.
+    span():
+        Returns a context manager that records a span.
+    add_span():
+        Records a finished span.
+    count():
+        Adds to a counter.
+    get_summary():
+        Returns the call statistics and counters.
+    write():
+        Writes the trace to a file.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        """ Starts recording spans and counters.
+        """
+        self.enabled = True
+
+    def disable(self):
+        """ Stops recording spans and counters.
+        """
+        self.enabled = False
+
+    def reset(self):
+        """ Drops every recorded event, call statistic, and counter, and
+            restarts the trace clock.
+        """
+        with self.lock:
+            self.events = []
+            self.calls = {}
+            self.counters = {}
+            self.start = time.perf_counter_ns()
+
+    def span(self, name, **args):
+        """ Returns a context manager that records the time spent in a block
+            of code as a span.
+            Args:
+                name (string) : the name of the span
+                args : extra values shown with the span
+            Returns:
+                The span (a shared one that does nothing if tracing is off).
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, args)
+
+    def add_span(self, name, start, end, args=None):
+        """ Records a finished span as a complete event and adds it to the
+            span's call statistics.
+            Args:
+                name (string) : the name of the span
+                start (int) : when the span started, in nanoseconds
+                end (int) : when the span ended, in nanoseconds
+                args (dictionary) : extra values shown with the span
+        """
+        event = {"name" : name, "cat" : name.split(".")[0], "ph" : "X",
+                 "ts" : (start - self.start) / 1000,
+                 "dur" : (end - start) / 1000, "pid" : os.getpid(),
+                 "tid" : threading.get_ident()}
+        if args:
+            event["args"] = args
+        with self.lock:
+            self.events.append(event)
+            calls = self.calls.setdefault(name, {"calls" : 0, "total_ms" : 0.0})
+            calls["calls"] += 1
+            calls["total_ms"] += (end - start) / 1e6
+
+    def count(self, name, n=1):
+        """ Adds to a counter, if tracing is on.
+            Args:
+                name (string) : the name of the counter
+                n (int) : the amount to add
+        """
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def get_summary(self):
+        """ Returns the number of calls and total time of every span name,
+            and the value of every counter.
+        """
+        with self.lock:
+            return {"calls" : {name : dict(calls)
+                               for name, calls in self.calls.items()},
+                    "counters" : dict(self.counters)}
+
+    def write(self, path, cache_stats=None):
+        """ Writes the recorded trace to a file in the Chrome trace event
+            format. The call statistics, counters, and cache statistics are
+            stored with it, and each counter and cache hit rate is also added
+            as a counter event at the end of the trace.
+            Args:
+                path (string) : the file to write
+                cache_stats (dictionary) : maps cache names to their
+                    statistics
+        """
+        summary = self.get_summary()
+        summary["caches"] = cache_stats or {}
+        end = (time.perf_counter_ns() - self.start) / 1000
+        counter_events = [{"name" : name, "ph" : "C", "ts" : end,
+                           "pid" : os.getpid(), "args" : {name : value}}
+                          for name, value in summary["counters"].items()]
+        counter_events += [{"name" : f"{name} hit rate", "ph" : "C",
+                            "ts" : end, "pid" : os.getpid(),
+                            "args" : {"hit_rate" : stats["hit_rate"]}}
+                           for name, stats in summary["caches"].items()
+                           if "hit_rate" in stats]
+        with self.lock:
+            events = list(self.events)
+        with open(path, "w") as file:
+            json.dump({"traceEvents" : events + counter_events,
+                       "displayTimeUnit" : "ms", "otherData" : summary},
+                      file)
+
+
+""" The tracer shared by everything in the process.
+"""
+TRACER = Tracer(enabled=bool(os.environ.get(TRACE_ENV_VAR)))
+
+
+def traced(name):
+    """ Decorator that records every call of a function as a span of the
+        shared tracer. While tracing is off, the function is called directly.
+        Args:
+            name (string) : the name of the span
+        Returns:
+            The decorator.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return function(*args, **kwargs)
+            with Span(TRACER, name, None):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,6 +1,7 @@
+import numpy as np
 from gensim.models import Word2Vec as GensimWord2Vec
-import spacy
 from get_inspiring_poems import PoetryDB
+from nlp_resources import REGISTRY, BASE_WORD2VEC_PATH
 
 class MyWord2Vec:
     """ Class for creating, saving and adding to Word2Vec models, which are 
@@ -17,11 +18,16 @@ class MyWord2Vec:
         make_poetry_base():
             Makes Word2Vec model with words from PoetryDB.
         add_vocab():
-            Adds words to Word2Vec model and retrains it.
+            Trains vectors for the words of a text, starting from their base
+            vectors, and returns them.
+        copy_base_weights():
+            Starts the known words of a small model from their base weights.
+        load_overlay():
+            Recreates the vectors returned by add_vocab from saved vectors.
     """
 
     def __init__(self):
-        self.nlp = spacy.load("en_core_web_sm")
+        self.nlp = REGISTRY.get("spacy")
 
     def make_poetry_base(self):
         """ Populates Word2Vec model with all of the words in the PoetryDB to
@@ -39,21 +45,137 @@ class MyWord2Vec:
 
         word2vec = GensimWord2Vec(sentences=common_texts, vector_size=100, 
                                   window=5, min_count=1, workers=4)
-        word2vec.save("nlp_models/base_word2vec.model")
+        word2vec.save(BASE_WORD2VEC_PATH)
+        REGISTRY.set("base_word2vec", word2vec)
     
     def add_vocab(self, text):
-        """ Adds text to the already initialized Word2Vec model and trains the
-            model to capture the semantic similarity between words and their
-            corresponding vectors. Then, saves the updated model.
+        """ Trains vectors for the words of a text to capture the semantic
+            similarity between them. Training only changes the vectors of the
+            words in the text, so a small model is trained that only holds
+            those words, with the settings of the base model. Words the base
+            model knows start from their base weights, so the base model is
+            never copied or changed. The trained vectors are kept in an
+            overlay on top of the base model, and nothing is written to disk.
             Args:
-                article_text (list) : strings to be added to Word2Vec model
-
+                text (string) : the text whose words are trained
+            Returns:
+                VectorOverlay of the text's trained vectors.
         """
         new_words = [token.text for token in self.nlp(text)]
+        base_model = REGISTRY.get("base_word2vec")
+        if not new_words:
+            return VectorOverlay(base_model.wv, [], [])
 
-        word2vec_model = GensimWord2Vec.load("nlp_models/base_word2vec.model")
-        word2vec_model.build_vocab([new_words], update=True)
+        word2vec_model = GensimWord2Vec(vector_size=base_model.vector_size,
+                                        window=base_model.window, 
+                                        min_count=1, sg=base_model.sg,
+                                        hs=base_model.hs, 
+                                        negative=base_model.negative,
+                                        sample=base_model.sample,
+                                        alpha=base_model.alpha,
+                                        min_alpha=base_model.min_alpha,
+                                        seed=base_model.seed, workers=1)
+        word2vec_model.build_vocab([new_words])
+        self.copy_base_weights(base_model, word2vec_model)
         word2vec_model.train([new_words], total_examples=1, epochs=1)
 
-        # Save the updated model
-        word2vec_model.save("nlp_models/word2vec.model")
+        words = list(word2vec_model.wv.index_to_key)
+        return VectorOverlay(base_model.wv, words, word2vec_model.wv[words])
+
+    def copy_base_weights(self, base_model, word2vec_model):
+        """ Starts the words of a small model that the base model knows from
+            their trained base weights, both the word vectors and the negative
+            sampling weights used while training.
+            Args:
+                base_model (Word2Vec) : the base model
+                word2vec_model (Word2Vec) : the small model to initialize
+        """
+        words = [word for word in word2vec_model.wv.index_to_key 
+                 if word in base_model.wv.key_to_index]
+        if not words:
+            return
+        rows = [word2vec_model.wv.key_to_index[word] for word in words]
+        base_rows = [base_model.wv.key_to_index[word] for word in words]
+        word2vec_model.wv.vectors[rows] = base_model.wv.vectors[base_rows]
+        # The hierarchical softmax weights belong to tree nodes, not words
+        if base_model.negative and word2vec_model.negative:
+            word2vec_model.syn1neg[rows] = base_model.syn1neg[base_rows]
+
+    def load_overlay(self, words, vectors):
+        """ Recreates the overlay that add_vocab trained for a text from the
+            text's trained vectors, without training.
+            Args:
+                words (list) : the words of the text
+                vectors (array) : the trained vectors of the words
+            Returns:
+                VectorOverlay of the vectors.
+        """
+        return VectorOverlay(REGISTRY.get("base_word2vec").wv, words, vectors)
+
+
+class VectorOverlay():
+    """ Word vectors of an article layered on top of the base Word2Vec
+        vectors. Lookups check the article's vectors first and fall back to
+        the base vectors, so each article gets its own trained vectors 
+        without changing or copying the base model. Supports the parts of
+        the KeyedVectors interface used by the system.
+
+    Attributes
+    ----------
+    base : KeyedVectors
+        The base Word2Vec vectors.
+    words : list
+        The words that have article vectors.
+    vectors : array
+        The article vector of each word.
+    word_ids : dictionary
+        Maps the words to their rows in vectors.
+    norm_vectors : array
+        The article vectors normalized to unit length.
+    vector_size : int
+        The length of each vector.
+
+    Methods
+    -------
+    get_vector():
+        Returns the vector of a word.
+    """
+
+    def __init__(self, base, words, vectors):
+        self.base = base
+        self.words = list(words)
+        self.vectors = np.asarray(vectors, dtype=np.float32).reshape(
+                                            len(self.words), base.vector_size)
+        self.word_ids = {word : i for i, word in enumerate(self.words)}
+        norms = np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        self.norm_vectors = self.vectors / np.maximum(norms, 1e-12)
+        self.vector_size = base.vector_size
+
+    def get_vector(self, word, norm=False):
+        """ Returns the vector of a word, preferring the article's vector.
+            Args:
+                word (string) : the word to look up
+                norm (bool) : whether to return the unit-length vector
+            Returns:
+                The word's vector.
+        """
+        i = self.word_ids.get(word)
+        if i is None:
+            return self.base.get_vector(word, norm=norm)
+        return self.norm_vectors[i] if norm else self.vectors[i]
+
+    def __getitem__(self, word):
+        """ Returns the vector of a word.
+        """
+        return self.get_vector(word)
+
+    def __contains__(self, word):
+        """ Returns whether the word has an article or base vector.
+        """
+        return word in self.word_ids or word in self.base
+
+    def __len__(self):
+        """ Returns the number of words with vectors.
+        """
+        return len(self.base) + sum(1 for word in self.words 
+                                    if word not in self.base)